@@ -0,0 +1,74 @@
+"""Пропускная способность обработчиков при конкурентных обновлениях:
+sync_to_async вокруг синхронного ORM против асинхронных репозиториев
+
+    python benchmarks/bench_async_handlers.py
+"""
+
+import asyncio
+import datetime
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from common import report, setup_django
+
+UPDATES = 2000
+CONCURRENCY = 200
+
+
+async def run_updates(handler, location_ids):
+    """
+    Прогон UPDATES обновлений с ограничением параллелизма CONCURRENCY
+    """
+    rng = random.Random(7)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(location_id):
+        async with semaphore:
+            await handler(location_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(rng.choice(location_ids)) for _ in range(UPDATES)))
+    elapsed = time.perf_counter() - started
+    return {"updates": UPDATES, "seconds": elapsed, "updates_per_s": UPDATES / elapsed}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(Path(directory) / "bench.sqlite3")
+
+        from asgiref.sync import sync_to_async  # pylint: disable=C0415
+
+        from bot_admin.models import ServiceLocation, WorkDay  # pylint: disable=C0415
+        from bot_admin.repositories import locations  # pylint: disable=C0415
+        from bot_admin.schedule_cache import schedule_cache  # pylint: disable=C0415
+
+        workdays = [WorkDay.objects.create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(21, 0)) for day in range(6)]
+        created = ServiceLocation.objects.bulk_create(ServiceLocation(name=f"Location {i}") for i in range(100))
+        through = ServiceLocation.available_days.through
+        through.objects.bulk_create(through(servicelocation_id=loc.pk, workday_id=workday.pk) for loc in created for workday in workdays)
+        location_ids = [location.pk for location in created]
+        date, moment = datetime.date(2025, 9, 3), datetime.time(12, 0)
+
+        def sync_handler(location_id):
+            location = ServiceLocation.objects.get(pk=location_id)
+            return location.is_available(date, moment), location.get_working_hours()
+
+        async def sync_wrapped(location_id):
+            return await sync_to_async(sync_handler)(location_id)
+
+        async def native_async(location_id):
+            location = await locations.aget(pk=location_id)
+            return await locations.ais_available(location, date, moment), await locations.aworking_hours(location)
+
+        async def cached_async(location_id):
+            return await locations.ais_available(location_id, date, moment), await locations.aworking_hours(location_id)
+
+        for name, handler in (("sync_to_async", sync_wrapped), ("native_async", native_async), ("cached_async", cached_async)):
+            schedule_cache.clear()
+            report(name, asyncio.run(run_updates(handler, location_ids)))
+
+
+if __name__ == "__main__":
+    main()
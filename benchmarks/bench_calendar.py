@@ -0,0 +1,57 @@
+"""Построение календаря на месяц (31 день × 48 слотов) для 100 мест
+
+python benchmarks/bench_calendar.py
+"""
+
+import datetime
+import random
+
+from common import measure, report, setup_django
+
+
+def main():
+    setup_django()
+
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.calendar_keyboard import BookingCalendar  # pylint: disable=C0415
+    from bot_admin.models import Booking, ServiceLocation, WorkDay  # pylint: disable=C0415
+    from bot_admin.slot_index import SlotIndex  # pylint: disable=C0415
+
+    rng = random.Random(11)
+    workdays = [WorkDay.objects.create(day=day, start_time=datetime.time(8, 0), end_time=datetime.time(22, 0)) for day in range(7)]
+    locations = ServiceLocation.objects.bulk_create(ServiceLocation(name=f"Location {i}", capacity=1) for i in range(100))
+    through = ServiceLocation.available_days.through
+    through.objects.bulk_create(
+        through(servicelocation_id=location.pk, workday_id=workday.pk) for location in locations for workday in rng.sample(workdays, 5)
+    )
+    today = timezone.localdate()
+    bookings = []
+    for location in locations:
+        for _ in range(30):
+            start = timezone.make_aware(
+                datetime.datetime.combine(today + datetime.timedelta(days=rng.randint(0, 30)), datetime.time(rng.randint(8, 20)))
+            )
+            bookings.append(Booking(location=location, start=start, end=start + datetime.timedelta(hours=rng.randint(1, 3))))
+    Booking.objects.bulk_create(bookings)
+
+    index = SlotIndex(step_minutes=30)
+    index.build()
+    month = (today.year, today.month)
+    two_hours = datetime.timedelta(hours=2)
+
+    def cold():
+        BookingCalendar(index=index).render(*month, duration=two_hours, today=today.replace(day=1))
+
+    def invalidated():
+        index.schedules_changed(*(location.pk for location in locations))
+        BookingCalendar(index=index).render(*month, duration=two_hours, today=today.replace(day=1))
+
+    warm = BookingCalendar(index=index)
+    report("render[100 locations, cold]", measure(cold))
+    report("render[100 locations, after schedule change]", measure(invalidated))
+    report("render[100 locations, memoized]", measure(lambda: warm.render(*month, duration=two_hours, today=today.replace(day=1))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Конкурентные чтения и записи из потоков и асинхронных задач при разных настройках базы
+
+    python benchmarks/bench_db_concurrency.py
+
+Режимы SQLite сравниваются всегда. Для PostgreSQL (с пулом и без) укажите
+отдельную базу для бенчмарка в BENCH_POSTGRES_NAME и доступ в DATABASE_USER,
+DATABASE_PASSWORD, DATABASE_HOST; для пула нужен psycopg[pool].
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess  # nosec B404
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import report, setup_django
+
+THREADS = 16
+THREAD_OPERATIONS = 200
+TASKS = 200
+TASK_OPERATIONS = 10
+WRITE_RATIO = 0.2
+LOCATIONS = 50
+USERS = 200
+
+# Режим: (переменные окружения, OPTIONS SQLite; None — из настроек)
+MODES = {
+    "sqlite-rollback-journal": ({}, {}),
+    "sqlite-wal": ({}, None),
+    "postgres": ({"DJANGO_ENV": "production", "DATABASE_POOL": "false"}, None),
+    "postgres-pool": ({"DJANGO_ENV": "production", "DATABASE_POOL": "true"}, None),
+}
+
+
+def prepare():
+    """
+    Места с расписаниями и пользователи для нагрузки
+    """
+    from bot_admin.models import Booking, ServiceLocation, TelegramUser, WorkDay  # pylint: disable=C0415
+
+    Booking.objects.all().delete()
+    ServiceLocation.objects.filter(name__startswith="bench-").delete()
+    TelegramUser.objects.filter(first_name="bench").delete()
+    workdays = [
+        WorkDay.objects.get_or_create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(21, 0))[0] for day in range(7)
+    ]
+    locations = ServiceLocation.objects.bulk_create(ServiceLocation(name=f"bench-{i}") for i in range(LOCATIONS))
+    through = ServiceLocation.available_days.through
+    through.objects.bulk_create(
+        through(servicelocation_id=location.pk, workday_id=workday.pk) for location in locations for workday in workdays
+    )
+    users = TelegramUser.objects.bulk_create(TelegramUser(first_name="bench") for _ in range(USERS))
+    return [location.pk for location in locations], [user.pk for user in users]
+
+
+def operations(location_ids, user_ids):
+    """
+    Синхронная и асинхронная операции: чтение расписания места или запись пользователя и бронирования
+    """
+    from django.db import OperationalError, transaction  # pylint: disable=C0415
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.models import Booking, ServiceLocation, TelegramUser  # pylint: disable=C0415
+    from bot_admin.schedule_cache import aload_weekly_schedules, load_weekly_schedules  # pylint: disable=C0415
+
+    def sync_operation(rng):
+        try:
+            location_id = rng.choice(location_ids)
+            if rng.random() >= WRITE_RATIO:
+                ServiceLocation.objects.get(pk=location_id)
+                load_weekly_schedules([location_id])
+                return True
+            with transaction.atomic():
+                TelegramUser.objects.filter(pk=rng.choice(user_ids)).update(datetime=timezone.now())
+                start = timezone.now() + datetime.timedelta(days=rng.randint(1, 30))
+                Booking.objects.create(location_id=location_id, start=start, end=start + datetime.timedelta(hours=1))
+            return True
+        except OperationalError:
+            return False
+
+    async def async_operation(rng):
+        try:
+            location_id = rng.choice(location_ids)
+            if rng.random() >= WRITE_RATIO:
+                await ServiceLocation.objects.aget(pk=location_id)
+                await aload_weekly_schedules([location_id])
+                return True
+            await TelegramUser.objects.filter(pk=rng.choice(user_ids)).aupdate(datetime=timezone.now())
+            start = timezone.now() + datetime.timedelta(days=rng.randint(1, 30))
+            await Booking.objects.acreate(location_id=location_id, start=start, end=start + datetime.timedelta(hours=1))
+            return True
+        except OperationalError:
+            return False
+
+    return sync_operation, async_operation
+
+
+def run_threads(sync_operation):
+    """
+    THREADS потоков по THREAD_OPERATIONS операций
+    """
+    from django.db import connection  # pylint: disable=C0415
+
+    results = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        outcome = [sync_operation(rng) for _ in range(THREAD_OPERATIONS)]
+        connection.close()
+        results.extend(outcome)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(results, time.perf_counter() - started)
+
+
+def run_tasks(async_operation):
+    """
+    TASKS асинхронных задач по TASK_OPERATIONS операций
+    """
+
+    async def task(seed):
+        rng = random.Random(seed)
+        return [await async_operation(rng) for _ in range(TASK_OPERATIONS)]
+
+    async def run():
+        return await asyncio.gather(*(task(seed) for seed in range(TASKS)))
+
+    started = time.perf_counter()
+    results = [outcome for outcomes in asyncio.run(run()) for outcome in outcomes]
+    return summarize(results, time.perf_counter() - started)
+
+
+def summarize(results, elapsed):
+    """
+    Пропускная способность и число ошибок блокировки
+    """
+    return {"operations": len(results), "errors": results.count(False), "seconds": elapsed, "ops_per_s": len(results) / elapsed}
+
+
+def run_mode(mode):
+    """
+    Прогон одного режима в текущем процессе; результат печатается в JSON
+    """
+    _, options = MODES[mode]
+    with tempfile.TemporaryDirectory() as directory:
+        database_name = Path(directory) / "bench.sqlite3" if mode.startswith("sqlite") else None
+        setup_django(database_name, options)
+        sync_operation, async_operation = operations(*prepare())
+        print(json.dumps({"threads": run_threads(sync_operation), "async": run_tasks(async_operation)}))
+
+
+def main():
+    modes = [mode for mode in MODES if mode.startswith("sqlite") or os.environ.get("BENCH_POSTGRES_NAME")]
+    for mode in modes:
+        environment, _ = MODES[mode]
+        env = {**os.environ, **environment}
+        if mode.startswith("postgres"):
+            env["DATABASE_NAME"] = os.environ["BENCH_POSTGRES_NAME"]
+        completed = subprocess.run([sys.executable, __file__, mode], env=env, capture_output=True, text=True, check=False)  # nosec B603
+        if completed.returncode:
+            print(f"{mode}: failed\n{completed.stderr.strip().splitlines()[-1] if completed.stderr else ''}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        for kind, values in result.items():
+            report(f"{mode}[{kind}]", values)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_mode(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,113 @@
+"""Потоковая выгрузка бронирований против загрузки всего QuerySet в память
+
+    python benchmarks/bench_export.py [строк ...]
+
+Каждый прогон выполняется в отдельном процессе, пиковый RSS (ru_maxrss)
+отсчитывается от RSS процесса до выгрузки. mmap SQLite отключён: страницы
+отображённого файла базы тоже попадали бы в RSS.
+"""
+
+import datetime
+import json
+import resource
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import report, setup_django
+
+ROWS = (100_000, 1_000_000)
+LOCATIONS = 100
+USERS = 1000
+MODES = ("stream-csv", "stream-xlsx", "naive-csv")
+
+
+def prepare(rows):
+    """
+    Места, пользователи и rows бронирований
+    """
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.models import Booking, ServiceLocation, TelegramUser  # pylint: disable=C0415
+
+    locations = ServiceLocation.objects.bulk_create(ServiceLocation(name=f"bench-{i}", city="Москва") for i in range(LOCATIONS))
+    users = TelegramUser.objects.bulk_create(TelegramUser(telegram_id=i, first_name=f"user {i}") for i in range(USERS))
+    start = timezone.now()
+    batch = []
+    for number in range(rows):
+        begin = start + datetime.timedelta(hours=number)
+        batch.append(
+            Booking(
+                location_id=locations[number % LOCATIONS].pk,
+                user_id=users[number % USERS].pk,
+                start=begin,
+                end=begin + datetime.timedelta(hours=1),
+            )
+        )
+        if len(batch) == 10000:
+            Booking.objects.bulk_create(batch)
+            batch = []
+    Booking.objects.bulk_create(batch)
+
+
+def naive_csv():
+    """
+    Выгрузка «в лоб»: все объекты и весь файл в памяти
+    """
+    import csv  # pylint: disable=C0415
+    import io  # pylint: disable=C0415
+
+    from bot_admin.models import Booking  # pylint: disable=C0415
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for booking in list(Booking.objects.select_related("location", "user")):
+        writer.writerow(
+            [booking.pk, booking.location.name, booking.user.telegram_id, booking.start, booking.end, booking.status, booking.created_at]
+        )
+    yield output.getvalue().encode()
+
+
+def run_mode(mode, database):
+    """
+    Выгрузка в текущем процессе; результат печатается в JSON
+    """
+    setup_django(database, {})
+    from bot_admin.export import export_chunks  # pylint: disable=C0415
+    from bot_admin.models import Booking  # pylint: disable=C0415
+
+    rows = Booking.objects.count()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    chunks = naive_csv() if mode == "naive-csv" else export_chunks("bookings", mode.split("-")[1])
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"rows": rows, "mb": size / 2**20, "rows_per_s": rows / elapsed, "peak_rss_growth_mb": (peak - baseline) / 1024}))
+
+
+def main(sizes):
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            database = str(Path(directory) / "bench.sqlite3")
+            completed = subprocess.run([sys.executable, __file__, "prepare", database, str(rows)], check=True)  # nosec B603
+            for mode in MODES:
+                completed = subprocess.run(
+                    [sys.executable, __file__, "run", mode, database], capture_output=True, text=True, check=False
+                )  # nosec B603
+                if completed.returncode:
+                    print(f"{mode}[{rows}]: failed\n{completed.stderr.strip().splitlines()[-1] if completed.stderr else ''}")
+                    continue
+                report(f"{mode}[{rows}]", json.loads(completed.stdout.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "prepare":
+        setup_django(sys.argv[2], {})
+        prepare(int(sys.argv[3]))
+    elif len(sys.argv) > 3 and sys.argv[1] == "run":
+        run_mode(sys.argv[2], sys.argv[3])
+    else:
+        main([int(value) for value in sys.argv[1:]] or ROWS)
@@ -0,0 +1,47 @@
+"""Поиск ближайших мест на 100k синтетических координат
+
+python benchmarks/bench_geo.py
+"""
+
+import itertools
+import random
+
+from common import measure, report, setup_django
+
+LOCATIONS = 100_000
+
+
+def main():
+    setup_django()
+
+    from bot_admin.geo import GeoIndex, haversine, locations_within, nearest_locations  # pylint: disable=C0415
+    from bot_admin.models import ServiceLocation  # pylint: disable=C0415
+
+    rng = random.Random(9)
+    ServiceLocation.objects.bulk_create(
+        (
+            ServiceLocation(name=f"Location {i}", latitude=round(rng.uniform(41.0, 70.0), 6), longitude=round(rng.uniform(20.0, 180.0), 6))
+            for i in range(LOCATIONS)
+        ),
+        batch_size=5000,
+    )
+    points = [(pk, float(lat), float(lon)) for pk, lat, lon in ServiceLocation.objects.values_list("pk", "latitude", "longitude")]
+    queries = [(rng.uniform(45.0, 65.0), rng.uniform(30.0, 150.0)) for _ in range(50)]
+    cycle = itertools.cycle(queries)
+
+    index = GeoIndex()
+    report("geo_index.build", measure(index.build, repeat=3, warmup=0))
+    report("geo_index.nearest[10]", measure(lambda: index.nearest(*next(cycle), 10)))
+    report("geo_index.within[25km]", measure(lambda: index.within(*next(cycle), 25)))
+    report("sql.locations_within[25km]", measure(lambda: locations_within(*next(cycle), 25), repeat=20))
+    report("sql.nearest_locations[10]", measure(lambda: nearest_locations(*next(cycle), 10), repeat=20))
+
+    def brute_force(count=10):
+        lat, lon = next(cycle)
+        return sorted(haversine(lat, lon, plat, plon) for _, plat, plon in points)[:count]
+
+    report("python.brute_force[10]", measure(brute_force, repeat=5, warmup=1))
+
+
+if __name__ == "__main__":
+    main()
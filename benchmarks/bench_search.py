@@ -0,0 +1,54 @@
+"""Задержка поиска и автодополнения в зависимости от числа мест
+
+python benchmarks/bench_search.py
+"""
+
+import random
+
+from common import measure, report, setup_django
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", "Нижний Новгород", "Самара", "Ростов-на-Дону"]
+STREETS = ["Тверская", "Невский пр.", "Баумана", "Ленина", "Мира", "Садовая", "Гагарина", "Пушкина", "Советская", "Кирова"]
+KINDS = ["Конференц-зал", "Коворкинг", "Лофт", "Студия", "Переговорная", "Апартаменты", "Склад", "Шоурум"]
+
+
+def main():
+    setup_django()
+
+    from django.db.models import Q  # pylint: disable=C0415
+
+    from bot_admin.models import ServiceLocation  # pylint: disable=C0415
+    from bot_admin.search import autocomplete, search_location_ids  # pylint: disable=C0415
+
+    rng = random.Random(3)
+    total = 0
+    for count in (1_000, 10_000, 50_000):
+        ServiceLocation.objects.bulk_create(
+            (
+                ServiceLocation(
+                    name=f"{rng.choice(KINDS)} {rng.randint(1, 999)}",
+                    city=rng.choice(CITIES),
+                    rest_of_address=f"ул. {rng.choice(STREETS)}, д. {rng.randint(1, 200)}",
+                )
+                for _ in range(count - total)
+            ),
+            batch_size=5000,
+        )
+        total = count
+        report(f"search[{count}] 'Переговорнная Тверская'", measure(lambda: search_location_ids("Переговорнная Тверская"), repeat=20))
+        report(f"autocomplete[{count}] 'Лоф'", measure(lambda: autocomplete("Лоф"), repeat=20))
+        report(
+            f"icontains[{count}] 'Тверская'",
+            measure(
+                lambda: list(
+                    ServiceLocation.objects.filter(
+                        Q(name__icontains="Тверская") | Q(city__icontains="Тверская") | Q(rest_of_address__icontains="Тверская")
+                    ).values_list("pk", flat=True)[:10]
+                ),
+                repeat=20,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Поиск ближайших свободных слотов по SlotIndex для сотен мест
+
+python benchmarks/bench_slot_index.py
+"""
+
+import datetime
+import random
+
+from common import measure, report, setup_django
+
+
+def main():
+    setup_django()
+
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.models import Booking, ServiceLocation, WorkDay  # pylint: disable=C0415
+    from bot_admin.slot_index import SlotIndex  # pylint: disable=C0415
+
+    rng = random.Random(42)
+    workdays = [WorkDay.objects.create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(21, 0)) for day in range(6)]
+    today = timezone.localdate()
+    for count in (100, 300, 1000):
+        ServiceLocation.objects.all().delete()
+        locations = ServiceLocation.objects.bulk_create(
+            ServiceLocation(name=f"Location {i}", capacity=rng.randint(1, 3)) for i in range(count)
+        )
+        through = ServiceLocation.available_days.through
+        through.objects.bulk_create(
+            through(servicelocation_id=location.pk, workday_id=workday.pk) for location in locations for workday in workdays
+        )
+        bookings = []
+        for location in locations:
+            for _ in range(20):
+                start = timezone.make_aware(
+                    datetime.datetime.combine(today + datetime.timedelta(days=rng.randint(0, 13)), datetime.time(rng.randint(9, 19)))
+                )
+                bookings.append(Booking(location=location, start=start, end=start + datetime.timedelta(hours=rng.randint(1, 2))))
+        Booking.objects.bulk_create(bookings)
+
+        index = SlotIndex()
+        report(f"build[{count}]", measure(index.build, repeat=3, warmup=0))
+        report(
+            f"find_free_slots[{count}]",
+            measure(
+                lambda: index.find_free_slots(
+                    today + datetime.timedelta(days=7), datetime.timedelta(hours=2), days=7, limit=10, time_from=datetime.time(10, 0)
+                )
+            ),
+        )
+        booking = bookings[0]
+        statuses = [Booking.STATUS_CANCELLED, Booking.STATUS_CONFIRMED]
+
+        def toggle(booking=booking, statuses=statuses):
+            statuses.reverse()
+            index.booking_changed(booking.pk, booking.location_id, booking.start, booking.end, statuses[0])
+
+        report(f"booking_changed[{count}]", measure(toggle))
+
+
+if __name__ == "__main__":
+    main()
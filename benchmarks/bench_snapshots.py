@@ -0,0 +1,89 @@
+"""Снимки мест (bot_admin.snapshots) против моделей ServiceLocation с prefetch_related
+
+    python benchmarks/bench_snapshots.py
+
+Сравниваются время построения 10 000 мест с расписаниями, занимаемая ими
+память (tracemalloc, объекты удерживаются после построения) и скорость
+сериализации: JSON снимков против pickle моделей.
+"""
+
+import datetime
+import gc
+import pickle  # nosec B403
+import random
+import tracemalloc
+
+from common import measure, report, setup_django
+
+LOCATIONS = 10_000
+
+
+def prepare():
+    """
+    Места с расписанием из 5-7 дней
+    """
+    from bot_admin.models import ServiceLocation, WorkDay  # pylint: disable=C0415
+
+    rng = random.Random(5)
+    workdays = [
+        WorkDay.objects.create(day=day, start_time=datetime.time(start), end_time=datetime.time(end))
+        for day in range(7)
+        for start, end in ((8, 20), (9, 18), (10, 22))
+    ]
+    locations = ServiceLocation.objects.bulk_create(
+        ServiceLocation(
+            name=f"Location {number}", city="Москва", rest_of_address=f"ул. Тестовая, {number}", latitude=55.75, longitude=37.62
+        )
+        for number in range(LOCATIONS)
+    )
+    through = ServiceLocation.available_days.through
+    through.objects.bulk_create(
+        through(servicelocation_id=location.pk, workday_id=workdays[day * 3 + rng.randrange(3)].pk)
+        for location in locations
+        for day in rng.sample(range(7), rng.randint(5, 7))
+    )
+
+
+def retained_mb(build):
+    """
+    Память, занятая результатом build(), в мегабайтах
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 2**20
+
+
+def main():
+    setup_django()
+    prepare()
+
+    from bot_admin.models import ServiceLocation, WorkDay  # pylint: disable=C0415
+    from bot_admin.snapshots import dumps, loads, location_snapshots  # pylint: disable=C0415
+    from django.db.models import Prefetch  # pylint: disable=C0415
+
+    def models():
+        return list(ServiceLocation.objects.prefetch_related(Prefetch("available_days", queryset=WorkDay.objects.order_by("day"))))
+
+    report("build[models + prefetch]", {**measure(models, repeat=5, warmup=1), "retained_mb": retained_mb(models)})
+    report("build[snapshots]", {**measure(location_snapshots, repeat=5, warmup=1), "retained_mb": retained_mb(location_snapshots)})
+
+    instances = models()
+    pickled = pickle.dumps(instances)
+    report("serialize[pickle models]", {**measure(lambda: pickle.dumps(instances), repeat=10), "mb": len(pickled) / 2**20})
+    report("deserialize[pickle models]", measure(lambda: pickle.loads(pickled), repeat=10))  # nosec B301
+
+    snapshots = location_snapshots()
+    data = dumps(snapshots)
+    report("serialize[snapshots json]", {**measure(lambda: dumps(snapshots), repeat=10), "mb": len(data) / 2**20})
+    report("deserialize[snapshots json]", measure(lambda: loads(data), repeat=10))
+
+    monday, noon = datetime.date(2025, 9, 1), datetime.time(12)
+    report("is_available x10000[snapshots]", measure(lambda: [snapshot.is_available(monday, noon) for snapshot in snapshots], repeat=10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Нагрузочный тест вебхука: воспроизведение обновлений против локального сервера
+
+    python benchmarks/bench_webhook.py [updates.jsonl]
+
+Файл — записанные обновления Telegram по одному JSON на строку (например,
+результаты getUpdates); без него генерируются UPDATES сообщений из CHATS чатов.
+ASGI-приложение обслуживается минимальным мостом на aiohttp, чтобы не
+требовать uvicorn. Для сравнения тот же обработчик вызывается до ответа
+Telegram (как без очереди).
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, TCPConnector, web
+from common import report, setup_django
+
+UPDATES = 5000
+CHATS = 500
+# Telegram по умолчанию держит до 40 одновременных соединений вебхука (max_connections)
+CONCURRENCY = 40
+# Типичная обработка: запросы к базе и ответ через Bot API
+HANDLER_SECONDS = 0.05
+PATH = "/telegram/webhook/"
+
+
+def load_updates(path=None):
+    """
+    Записанные обновления или синтетические сообщения
+    """
+    if path:
+        with open(path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+    return [
+        {"update_id": i, "message": {"message_id": i, "date": 0, "chat": {"id": i % CHATS, "type": "private"}, "text": "/start"}}
+        for i in range(UPDATES)
+    ]
+
+
+async def serve_asgi(app, port):
+    """
+    Обслуживание ASGI-приложения через aiohttp (только HTTP без потоковой передачи)
+    """
+
+    async def handle(request):
+        body = await request.read()
+        scope = {
+            "type": "http",
+            "method": request.method,
+            "path": request.path,
+            "headers": [(key.lower().encode(), value.encode()) for key, value in request.headers.items()],
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {}
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            else:
+                response["body"] = response.get("body", b"") + message.get("body", b"")
+
+        await app(scope, receive, send)
+        return web.Response(status=response["status"], body=response.get("body", b""))
+
+    server = web.Server(handle)
+    runner = web.ServerRunner(server)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner
+
+
+async def replay(updates, port):
+    """
+    Отправка обновлений с CONCURRENCY параллельными соединениями; задержки ответов в мс
+    """
+    latencies = []
+    statuses = []
+    pending = iter(updates)
+
+    async def client(session):
+        for update in pending:
+            started = time.perf_counter()
+            async with session.post(f"http://127.0.0.1:{port}{PATH}", json=update) as response:
+                await response.read()
+                statuses.append(response.status)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async with ClientSession(connector=TCPConnector(limit=CONCURRENCY)) as session:
+        await asyncio.gather(*(client(session) for _ in range(CONCURRENCY)))
+    return latencies, statuses
+
+
+async def run(updates, queued):
+    """
+    Один прогон: с очередью (queued) или с обработкой до ответа
+    """
+    from bot_admin.updates import UpdateWorkerPool  # pylint: disable=C0415
+    from bot_admin.webhook import WebhookApplication  # pylint: disable=C0415
+
+    async def handler(update):  # pylint: disable=W0613
+        await asyncio.sleep(HANDLER_SECONDS)
+
+    async def not_found(scope, receive, send):  # pylint: disable=W0613
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    if queued:
+        pool = UpdateWorkerPool(handler, workers=256, maxsize=10000)
+        app = WebhookApplication(not_found, pool, PATH)
+    else:
+
+        async def app(scope, receive, send):
+            message = await receive()
+            await handler(json.loads(message["body"]))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+    runner = await serve_asgi(app, 8765)
+    started = time.perf_counter()
+    latencies, statuses = await replay(updates, 8765)
+    acknowledged = time.perf_counter() - started
+    if queued:
+        await pool.stop()
+    processed = time.perf_counter() - started
+    await runner.cleanup()
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "rejected": sum(status != 200 for status in statuses),
+        "ack_per_s": len(updates) / acknowledged,
+        "processed_per_s": len(updates) / processed,
+        "ack_median_ms": statistics.median(latencies),
+        "ack_p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    setup_django()
+    updates = load_updates(sys.argv[1] if len(sys.argv) > 1 else None)
+    report("webhook[queue]", asyncio.run(run(updates, queued=True)))
+    report("webhook[inline]", asyncio.run(run(updates, queued=False)))
+
+
+if __name__ == "__main__":
+    main()
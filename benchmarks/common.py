@@ -0,0 +1,59 @@
+"""Общие утилиты бенчмарков"""
+
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def setup_django(database_name=":memory:", options=None):
+    """
+    Настройка Django на отдельной базе SQLite (по умолчанию в памяти) и применение миграций.
+    database_name=None оставляет базу из настроек, options заменяет OPTIONS базы.
+    """
+    sys.path.insert(0, str(SRC_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smartbookingagent.settings")
+    os.environ.setdefault("DJANGO_ENV", "development")
+
+    import django  # pylint: disable=C0415
+    from django.conf import settings  # pylint: disable=C0415
+
+    if database_name is not None:
+        settings.DATABASES["default"]["NAME"] = database_name
+    if options is not None:
+        settings.DATABASES["default"]["OPTIONS"] = options
+    django.setup()
+
+    from django.core.management import call_command  # pylint: disable=C0415
+
+    call_command("migrate", verbosity=0)
+
+
+def measure(func, repeat=100, warmup=3):
+    """
+    Время выполнения func в миллисекундах: медиана, минимум и 95-й перцентиль
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": samples[0],
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def report(name, result):
+    """
+    Вывод результата в одну строку
+    """
+    values = ", ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}" for key, value in result.items())
+    print(f"{name}: {values}")
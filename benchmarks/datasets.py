@@ -0,0 +1,89 @@
+"""Синтетические данные бенчмарков: места с расписаниями, пользователи и бронирования"""
+
+import datetime
+import random
+from dataclasses import dataclass
+
+# Масштаб: места, пользователи, бронирования
+SCALES = {
+    "small": (100, 500, 5_000),
+    "medium": (1_000, 5_000, 50_000),
+    "large": (5_000, 20_000, 250_000),
+}
+
+# Варианты рабочего времени: весь день или интервал (часы)
+INTERVALS = ((None, None), (8, 20), (9, 18), (10, 22))
+
+
+@dataclass
+class Dataset:
+    """Созданные данные: id мест и пользователей, первый день бронирований"""
+
+    scale: str
+    location_ids: list
+    user_ids: list
+    bookings: int
+    today: datetime.date
+
+
+def generate(scale, seed=1):
+    """
+    Данные масштаба scale; одинаковый seed даёт одинаковый набор
+    """
+    from django.db import transaction  # pylint: disable=C0415
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.models import Booking, ServiceLocation, TelegramUser, WorkDay  # pylint: disable=C0415
+
+    locations, users, bookings = SCALES[scale]
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    with transaction.atomic():
+        workdays = WorkDay.objects.bulk_create(
+            WorkDay(
+                day=day,
+                start_time=datetime.time(start) if start is not None else None,
+                end_time=datetime.time(end) if end is not None else None,
+            )
+            for day in range(7)
+            for start, end in INTERVALS
+        )
+        by_day = [[workday for workday in workdays if workday.day == day] for day in range(7)]
+        created = ServiceLocation.objects.bulk_create(
+            ServiceLocation(
+                name=f"{rng.choice(('Переговорная', 'Коворкинг', 'Студия', 'Зал'))} {number}",
+                city=rng.choice(("Москва", "Санкт-Петербург", "Казань", "Новосибирск")),
+                rest_of_address=f"ул. Тестовая, {number}",
+                latitude=round(rng.uniform(43.0, 60.0), 6),
+                longitude=round(rng.uniform(30.0, 90.0), 6),
+                capacity=rng.randint(1, 5),
+            )
+            for number in range(locations)
+        )
+        through = ServiceLocation.available_days.through
+        through.objects.bulk_create(
+            through(servicelocation_id=location.pk, workday_id=rng.choice(by_day[day]).pk)
+            for location in created
+            for day in sorted(rng.sample(range(7), rng.randint(5, 7)))
+        )
+        user_rows = TelegramUser.objects.bulk_create(
+            TelegramUser(telegram_id=1_000_000 + number, first_name=f"User {number}", language_code="ru") for number in range(users)
+        )
+        batch = []
+        for _ in range(bookings):
+            day = today + datetime.timedelta(days=rng.randint(-30, 60))
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(rng.randint(8, 19))))
+            batch.append(
+                Booking(
+                    location_id=rng.choice(created).pk,
+                    user_id=rng.choice(user_rows).pk,
+                    start=start,
+                    end=start + datetime.timedelta(hours=rng.randint(1, 3)),
+                    status=Booking.STATUS_CANCELLED if rng.random() < 0.1 else Booking.STATUS_CONFIRMED,
+                )
+            )
+            if len(batch) == 10_000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+    return Dataset(scale, [location.pk for location in created], [user.pk for user in user_rows], bookings, today)
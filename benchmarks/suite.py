@@ -0,0 +1,273 @@
+"""Набор бенчмарков сценариев бронирования с JSON-результатами и сравнением с базовой линией
+
+    python benchmarks/suite.py [--scale small medium] [--scenario calendar export]
+                               [--output results.json] [--baseline benchmarks/baseline.json]
+                               [--threshold 0.25] [--save-baseline]
+
+Каждый масштаб (datasets.SCALES) прогоняется в отдельном процессе на своей
+базе SQLite с настройками проекта. Медианы *median_ms сравниваются как
+«меньше — лучше», *_per_s и *_per_hour — как «больше — лучше»; минимум и
+p95 только записываются, p95 слишком шумный для порога. Если сценарий медленнее
+базовой линии больше чем на threshold, процесс завершается с кодом 1.
+Базовая линия зависит от машины: после смены оборудования её нужно
+перезаписать с --save-baseline.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess  # nosec B404
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import measure, report, setup_django
+from datasets import SCALES, generate
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SCENARIOS = {}
+
+
+def scenario(name):
+    """
+    Регистрация сценария: функция получает Dataset и возвращает словарь метрик
+    """
+
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+@scenario("availability")
+def availability(dataset):
+    """
+    Проверка доступности мест по расписанию и поиск свободных интервалов
+    """
+    from bot_admin.models import ServiceLocation  # pylint: disable=C0415
+    from bot_admin.slot_index import slot_index  # pylint: disable=C0415
+
+    rng = random.Random(3)
+    locations = list(ServiceLocation.objects.filter(pk__in=rng.sample(dataset.location_ids, min(200, len(dataset.location_ids)))))
+    checks = [
+        (rng.choice(locations), dataset.today + datetime.timedelta(days=rng.randint(0, 30)), datetime.time(rng.randint(0, 23)))
+        for _ in range(1000)
+    ]
+
+    def is_available():
+        for location, date, time_of_day in checks:
+            location.is_available(date, time_of_day)
+
+    slot_index.build()
+    result = {f"is_available_x1000_{key}": value for key, value in measure(is_available, repeat=30).items()}
+    free_slots = measure(lambda: slot_index.find_free_slots(dataset.today, datetime.timedelta(hours=2), days=7, limit=10), repeat=30)
+    result.update({f"free_slots_{key}": value for key, value in free_slots.items()})
+    return result
+
+
+@scenario("calendar")
+def calendar(dataset):
+    """
+    Календарь месяца по всем местам без кэша разметки
+    """
+    from bot_admin.calendar_keyboard import BookingCalendar  # pylint: disable=C0415
+    from bot_admin.slot_index import slot_index  # pylint: disable=C0415
+
+    slot_index.build()
+    month = (dataset.today.year, dataset.today.month)
+    two_hours = datetime.timedelta(hours=2)
+
+    def render():
+        slot_index.schedules_changed(*dataset.location_ids)
+        BookingCalendar(index=slot_index).render(*month, duration=two_hours, today=dataset.today.replace(day=1))
+
+    return measure(render, repeat=20)
+
+
+@scenario("admin_changelist")
+def admin_changelist(dataset):  # pylint: disable=W0613
+    """
+    Страницы списков мест и бронирований в админке
+    """
+    from django.contrib.auth import get_user_model  # pylint: disable=C0415
+    from django.test import Client  # pylint: disable=C0415
+    from django.test.utils import setup_test_environment  # pylint: disable=C0415
+
+    setup_test_environment()
+    client = Client()
+    user = get_user_model().objects.filter(username="bench").first()
+    client.force_login(user or get_user_model().objects.create_superuser("bench", "bench@example.com", "bench"))
+
+    def page(url):
+        response = client.get(url, secure=True)
+        assert response.status_code == 200, response.status_code  # nosec B101
+
+    result = {}
+    for name, url in (("locations", "/admin/bot_admin/servicelocation/"), ("bookings", "/admin/bot_admin/booking/")):
+        result.update({f"{name}_{key}": value for key, value in measure(lambda url=url: page(url), repeat=20).items()})
+    return result
+
+
+@scenario("booking_contention")
+def booking_contention(dataset, threads=8, attempts=50):
+    """
+    Бронирование из нескольких потоков на немногих местах: пропускная
+    способность и проверка, что вместимость не превышена
+    """
+    from django.db import connection  # pylint: disable=C0415
+    from django.utils import timezone  # pylint: disable=C0415
+
+    from bot_admin.booking import BookingError, overlapping, peak_occupancy, reserve  # pylint: disable=C0415
+    from bot_admin.models import ServiceLocation  # pylint: disable=C0415
+
+    hot = dataset.location_ids[:5]
+    day = dataset.today + datetime.timedelta(days=90)
+    outcomes = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(attempts):
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(rng.randint(8, 18))))
+            try:
+                reserve(rng.choice(hot), start, start + datetime.timedelta(hours=1), user=None)
+                outcomes.append(True)
+            except BookingError:
+                outcomes.append(False)
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = start + datetime.timedelta(days=1)
+    overbooked = sum(
+        peak_occupancy(overlapping(location.pk, start, end).values_list("start", "end"), start, end) > location.capacity
+        for location in ServiceLocation.objects.filter(pk__in=hot)
+    )
+    return {
+        "attempts": len(outcomes),
+        "booked": outcomes.count(True),
+        "overbooked_locations": overbooked,
+        "reserve_per_s": len(outcomes) / elapsed,
+        "reserve_per_hour": len(outcomes) / elapsed * 3600,
+    }
+
+
+@scenario("export")
+def export(dataset):
+    """
+    Потоковая выгрузка всех бронирований в CSV
+    """
+    from bot_admin.export import export_chunks  # pylint: disable=C0415
+
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in export_chunks("bookings", "csv"))
+    elapsed = time.perf_counter() - started
+    return {"rows": dataset.bookings, "mb": size / 2**20, "rows_per_s": dataset.bookings / elapsed}
+
+
+def run_scale(scale, names, database):
+    """
+    Прогон сценариев names на данных масштаба scale в текущем процессе; результат печатается в JSON
+    """
+    setup_django(database, None)
+    dataset = generate(scale)
+    results = {}
+    for name in names:
+        results[name] = SCENARIOS[name](dataset)
+    print(json.dumps(results))
+
+
+def environment():
+    """
+    Описание окружения для файла результатов
+    """
+    import sqlite3  # pylint: disable=C0415
+
+    import django  # pylint: disable=C0415
+
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Регрессии относительно baseline: [(ключ, метрика, было, стало)]
+    """
+    regressions = []
+    for key, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(key, {}).get(metric)
+            if not base or not isinstance(value, (int, float)):
+                continue
+            if metric.endswith("median_ms") and value > base * (1 + threshold):
+                regressions.append((key, metric, base, value))
+            elif metric.endswith(("_per_s", "_per_hour")) and value < base / (1 + threshold):
+                regressions.append((key, metric, base, value))
+            elif metric == "overbooked_locations" and value > base:
+                regressions.append((key, metric, base, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", nargs="+", choices=sorted(SCALES), default=["small"])
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="Baseline JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before a metric counts as regressed")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with these results")
+    options = parser.parse_args(argv)
+
+    results = {}
+    for scale in options.scale:
+        with tempfile.TemporaryDirectory() as directory:
+            command = [sys.executable, __file__, "run", scale, ",".join(options.scenario), str(Path(directory) / "bench.sqlite3")]
+            completed = subprocess.run(command, capture_output=True, text=True, check=False)  # nosec B603
+        if completed.returncode:
+            print(f"{scale}: failed\n{completed.stderr.strip()}")
+            return 2
+        for name, metrics in json.loads(completed.stdout.strip().splitlines()[-1]).items():
+            results[f"{name}[{scale}]"] = metrics
+            report(f"{name}[{scale}]", metrics)
+
+    document = {"environment": environment(), "results": results}
+    if options.output:
+        options.output.write_text(json.dumps(document, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    if options.save_baseline:
+        baseline = json.loads(options.baseline.read_text(encoding="utf-8")) if options.baseline.exists() else {"results": {}}
+        document["results"] = {**baseline["results"], **results}
+        options.baseline.write_text(json.dumps(document, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {options.baseline}")
+        return 0
+    if not options.baseline.exists():
+        print(f"No baseline at {options.baseline}; run with --save-baseline to create one")
+        return 0
+    regressions = compare(results, json.loads(options.baseline.read_text(encoding="utf-8"))["results"], options.threshold)
+    for key, metric, base, value in regressions:
+        print(f"REGRESSION {key} {metric}: {base:.4f} -> {value:.4f}")
+    if not regressions:
+        print(f"No regressions against {options.baseline} (threshold {options.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 4 and sys.argv[1] == "run":
+        run_scale(sys.argv[2], sys.argv[3].split(","), sys.argv[4])
+    else:
+        sys.exit(main())
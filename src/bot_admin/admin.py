@@ -1,8 +1,49 @@
 """Admin Bot Admin"""
 
-from django.contrib import admin
+import datetime
 
-from .models import ServiceLocation, WorkDay
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import OuterRef, Prefetch, Subquery, Sum
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .availability import date_range
+from .export import export_response
+from .importer import LocationImportError, import_locations, read_rows
+from .models import Booking, OccupancyHour, OutboundMessage, ServiceLocation, TelegramUser, WorkDay
+from .occupancy import utilization
+from .search import search_location_ids
+
+
+def export_actions(name):
+    """
+    Действия админки для потоковой выгрузки выбранных строк в CSV и XLSX
+    """
+
+    def export_csv(modeladmin, request, queryset):  # pylint: disable=W0613
+        return export_response(name, "csv", queryset, asynchronous=isinstance(request, ASGIRequest))
+
+    def export_xlsx(modeladmin, request, queryset):  # pylint: disable=W0613
+        return export_response(name, "xlsx", queryset, asynchronous=isinstance(request, ASGIRequest))
+
+    return [
+        admin.action(description="Выгрузить в CSV")(export_csv),
+        admin.action(description="Выгрузить в Excel")(export_xlsx),
+    ]
+
+
+class LocationImportForm(forms.Form):
+    """
+    Файл импорта мест
+    """
+
+    file = forms.FileField(label="Файл")
+    fmt = forms.ChoiceField(label="Формат", choices=(("csv", "CSV"), ("json", "JSON")))
 
 
 @admin.register(ServiceLocation)
@@ -11,10 +52,75 @@ class ServiceLocationAdmin(admin.ModelAdmin):
     Административный интерфейс для управления местами оказания услуг.
     """
 
-    list_display = ("name", "city", "rest_of_address", "capacity", "get_working_hours")
+    list_display = ("name", "city", "rest_of_address", "capacity", "get_working_hours", "get_week_occupancy")
     search_fields = ("name", "city", "rest_of_address")
     filter_horizontal = ("available_days",)
     readonly_fields = ("get_address",)
+    actions = export_actions("locations")
+
+    def get_queryset(self, request):
+        """
+        Расписания всех строк страницы загружаются одним запросом,
+        занятость за неделю — подзапросом к агрегатам OccupancyHour
+        """
+        week = (
+            OccupancyHour.objects.filter(location=OuterRef("pk"), date__in=self.week_dates())
+            .values("location")
+            .annotate(total=Sum("booked_minutes"))
+            .values("total")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .prefetch_related(Prefetch("available_days", queryset=WorkDay.objects.order_by("day", "start_time")))
+            .annotate(week_booked_minutes=Subquery(week))
+        )
+
+    def get_urls(self):
+        view = self.admin_site.admin_view(self.import_view)
+        return [path("import/", view, name="bot_admin_servicelocation_import")] + super().get_urls()
+
+    def import_view(self, request):
+        """
+        Массовый импорт мест с расписанием из CSV или JSON
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = LocationImportForm(request.POST or None, request.FILES or None)
+        row_errors = []
+        if request.method == "POST" and form.is_valid():
+            try:
+                result = import_locations(read_rows(form.cleaned_data["file"].read(), form.cleaned_data["fmt"]))
+            except LocationImportError as error:
+                row_errors = error.errors[:50]
+            except ValueError as error:
+                form.add_error("file", str(error))
+            else:
+                self.message_user(request, f"Импортировано мест: {result.locations}, новых интервалов: {result.workdays}", messages.SUCCESS)
+                return redirect("admin:bot_admin_servicelocation_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Импорт мест",
+            "form": form,
+            "row_errors": row_errors,
+        }
+        return TemplateResponse(request, "admin/bot_admin/servicelocation/import.html", context)
+
+    def week_dates(self):
+        """
+        Последние семь дней, включая сегодня
+        """
+        today = timezone.localdate()
+        return date_range(today - datetime.timedelta(days=6), today)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Полнотекстовый и нечёткий поиск вместо icontains по search_fields
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_location_ids(search_term, limit=None)), False
 
     @admin.display(description="График работы")
     def get_working_hours(self, obj):
@@ -23,6 +129,14 @@ class ServiceLocationAdmin(admin.ModelAdmin):
         """
         return obj.get_working_hours()
 
+    @admin.display(description="Загрузка за 7 дней")
+    def get_week_occupancy(self, obj):
+        """
+        Доля занятой вместимости в рабочие часы за последние семь дней
+        """
+        ratio = utilization(obj, getattr(obj, "week_booked_minutes", None), self.week_dates())
+        return "-" if ratio is None else f"{ratio:.0%}"
+
     @admin.display(description="Полный адрес")
     def get_address(self, obj):
         """
@@ -40,3 +154,66 @@ class WorkDayAdmin(admin.ModelAdmin):
     list_display = ("__str__", "day", "start_time", "end_time")
     search_fields = ("day",)
     ordering = ("day",)
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    """
+    Административный интерфейс для управления бронированиями.
+    """
+
+    list_display = ("location", "user", "start", "end", "status")
+    list_filter = ("status",)
+    list_select_related = ("location", "user")
+    raw_id_fields = ("location", "user")
+    date_hierarchy = "start"
+    actions = export_actions("bookings")
+
+
+@admin.register(TelegramUser)
+class TelegramUserAdmin(admin.ModelAdmin):
+    """
+    Пользователи Telegram.
+    """
+
+    list_display = ("telegram_id", "first_name", "last_name", "username", "language_code", "is_premium", "datetime")
+    list_filter = ("is_premium", "language_code")
+    search_fields = ("=telegram_id", "username", "first_name", "last_name")
+    actions = export_actions("users")
+
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    """
+    Просмотр очереди исходящих сообщений бота.
+    """
+
+    list_display = ("chat_id", "method", "priority", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "priority", "method")
+    search_fields = ("chat_id",)
+    readonly_fields = ("attempts", "last_error", "created_at", "sent_at")
+
+
+@admin.register(OccupancyHour)
+class OccupancyHourAdmin(admin.ModelAdmin):
+    """
+    Занятость мест по часам: только просмотр агрегатов.
+    """
+
+    list_display = ("location", "date", "hour", "booked_minutes", "bookings", "get_utilization")
+    list_filter = ("location",)
+    list_select_related = ("location",)
+    date_hierarchy = "date"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Загрузка часа")
+    def get_utilization(self, obj):
+        """
+        Доля вместимости места, занятая в этот час
+        """
+        return f"{obj.booked_minutes / (60 * obj.location.capacity):.0%}" if obj.location.capacity else "-"
@@ -1,6 +1,8 @@
 """Main class Bot Admin"""
 
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class SbaAdminConfig(AppConfig):
@@ -8,3 +10,22 @@ class SbaAdminConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "bot_admin"
+
+    def ready(self):
+        # pylint: disable=C0415
+        from . import signals  # noqa: F401 pylint: disable=W0611
+        from .calendar_keyboard import booking_calendar
+        from .cards import location_cards
+        from .ingest import profile_buffer
+        from .metrics import install_query_metrics, registry
+        from .reminders import reminders
+        from .schedule_cache import schedule_cache
+
+        # Кэши и очереди процесса, чьи stats() выгружаются как gauge
+        registry.register_stats("schedule_cache", schedule_cache.stats)
+        registry.register_stats("location_cards", location_cards.stats)
+        registry.register_stats("calendar_keyboard", booking_calendar.stats)
+        registry.register_stats("reminders", reminders.stats)
+        registry.register_stats("profile_buffer", lambda: {"queued": len(profile_buffer), "flushes": profile_buffer.flushes})
+        if settings.METRICS_ENABLED:
+            connection_created.connect(install_query_metrics, dispatch_uid="bot_admin.metrics")
@@ -0,0 +1,78 @@
+"""Пакетная проверка доступности мест оказания услуг"""
+
+import datetime
+from dataclasses import dataclass
+
+from .schedule_cache import schedule_cache
+
+
+def time_slots(step_minutes: int = 30, start: datetime.time = datetime.time(0, 0), end: datetime.time = datetime.time(23, 59)):
+    """
+    Список слотов времени с шагом step_minutes в пределах [start, end]
+    """
+    if step_minutes <= 0:
+        raise ValueError("step_minutes must be positive")
+    slots = []
+    minute = start.hour * 60 + start.minute
+    last = end.hour * 60 + end.minute
+    while minute <= last:
+        slots.append(datetime.time(minute // 60, minute % 60))
+        minute += step_minutes
+    return slots
+
+
+def date_range(start: datetime.date, end: datetime.date):
+    """
+    Список дат от start до end включительно
+    """
+    return [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+@dataclass(frozen=True)
+class AvailabilityGrid:
+    """
+    Плотная сетка доступности: место × день × слот.
+
+    matrix[i][j][k] — доступно ли место location_ids[i] в день dates[j] в слот slots[k].
+    Строки для одинаковых дней недели разделяют один и тот же кортеж.
+    """
+
+    location_ids: tuple
+    dates: tuple
+    slots: tuple
+    matrix: tuple
+
+    def is_available(self, location_id, date, time):
+        """
+        Доступность места на дату и слот из сетки
+        """
+        row = self.location_ids.index(location_id)
+        return self.matrix[row][self.dates.index(date)][self.slots.index(time)]
+
+    def available_dates(self, location_id):
+        """
+        Даты, в которые место доступно хотя бы в один слот
+        """
+        row = self.matrix[self.location_ids.index(location_id)]
+        return [date for date, day_slots in zip(self.dates, row) if any(day_slots)]
+
+
+def availability_grid(locations, start: datetime.date, end: datetime.date, slots):
+    """
+    Построение сетки доступности для набора мест за диапазон дат.
+
+    Расписания берутся из schedule_cache; промахи загружаются одним SQL-запросом
+    вне зависимости от числа мест и дней. Семантика совпадает с
+    ServiceLocation.is_available.
+    """
+    location_ids = tuple(getattr(location, "pk", location) for location in locations)
+    slots = tuple(slots)
+    dates = tuple(date_range(start, end))
+    schedules = schedule_cache.get_many(location_ids)
+
+    matrix = []
+    for location_id in location_ids:
+        compiled = schedules[location_id]
+        week = [tuple(compiled.is_available(weekday, slot) for slot in slots) for weekday in range(7)]
+        matrix.append(tuple(week[date.weekday()] for date in dates))
+    return AvailabilityGrid(location_ids=location_ids, dates=dates, slots=slots, matrix=tuple(matrix))
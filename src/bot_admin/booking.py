@@ -0,0 +1,136 @@
+"""Сервис бронирования с учётом вместимости мест"""
+
+import contextlib
+import threading
+
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from .metrics import timed
+from .models import Booking, ServiceLocation
+
+# SQLite допускает только одного писателя: внутри процесса бронирования
+# сериализуются этой блокировкой, между процессами — блокировкой RESERVED
+_sqlite_lock = threading.Lock()
+
+
+class BookingError(Exception):
+    """Ошибка бронирования"""
+
+
+class CapacityExceeded(BookingError):
+    """Вместимость места на выбранный интервал исчерпана"""
+
+
+def peak_occupancy(intervals, start, end):
+    """
+    Максимальное число одновременно пересекающихся с [start, end) интервалов
+    """
+    events = []
+    for other_start, other_end in intervals:
+        events.append((max(other_start, start), 1))
+        events.append((min(other_end, end), -1))
+    # При совпадении времени окончание обрабатывается раньше начала
+    events.sort(key=lambda event: (event[0], event[1]))
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def overlapping(location_id, start, end, using=None):
+    """
+    Подтверждённые бронирования места, пересекающиеся с [start, end).
+    Один диапазонный запрос по индексу booking_overlap_idx.
+    """
+    return (
+        Booking.objects.using(using)
+        .filter(
+            location_id=location_id,
+            status=Booking.STATUS_CONFIRMED,
+            start__lt=end,
+            end__gt=start,
+        )
+        .order_by()
+    )
+
+
+def _lock_location(location_id, using):
+    """
+    Блокировка строки места до конца транзакции; возвращает вместимость
+    """
+    locations = ServiceLocation.objects.using(using).filter(pk=location_id)
+    if connections[using].features.has_select_for_update:
+        return locations.select_for_update().values_list("capacity", flat=True).get()
+    # Первая запись в транзакции SQLite захватывает блокировку RESERVED
+    locations.update(capacity=F("capacity"))
+    return locations.values_list("capacity", flat=True).get()
+
+
+@contextlib.contextmanager
+def _serialized(using):
+    """
+    Транзакция записи; на базах без SELECT ... FOR UPDATE (SQLite) ещё и под _sqlite_lock
+    """
+    serialize = not connections[using].features.has_select_for_update
+    if serialize:
+        _sqlite_lock.acquire()  # pylint: disable=R1732
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        if serialize:
+            _sqlite_lock.release()
+
+
+def _lock_booking(booking_id, using):
+    """
+    Блокировка строки бронирования до конца транзакции; возвращает её статус
+    """
+    bookings = Booking.objects.using(using).filter(pk=booking_id)
+    if connections[using].features.has_select_for_update:
+        return bookings.select_for_update().values_list("status", flat=True).get()
+    bookings.update(status=F("status"))
+    return bookings.values_list("status", flat=True).get()
+
+
+@timed("booking.reserve")
+def reserve(location, start, end, user=None):
+    """
+    Бронирование места на интервал [start, end).
+
+    Блокирует строку места, проверяет пиковую занятость интервала против
+    capacity и создаёт Booking. При нехватке мест бросает CapacityExceeded.
+    """
+    if end <= start:
+        raise BookingError("end must be after start")
+    location_id = getattr(location, "pk", location)
+    using = router.db_for_write(Booking)
+    with _serialized(using):
+        capacity = _lock_location(location_id, using)
+        intervals = overlapping(location_id, start, end, using).values_list("start", "end")
+        if peak_occupancy(intervals, start, end) >= capacity:
+            raise CapacityExceeded(f"location {location_id} is fully booked for {start} - {end}")
+        return Booking.objects.using(using).create(location_id=location_id, user=user, start=start, end=end)
+
+
+@timed("booking.cancel")
+def cancel(booking):
+    """
+    Отмена бронирования
+    """
+    if booking.status == Booking.STATUS_CANCELLED:
+        return booking
+    using = router.db_for_write(Booking)
+    with _serialized(using):
+        # Параллельная отмена того же бронирования ждёт блокировку строки и выходит здесь,
+        # иначе оно дважды вычлось бы из агрегатов занятости
+        if _lock_booking(booking.pk, using) == Booking.STATUS_CANCELLED:
+            booking.status = Booking.STATUS_CANCELLED
+            booking.next_reminder_at = None
+            return booking
+        booking.status = Booking.STATUS_CANCELLED
+        # Сигналы сохранения вычитают бронирование из агрегатов занятости в той же транзакции
+        booking.save(using=using, update_fields=["status", "next_reminder_at"])
+    return booking
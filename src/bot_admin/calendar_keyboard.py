@@ -0,0 +1,120 @@
+"""Инлайн-календарь бронирования для бота"""
+
+import calendar
+import datetime
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from django.utils import timezone
+
+from .lru import LRUCache
+from .slot_index import slot_index
+
+MONTH_NAMES = (
+    "Январь",
+    "Февраль",
+    "Март",
+    "Апрель",
+    "Май",
+    "Июнь",
+    "Июль",
+    "Август",
+    "Сентябрь",
+    "Октябрь",
+    "Ноябрь",
+    "Декабрь",
+)
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+EMPTY = " "
+
+
+class CalendarCallback(CallbackData, prefix="cal"):
+    """Данные кнопок календаря: day — выбор даты, month — переход к месяцу, ignore — неактивная кнопка"""
+
+    action: str
+    year: int = 0
+    month: int = 0
+    day: int = 0
+
+
+def month_dates(year, month):
+    """
+    Даты месяца
+    """
+    return [datetime.date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+def shift_month(year, month, delta):
+    """
+    (год, месяц) через delta месяцев
+    """
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+class BookingCalendar(LRUCache):
+    """
+    Генератор клавиатуры-календаря на месяц по свободным слотам SlotIndex.
+
+    Доступность всех дней месяца вычисляется одним проходом по битовым маскам
+    слотов (SlotIndex.day_masks). Готовая разметка запоминается по месяцу,
+    набору мест, длительности и текущей дате; запись устаревает, как только
+    меняется SlotIndex.version. Возвращаемую разметку нельзя изменять.
+    """
+
+    def __init__(self, index=None, maxsize=256):
+        super().__init__(maxsize)
+        self.index = index or slot_index
+
+    def available_dates(self, year, month, location_ids=None, duration: datetime.timedelta = None, today: datetime.date = None):
+        """
+        Даты месяца не раньше today, в которые есть свободный интервал длительностью duration
+        """
+        today = today or timezone.localdate()
+        dates = [date for date in month_dates(year, month) if date >= today]
+        masks = self.index.day_masks(dates, duration, location_ids)
+        return [date for date, mask in zip(dates, masks) if mask]
+
+    def render(self, year, month, location_ids=None, duration: datetime.timedelta = None, today: datetime.date = None):
+        """
+        InlineKeyboardMarkup месяца: заголовок с переходами, дни недели и недели месяца
+        """
+        today = today or timezone.localdate()
+        self.index.ensure_built()
+        key = (year, month, None if location_ids is None else tuple(sorted(location_ids)), duration, today, self.index.version)
+        markup = self._lookup(key)
+        if markup is None:
+            markup = self._store(key, self._build(year, month, self.available_dates(year, month, location_ids, duration, today), today))
+        return markup
+
+    def _build(self, year, month, available, today):
+        available = {date.day for date in available}
+        ignore = CalendarCallback(action="ignore").pack()
+        previous = shift_month(year, month, -1)
+        following = shift_month(year, month, 1)
+        if previous >= (today.year, today.month):
+            back = InlineKeyboardButton(
+                text="«", callback_data=CalendarCallback(action="month", year=previous[0], month=previous[1]).pack()
+            )
+        else:
+            back = InlineKeyboardButton(text=EMPTY, callback_data=ignore)
+        forward = InlineKeyboardButton(
+            text="»", callback_data=CalendarCallback(action="month", year=following[0], month=following[1]).pack()
+        )
+        rows = [
+            [back, InlineKeyboardButton(text=f"{MONTH_NAMES[month - 1]} {year}", callback_data=ignore), forward],
+            [InlineKeyboardButton(text=name, callback_data=ignore) for name in WEEKDAY_NAMES],
+        ]
+        for week in calendar.Calendar().monthdayscalendar(year, month):
+            row = []
+            for day in week:
+                if day in available:
+                    callback_data = CalendarCallback(action="day", year=year, month=month, day=day).pack()
+                    row.append(InlineKeyboardButton(text=str(day), callback_data=callback_data))
+                else:
+                    row.append(InlineKeyboardButton(text=EMPTY if day == 0 else f"·{day}·", callback_data=ignore))
+            rows.append(row)
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+booking_calendar = BookingCalendar()
@@ -0,0 +1,161 @@
+"""Кэш отрисованных карточек мест оказания услуг для бота"""
+
+import html
+import json
+from dataclasses import dataclass
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .lru import LRUCache
+from .models import ServiceLocation, WorkDay
+from .repositories import locations
+
+PARSE_MODE = "HTML"
+
+
+class LocationCallback(CallbackData, prefix="loc"):
+    """Данные кнопок карточки: book — выбор даты, geo — точка на карте"""
+
+    action: str
+    location_id: int
+
+
+@dataclass(frozen=True)
+class RenderedCard:
+    """
+    Карточка места: текст и разметка, заранее закодированные в JSON
+    параметров sendMessage (без chat_id)
+    """
+
+    location_id: int
+    version: object
+    text: str
+    payload: bytes
+
+    def request_body(self, chat_id):
+        """
+        Тело запроса sendMessage к Bot API
+        """
+        return b'{"chat_id":' + json.dumps(chat_id).encode() + b"," + self.payload[1:]
+
+    def webhook_body(self, chat_id):
+        """
+        Тело ответа на вебхук, которым Telegram выполнит sendMessage
+        """
+        return b'{"method":"sendMessage","chat_id":' + json.dumps(chat_id).encode() + b"," + self.payload[1:]
+
+    def message_kwargs(self):
+        """
+        Аргументы Bot.send_message (кроме chat_id)
+        """
+        data = json.loads(self.payload)
+        return {
+            "text": data["text"],
+            "parse_mode": data["parse_mode"],
+            "reply_markup": InlineKeyboardMarkup.model_validate(data["reply_markup"]),
+        }
+
+
+def card_text(location):
+    """
+    Текст карточки в разметке HTML
+    """
+    lines = [f"<b>{html.escape(str(location))}</b>"]
+    if location.description:
+        lines.append(html.escape(location.description))
+    lines.append("")
+    lines.append(f"Адрес: {html.escape(location.get_address() or '-')}")
+    lines.append(f"Часы работы: {html.escape(location.get_working_hours() or 'круглосуточно')}")
+    lines.append(f"Координаты: {html.escape(location.get_geo())}")
+    return "\n".join(lines)
+
+
+def card_markup(location):
+    """
+    Кнопки карточки
+    """
+    row = [InlineKeyboardButton(text="Забронировать", callback_data=LocationCallback(action="book", location_id=location.pk).pack())]
+    if location.latitude is not None and location.longitude is not None:
+        row.append(InlineKeyboardButton(text="На карте", callback_data=LocationCallback(action="geo", location_id=location.pk).pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[row])
+
+
+def render_card(location):
+    """
+    Отрисовка карточки места; available_days должны быть предзагружены
+    """
+    text = card_text(location)
+    payload = {
+        "text": text,
+        "parse_mode": PARSE_MODE,
+        "reply_markup": card_markup(location).model_dump(mode="json", exclude_none=True),
+    }
+    return RenderedCard(
+        location_id=location.pk,
+        version=location.updated_at,
+        text=text,
+        payload=json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(),
+    )
+
+
+class LocationCardCache(LRUCache):
+    """
+    Процессный LRU-кэш RenderedCard по id места.
+
+    Записи удаляются сигналами при изменении места и его расписания. Версия
+    записи сверяется с ServiceLocation.updated_at, что защищает от изменений,
+    сделанных в других процессах: если вызывающий код передал id, а не
+    объект места, версия читается отдельным запросом по первичному ключу.
+    """
+
+    def __init__(self, maxsize=None):
+        super().__init__(maxsize if maxsize is not None else settings.LOCATION_CARD_CACHE_MAXSIZE)
+
+    def _is_current(self, value, version):
+        return value.version == version
+
+    def _queryset(self):
+        return ServiceLocation.objects.prefetch_related(Prefetch("available_days", queryset=WorkDay.objects.order_by("day", "start_time")))
+
+    def _missing(self, location_id):
+        self.invalidate(location_id)
+        return ServiceLocation.DoesNotExist(f"ServiceLocation {location_id} does not exist")
+
+    def get(self, location):
+        """
+        Карточка места (объект или id); DoesNotExist, если места нет
+        """
+        location_id = getattr(location, "pk", location)
+        version = getattr(location, "updated_at", None)
+        if version is None:
+            version = ServiceLocation.objects.filter(pk=location_id).values_list("updated_at", flat=True).first()
+            if version is None:
+                raise self._missing(location_id)
+        card = self._lookup(location_id, version)
+        if card is None:
+            card = self._store(location_id, render_card(self._queryset().get(pk=location_id)))
+        return card
+
+    async def aget(self, location):
+        """
+        Асинхронный вариант get
+        """
+        location_id = getattr(location, "pk", location)
+        version = getattr(location, "updated_at", None)
+        if version is None:
+            version = await ServiceLocation.objects.filter(pk=location_id).values_list("updated_at", flat=True).afirst()
+            if version is None:
+                raise self._missing(location_id)
+        card = self._lookup(location_id, version)
+        if card is None:
+            found = await locations.afilter_with_schedules(pk=location_id)
+            if not found:
+                raise self._missing(location_id)
+            card = self._store(location_id, render_card(found[0]))
+        return card
+
+
+location_cards = LocationCardCache()
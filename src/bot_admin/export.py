@@ -0,0 +1,308 @@
+"""Потоковая выгрузка мест, пользователей и бронирований в CSV и XLSX"""
+
+import csv
+import datetime
+import decimal
+import itertools
+import re
+import zipfile
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Booking, ServiceLocation, TelegramUser
+
+# Размер порции байт, отдаваемой клиенту, и строк, читаемых из базы за раз
+FLUSH_BYTES = 64 * 1024
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    """Колонка выгрузки: поле для values_list и необязательное преобразование значения"""
+
+    title: str
+    field: str
+    format: object = None
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """Набор колонок выгрузки модели"""
+
+    name: str
+    model: type
+    columns: tuple
+
+    def rows(self, queryset=None, chunk_size=CHUNK_SIZE):
+        """
+        Строки выгрузки; база читается порциями по chunk_size без кэша QuerySet
+        """
+        queryset = self.model.objects.all() if queryset is None else queryset
+        formats = [(index, column.format) for index, column in enumerate(self.columns) if column.format is not None]
+        values = (
+            queryset.prefetch_related(None)
+            .order_by("pk")
+            .values_list(*(column.field for column in self.columns))
+            .iterator(chunk_size=chunk_size)
+        )
+        if not formats:
+            yield from values
+            return
+        for row in values:
+            row = list(row)
+            for index, format_value in formats:
+                row[index] = format_value(row[index])
+            yield row
+
+    def header(self):
+        """
+        Заголовки колонок
+        """
+        return [column.title for column in self.columns]
+
+
+EXPORTS = {
+    "locations": ExportSpec(
+        "locations",
+        ServiceLocation,
+        (
+            Column("ID", "pk"),
+            Column("Название", "name"),
+            Column("Город", "city"),
+            Column("Адрес", "rest_of_address"),
+            Column("Широта", "latitude"),
+            Column("Долгота", "longitude"),
+            Column("Вместимость", "capacity"),
+            Column("Описание", "description"),
+        ),
+    ),
+    "users": ExportSpec(
+        "users",
+        TelegramUser,
+        (
+            Column("ID", "pk"),
+            Column("Telegram ID", "telegram_id"),
+            Column("Имя", "first_name"),
+            Column("Фамилия", "last_name"),
+            Column("Username", "username"),
+            Column("Язык", "language_code"),
+            Column("Premium", "is_premium"),
+            Column("Обновлён", "datetime"),
+        ),
+    ),
+    "bookings": ExportSpec(
+        "bookings",
+        Booking,
+        (
+            Column("ID", "pk"),
+            Column("Место", "location__name"),
+            Column("Telegram ID", "user__telegram_id"),
+            Column("Начало", "start"),
+            Column("Окончание", "end"),
+            Column("Статус", "status", dict(Booking.STATUS_CHOICES).get),
+            Column("Создано", "created_at"),
+        ),
+    ),
+}
+
+# Символы, недопустимые в XML 1.0
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# Начало значения, которое Excel выполнит как формулу
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def display(value):
+    """
+    Значение ячейки в виде строки: дата и время — в местном часовом поясе
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).strftime("%d.%m.%Y %H:%M")
+    if isinstance(value, datetime.date):
+        return value.strftime("%d.%m.%Y")
+    return str(value)
+
+
+class _Buffer:
+    """Приёмник записи, отдающий накопленные байты порциями"""
+
+    def __init__(self):
+        self.size = 0
+        self._parts = []
+
+    def write(self, data):
+        """
+        Запись строки или байтов; размер считается в байтах UTF-8
+        """
+        encoded = data.encode() if isinstance(data, str) else bytes(data)
+        self._parts.append(encoded)
+        self.size += len(encoded)
+        return len(data)
+
+    def flush(self):
+        """
+        Данные уже в памяти, сбрасывать нечего
+        """
+
+    def take(self):
+        """
+        Накопленные байты; буфер очищается
+        """
+        data = b"".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return data
+
+
+def csv_chunks(header, rows):
+    """
+    CSV (UTF-8 с BOM для Excel) порциями по FLUSH_BYTES
+    """
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for row in rows:
+        cells = []
+        for value in row:
+            text = display(value)
+            # Защита от выполнения формул из пользовательских данных
+            if isinstance(value, str) and text.startswith(_FORMULA_PREFIXES):
+                text = "'" + text
+            cells.append(text)
+        writer.writerow(cells)
+        if buffer.size >= FLUSH_BYTES:
+            yield buffer.take()
+    yield buffer.take()
+
+
+def _column_letters(count):
+    letters = []
+    for index in range(count):
+        name = ""
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            name = chr(65 + remainder) + name
+        letters.append(name)
+    return letters
+
+
+def _xlsx_cell(reference, value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub("", display(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def xlsx_chunks(header, rows, sheet_name="Sheet1"):
+    """
+    Книга XLSX из одного листа порциями по FLUSH_BYTES.
+
+    ZIP пишется в поток без перемотки (дескрипторы данных после каждого
+    файла), строки листа сжимаются по мере записи, поэтому в памяти
+    находится только текущая порция.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        )
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            letters = _column_letters(len(header))
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for number, row in enumerate(itertools.chain([header], rows), start=1):
+                cells = "".join(_xlsx_cell(f"{letter}{number}", value) for letter, value in zip(letters, row))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode())
+                if buffer.size >= FLUSH_BYTES:
+                    yield buffer.take()
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.take()
+
+
+WRITERS = {"csv": csv_chunks, "xlsx": xlsx_chunks}
+
+
+def export_chunks(name, fmt, queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Байты выгрузки name ("locations", "users", "bookings") в формате fmt ("csv", "xlsx")
+    """
+    spec = EXPORTS[name]
+    return WRITERS[fmt](spec.header(), spec.rows(queryset, chunk_size))
+
+
+async def aexport_chunks(name, fmt, queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Асинхронный вариант export_chunks: каждая порция формируется в потоке
+    синхронного кода, поэтому в памяти находится только она
+    """
+    chunks = export_chunks(name, fmt, queryset, chunk_size)
+    take = sync_to_async(next)
+    try:
+        while (chunk := await take(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def export_response(name, fmt, queryset=None, chunk_size=CHUNK_SIZE, asynchronous=False):
+    """
+    StreamingHttpResponse с выгрузкой; файл формируется по мере отправки.
+    Под ASGI нужен asynchronous=True: синхронный итератор Django целиком
+    собирает в список перед отправкой.
+    """
+    chunks = (aexport_chunks if asynchronous else export_chunks)(name, fmt, queryset, chunk_size)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
@@ -0,0 +1,48 @@
+"""Хранилище состояний FSM aiogram в кэше Django, общее для процессов и узлов"""
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from django.conf import settings
+from django.core.cache import caches
+
+
+class DjangoCacheStorage(BaseStorage):
+    """
+    FSM-хранилище поверх кэша Django (FSM_CACHE_ALIAS).
+
+    Разделяется между воркерами, если кэш общий: база данных, Redis,
+    Memcached или файловый кэш на одной машине. timeout — время жизни
+    состояния в секундах (None — без ограничения).
+    """
+
+    def __init__(self, cache_alias=None, timeout=None, key_builder=None):
+        self.cache = caches[cache_alias or settings.FSM_CACHE_ALIAS]
+        self.timeout = timeout
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        cache_key = self.key_builder.build(key, "state")
+        if state is None:
+            await self.cache.adelete(cache_key)
+        else:
+            await self.cache.aset(cache_key, state, timeout=self.timeout)
+
+    async def get_state(self, key):
+        return await self.cache.aget(self.key_builder.build(key, "state"))
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        cache_key = self.key_builder.build(key, "data")
+        if not data:
+            await self.cache.adelete(cache_key)
+        else:
+            await self.cache.aset(cache_key, dict(data), timeout=self.timeout)
+
+    async def get_data(self, key):
+        return dict(await self.cache.aget(self.key_builder.build(key, "data")) or {})
+
+    async def close(self):
+        await self.cache.aclose()
@@ -0,0 +1,262 @@
+"""Поиск ближайших мест оказания услуг по координатам"""
+
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import ServiceLocation
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Расстояние по большому кругу в километрах
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Прямоугольник (min_lat, max_lat, [(min_lon, max_lon), ...]), содержащий круг радиуса radius_km.
+    При переходе через антимеридиан долгота делится на два диапазона.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def bounding_box_filter(lat, lon, radius_km):
+    """
+    Условие Q по прямоугольнику для предварительного отбора в SQL (индексируемые сравнения)
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    lon_filter = Q()
+    for min_lon, max_lon in lon_ranges:
+        lon_filter |= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    return Q(latitude__gte=min_lat, latitude__lte=max_lat) & lon_filter
+
+
+def locations_within(lat, lon, radius_km, queryset=None):
+    """
+    Места в радиусе radius_km без пространственного индекса в памяти:
+    отбор по прямоугольнику в SQL и точная проверка расстояния.
+    Возвращает [(расстояние, место)] по возрастанию расстояния.
+    """
+    queryset = ServiceLocation.objects.all() if queryset is None else queryset
+    result = []
+    for location in queryset.filter(bounding_box_filter(lat, lon, radius_km)):
+        distance = haversine(lat, lon, float(location.latitude), float(location.longitude))
+        if distance <= radius_km:
+            result.append((distance, location))
+    result.sort(key=lambda item: item[0])
+    return result
+
+
+def nearest_locations(lat, lon, count, queryset=None, start_radius_km=5.0):
+    """
+    count ближайших мест через SQL: радиус поиска удваивается, пока мест не хватит
+    """
+    queryset = ServiceLocation.objects.all() if queryset is None else queryset
+    radius = start_radius_km
+    while True:
+        found = locations_within(lat, lon, radius, queryset)
+        if len(found) >= count or radius >= math.pi * EARTH_RADIUS_KM:
+            return found[:count]
+        radius *= 2
+
+
+class GeoIndex:
+    """
+    Сетка ячеек cell_degrees × cell_degrees с координатами мест в памяти.
+
+    Поиск ближайших обходит кольца ячеек вокруг точки запроса, пока
+    нижняя оценка расстояния до необойдённых ячеек не превысит count-е
+    найденное расстояние. Индекс обновляется сигналами ServiceLocation.
+    """
+
+    def __init__(self, cell_degrees=0.1):
+        self.cell = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        self.rows = math.ceil(180 / cell_degrees)
+        self.built = False
+        self._lock = threading.RLock()
+        self._cells = defaultdict(dict)
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell_of(self, lat, lon):
+        row = min(int((lat + 90) / self.cell), self.rows - 1)
+        column = int((lon + 180) / self.cell) % self.columns
+        return row, column
+
+    def build(self):
+        """
+        Загрузка координат всех мест одним запросом
+        """
+        with self._lock:
+            self._cells = defaultdict(dict)
+            self._points = {}
+            rows = ServiceLocation.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+                "pk", "latitude", "longitude"
+            )
+            for location_id, lat, lon in rows:
+                self._put(location_id, float(lat), float(lon))
+            self.built = True
+
+    def ensure_built(self):
+        """
+        Построение индекса при первом обращении
+        """
+        if not self.built:
+            self.build()
+
+    def _put(self, location_id, lat, lon):
+        self._points[location_id] = (lat, lon)
+        self._cells[self._cell_of(lat, lon)][location_id] = (lat, lon)
+
+    def _drop(self, location_id):
+        point = self._points.pop(location_id, None)
+        if point is not None:
+            cell = self._cell_of(*point)
+            self._cells[cell].pop(location_id, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def update(self, location_id, lat, lon):
+        """
+        Учёт сохранённого места; без координат место удаляется из индекса
+        """
+        if not self.built:
+            return
+        with self._lock:
+            self._drop(location_id)
+            if lat is not None and lon is not None:
+                self._put(location_id, float(lat), float(lon))
+
+    def remove(self, location_id):
+        """
+        Удаление места из индекса
+        """
+        if not self.built:
+            return
+        with self._lock:
+            self._drop(location_id)
+
+    def _ring(self, row, column, radius):
+        """
+        Ячейки на расстоянии Чебышёва radius от (row, column)
+        """
+        for dr in range(-radius, radius + 1):
+            r = row + dr
+            if r < 0 or r >= self.rows:
+                continue
+            if abs(dr) == radius:
+                columns = range(column - radius, column + radius + 1)
+            else:
+                columns = (column - radius, column + radius)
+            for c in columns:
+                yield r, c % self.columns
+
+    def _lower_bound(self, lat, radius):
+        """
+        Нижняя оценка расстояния до ячеек за пределами колец 0..radius - 1
+        """
+        span = (radius - 1) * self.cell
+        if span <= 0:
+            return 0.0
+        extreme = min(abs(lat) + span, 90.0)
+        across = math.radians(min(span, 180.0))
+        lon_km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(math.radians(extreme)) * math.sin(across / 2)))
+        return min(span * KM_PER_DEGREE, lon_km)
+
+    def nearest(self, lat, lon, count=10, max_km=None):
+        """
+        count ближайших мест: [(расстояние в км, id места)] по возрастанию
+        """
+        self.ensure_built()
+        lat, lon = float(lat), float(lon)
+        row, column = self._cell_of(lat, lon)
+        best = []  # max-heap по расстоянию: (-distance, id)
+        seen = set()
+
+        def consider(points):
+            for location_id, (plat, plon) in points.items():
+                distance = haversine(lat, lon, plat, plon)
+                if max_km is not None and distance > max_km:
+                    continue
+                if len(best) < count:
+                    heapq.heappush(best, (-distance, location_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, location_id))
+
+        with self._lock:
+            radius = 0
+            while True:
+                bound = self._lower_bound(lat, radius)
+                if len(best) >= count and -best[0][0] <= bound:
+                    break
+                if max_km is not None and bound > max_km:
+                    break
+                if (2 * radius + 1) ** 2 >= len(self._cells):
+                    # Кольцо больше числа непустых ячеек: дешевле просмотреть оставшиеся целиком
+                    for cell, points in self._cells.items():
+                        if cell not in seen:
+                            consider(points)
+                    break
+                for cell in self._ring(row, column, radius):
+                    points = self._cells.get(cell)
+                    if points is not None and cell not in seen:
+                        seen.add(cell)
+                        consider(points)
+                radius += 1
+        return sorted((-distance, location_id) for distance, location_id in best)
+
+    def _box(self, min_lat, max_lat, lon_ranges):
+        """
+        Ячейки, покрывающие прямоугольник bounding_box
+        """
+        first_row, last_row = self._cell_of(min_lat, 0)[0], self._cell_of(max_lat, 0)[0]
+        for min_lon, max_lon in lon_ranges:
+            first_column = int((min_lon + 180) / self.cell)
+            last_column = min(int((max_lon + 180) / self.cell), self.columns - 1)
+            for r in range(first_row, last_row + 1):
+                for c in range(first_column, last_column + 1):
+                    yield r, c
+
+    def within(self, lat, lon, radius_km):
+        """
+        Все места в радиусе radius_km: [(расстояние в км, id места)] по возрастанию
+        """
+        self.ensure_built()
+        lat, lon = float(lat), float(lon)
+        result = []
+        with self._lock:
+            for cell in self._box(*bounding_box(lat, lon, radius_km)):
+                for location_id, (plat, plon) in self._cells.get(cell, {}).items():
+                    distance = haversine(lat, lon, plat, plon)
+                    if distance <= radius_km:
+                        result.append((distance, location_id))
+        result.sort()
+        return result
+
+
+geo_index = GeoIndex()
@@ -0,0 +1,253 @@
+"""Массовый импорт мест оказания услуг с недельным расписанием из CSV и JSON"""
+
+import csv
+import datetime
+import functools
+import io
+import itertools
+import json
+import operator
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Annotated, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, ValidationError, field_validator, model_validator
+
+from .geo import geo_index
+from .models import ServiceLocation, WorkDay
+from .slot_index import slot_index
+
+CHUNK_SIZE = 500
+# Ключей WorkDay в одном запросе поиска: условие OR на каждый ключ, глубина
+# выражения в SQLite ограничена
+LOOKUP_BATCH = 200
+
+# Названия дней недели для расписания в CSV: полные (как в WorkDay.DAY_CHOICES) и сокращённые
+DAY_NAMES = {name.lower(): day for day, name in WorkDay.DAY_CHOICES}
+DAY_NAMES.update({name: day for day, name in enumerate(("пн", "вт", "ср", "чт", "пт", "сб", "вс"))})
+DAY_NAMES.update({name: day for day, name in enumerate(("mon", "tue", "wed", "thu", "fri", "sat", "sun"))})
+
+# "Пн 09:00-18:00", "0 09:00-18:00" или "Суббота" (весь день)
+SCHEDULE_ENTRY = re.compile(r"^\s*(?P<day>[^\s\d]+|\d)\s*(?:(?P<start>\d{1,2}:\d{2})\s*-\s*(?P<end>\d{1,2}:\d{2}))?\s*$")
+
+
+class ScheduleEntry(BaseModel):
+    """Рабочий интервал дня недели; пустое время — весь день"""
+
+    model_config = ConfigDict(frozen=True)
+
+    day: int = Field(ge=0, le=6)
+    start_time: Optional[datetime.time] = None
+    end_time: Optional[datetime.time] = None
+
+    @field_validator("day", mode="before")
+    @classmethod
+    def parse_day(cls, value):
+        "День недели числом 0-6 или названием"
+        if isinstance(value, str) and not value.strip().isdigit():
+            try:
+                return DAY_NAMES[value.strip().lower()]
+            except KeyError as error:
+                raise ValueError(f"unknown weekday {value!r}") from error
+        return value
+
+    @model_validator(mode="after")
+    def check_interval(self):
+        "Окончание позже начала"
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValueError("end_time must be after start_time")
+        return self
+
+    def key(self):
+        """
+        Ключ уникальности WorkDay
+        """
+        return (self.day, self.start_time, self.end_time)
+
+
+def parse_schedule(text):
+    """
+    Расписание из строки CSV: записи через ";" или ","
+    """
+    entries = []
+    for part in re.split(r"[;,]", text):
+        if not part.strip():
+            continue
+        match = SCHEDULE_ENTRY.match(part)
+        if match is None:
+            raise ValueError(f"invalid schedule entry {part.strip()!r}")
+        entries.append({"day": match["day"], "start_time": match["start"], "end_time": match["end"]})
+    return entries
+
+
+class LocationRow(BaseModel):
+    """Строка импорта: поля ServiceLocation и расписание"""
+
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
+    name: Annotated[str, StringConstraints(min_length=1, max_length=255)]
+    description: str = ""
+    city: Annotated[str, StringConstraints(max_length=255)] = ""
+    rest_of_address: Annotated[str, StringConstraints(max_length=512)] = ""
+    latitude: Optional[Annotated[Decimal, Field(ge=-90, le=90, max_digits=9, decimal_places=6)]] = None
+    longitude: Optional[Annotated[Decimal, Field(ge=-180, le=180, max_digits=9, decimal_places=6)]] = None
+    capacity: int = Field(default=1, ge=1)
+    schedule: list[ScheduleEntry] = []
+
+    @field_validator("latitude", "longitude", mode="before")
+    @classmethod
+    def empty_coordinate(cls, value):
+        "Пустая ячейка CSV — нет координаты"
+        return None if value == "" else value
+
+    @field_validator("capacity", mode="before")
+    @classmethod
+    def empty_capacity(cls, value):
+        "Пустая ячейка CSV — вместимость по умолчанию"
+        return 1 if value == "" else value
+
+    @field_validator("schedule", mode="before")
+    @classmethod
+    def schedule_string(cls, value):
+        "Расписание строкой из CSV"
+        return parse_schedule(value) if isinstance(value, str) else value
+
+    def location(self):
+        """
+        Несохранённый ServiceLocation
+        """
+        return ServiceLocation(**self.model_dump(exclude={"schedule"}))
+
+
+@dataclass
+class RowError:
+    """Ошибка проверки строки импорта (нумерация с 1)"""
+
+    row: int
+    message: str
+
+    def __str__(self):
+        return f"row {self.row}: {self.message}"
+
+
+class LocationImportError(Exception):
+    """Импорт отменён: строки не прошли проверку"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(str(error) for error in errors[:10]))
+        self.errors = errors
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта"""
+
+    locations: int = 0
+    workdays: int = 0
+    links: int = 0
+    location_ids: list = field(default_factory=list)
+
+
+def read_rows(data, fmt):
+    """
+    Словари строк из CSV (заголовки — имена полей LocationRow) или JSON-массива
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if fmt == "json":
+        rows = json.loads(data)
+        if not isinstance(rows, list):
+            raise ValueError("JSON import must be an array of objects")
+        return rows
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(data)))
+    raise ValueError(f"unsupported import format {fmt!r}")
+
+
+def validate_rows(rows):
+    """
+    Проверка строк: (LocationRow, ...), [RowError, ...]
+    """
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            valid.append(LocationRow.model_validate(row))
+        except ValidationError as error:
+            details = ", ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+            errors.append(RowError(number, details))
+    return valid, errors
+
+
+def _find_workdays(keys):
+    """
+    id WorkDay только с указанными (day, start_time, end_time)
+    """
+    found = {}
+    iterator = iter(keys)
+    while batch := list(itertools.islice(iterator, LOOKUP_BATCH)):
+        condition = functools.reduce(operator.or_, (Q(day=day, start_time=start, end_time=end) for day, start, end in batch))
+        rows = WorkDay.objects.filter(condition).values_list("pk", "day", "start_time", "end_time")
+        found.update({(day, start, end): pk for pk, day, start, end in rows})
+    return found
+
+
+def _workday_ids(keys, result):
+    """
+    id WorkDay для набора (day, start_time, end_time): существующие
+    переиспользуются, недостающие создаются одним bulk_create
+    """
+    existing = _find_workdays(keys)
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        # ignore_conflicts — на случай параллельного импорта тех же интервалов;
+        # созданными считаются ключи, которых не было до вставки
+        WorkDay.objects.bulk_create(
+            [WorkDay(day=day, start_time=start, end_time=end) for day, start, end in missing], ignore_conflicts=True
+        )
+        created = _find_workdays(missing)
+        result.workdays += len(created)
+        existing.update(created)
+    return existing
+
+
+def _import_chunk(rows, result):
+    locations = ServiceLocation.objects.bulk_create([row.location() for row in rows])
+    workday_ids = _workday_ids({entry.key() for row in rows for entry in row.schedule}, result)
+    through = ServiceLocation.available_days.through
+    links = {(location.pk, workday_ids[entry.key()]) for location, row in zip(locations, rows) for entry in row.schedule}
+    through.objects.bulk_create([through(servicelocation_id=location_id, workday_id=workday_id) for location_id, workday_id in links])
+    result.locations += len(locations)
+    result.links += len(links)
+    result.location_ids.extend(location.pk for location in locations)
+    points = [(location.pk, location.latitude, location.longitude, location.capacity) for location in locations]
+    # bulk_create не вызывает сигналов: индексы процесса обновляются после фиксации
+    transaction.on_commit(lambda: _index_locations(points))
+
+
+def _index_locations(points):
+    for location_id, latitude, longitude, capacity in points:
+        geo_index.update(location_id, latitude, longitude)
+        slot_index.location_changed(location_id, capacity)
+
+
+def import_locations(rows, chunk_size=CHUNK_SIZE):
+    """
+    Импорт мест с расписанием одной транзакцией.
+
+    Все строки сначала проверяются, при ошибках бросается LocationImportError со
+    списком RowError и ничего не записывается. Затем строки записываются
+    порциями по chunk_size: на порцию приходится постоянное число запросов
+    (места, WorkDay, связи available_days), независимо от её размера.
+    """
+    valid, errors = validate_rows(rows)
+    if errors:
+        raise LocationImportError(errors)
+    result = ImportResult()
+    iterator = iter(valid)
+    with transaction.atomic():
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            _import_chunk(chunk, result)
+    return result
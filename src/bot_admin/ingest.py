@@ -0,0 +1,212 @@
+"""Буферизованная запись пользователей Telegram и фотографий профиля"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TelegramUser, TelegramUserProfilePhotos
+
+logger = logging.getLogger(__name__)
+
+# Поля User и ChatFullInfo, которые сохраняются в TelegramUser
+USER_FIELDS = ("first_name", "last_name", "username", "bio", "language_code", "is_premium")
+PHOTO_FIELDS = ("file_id", "width", "height", "file_size")
+
+
+def as_dict(payload):
+    """
+    Объект aiogram (pydantic) или словарь Bot API в словарь без пустых полей
+    """
+    if hasattr(payload, "model_dump"):
+        payload = payload.model_dump(exclude_none=True)
+    return {key: value for key, value in payload.items() if value is not None}
+
+
+class ProfileIngestBuffer:  # pylint: disable=R0902
+    """
+    Буфер пользователей (User / ChatFullInfo) и фотографий (getUserProfilePhotos).
+
+    Данные дедуплицируются в памяти по Telegram id и file_unique_id и
+    записываются через bulk_create(update_conflicts=True) при достижении
+    max_size записей или по истечении max_delay секунд с первой записи.
+    """
+
+    def __init__(self, max_size=500, max_delay=5.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._users = {}
+        self._photos = {}
+        self._first_added = None
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._users) + len(self._photos)
+
+    def _touch(self):
+        if self._first_added is None:
+            self._first_added = self.clock()
+
+    def add_user(self, payload, profile_fetched_at=None):
+        """
+        Добавление User или ChatFullInfo; поля последующих payload дополняют предыдущие.
+        profile_fetched_at передаётся, когда payload получен getChat для кэша профилей
+        """
+        data = as_dict(payload)
+        with self._lock:
+            self._touch()
+            user = self._users.setdefault(data["id"], {})
+            user.update({key: data[key] for key in USER_FIELDS if key in data})
+            if profile_fetched_at is not None:
+                user["profile_fetched_at"] = profile_fetched_at
+        return self.should_flush()
+
+    def add_photos(self, telegram_id, payload):
+        """
+        Добавление UserProfilePhotos (или списка списков PhotoSize) пользователя
+        """
+        data = as_dict(payload) if not isinstance(payload, list) else {"photos": payload}
+        with self._lock:
+            self._touch()
+            for sizes in data.get("photos", ()):
+                for size in sizes:
+                    size = as_dict(size)
+                    photo = {key: size[key] for key in PHOTO_FIELDS if key in size}
+                    photo["telegram_id"] = telegram_id
+                    self._photos[size["file_unique_id"]] = photo
+        return self.should_flush()
+
+    def should_flush(self):
+        """
+        Пора ли сбрасывать буфер по размеру или времени
+        """
+        if self._first_added is None:
+            return False
+        return len(self) >= self.max_size or self.clock() - self._first_added >= self.max_delay
+
+    def _take(self):
+        with self._lock:
+            users, photos = self._users, self._photos
+            self._users, self._photos, self._first_added = {}, {}, None
+        return users, photos
+
+    def _restore(self, users, photos):
+        """
+        Возврат несохранённой порции в буфер; добавленные за время записи данные новее
+        """
+        with self._lock:
+            self._touch()
+            for telegram_id, data in users.items():
+                self._users[telegram_id] = {**data, **self._users.get(telegram_id, {})}
+            self._photos = {**photos, **self._photos}
+
+    def flush(self):
+        """
+        Запись буфера в базу одной транзакцией. Число запросов зависит от числа
+        различных наборов полей, а не от числа записей.
+
+        Пользователь записывается, только если для него переданы поля User;
+        фотографии привязываются к уже существующим пользователям, фотографии
+        неизвестных пользователей пропускаются. При ошибке записи порция
+        возвращается в буфер и исключение пробрасывается.
+        Возвращает (число пользователей, число фотографий).
+        """
+        taken = self._take()
+        try:
+            return self._write(*taken)
+        except Exception:
+            self._restore(*taken)
+            raise
+
+    def _write(self, users, photos):
+        users = {telegram_id: data for telegram_id, data in users.items() if data}
+        if not users and not photos:
+            return 0, 0
+        now = timezone.now()
+        with transaction.atomic():
+            groups = defaultdict(list)
+            for telegram_id, data in users.items():
+                groups[tuple(sorted(data))].append((telegram_id, data))
+            for fields, rows in groups.items():
+                TelegramUser.objects.bulk_create(
+                    [TelegramUser(telegram_id=telegram_id, datetime=now, **data) for telegram_id, data in rows],
+                    update_conflicts=True,
+                    unique_fields=["telegram_id"],
+                    update_fields=[*fields, "datetime"],
+                )
+            rows = []
+            if photos:
+                user_ids = dict(
+                    TelegramUser.objects.filter(telegram_id__in={photo["telegram_id"] for photo in photos.values()}).values_list(
+                        "telegram_id", "pk"
+                    )
+                )
+                rows = [
+                    TelegramUserProfilePhotos(
+                        file_unique_id=file_unique_id,
+                        tg_user_id_id=user_ids[photo["telegram_id"]],
+                        **{key: photo[key] for key in PHOTO_FIELDS if key in photo},
+                    )
+                    for file_unique_id, photo in photos.items()
+                    if photo["telegram_id"] in user_ids
+                ]
+            if rows:
+                TelegramUserProfilePhotos.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=["file_unique_id"],
+                    update_fields=["tg_user_id", *PHOTO_FIELDS],
+                )
+        self.flushes += 1
+        return len(users), len(rows)
+
+    async def aadd_user(self, payload):
+        """
+        Асинхронное добавление пользователя со сбросом буфера при необходимости;
+        ошибка сброса логируется, данные остаются в буфере
+        """
+        if self.add_user(payload):
+            await self._aflush_logged()
+
+    async def aadd_photos(self, telegram_id, payload):
+        """
+        Асинхронное добавление фотографий со сбросом буфера при необходимости;
+        ошибка сброса логируется, данные остаются в буфере
+        """
+        if self.add_photos(telegram_id, payload):
+            await self._aflush_logged()
+
+    async def aflush(self):
+        """
+        Асинхронный сброс буфера
+        """
+        return await sync_to_async(self.flush)()
+
+    async def _aflush_logged(self):
+        try:
+            await self.aflush()
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Profile buffer flush failed, %s records kept", len(self))
+
+    async def run(self, interval=1.0):
+        """
+        Фоновая задача сброса по времени; при отмене сбрасывает остаток.
+        Ошибка записи не останавливает задачу: порция остаётся в буфере до следующего сброса
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                if self.should_flush():
+                    await self._aflush_logged()
+        finally:
+            await self._aflush_logged()
+
+
+profile_buffer = ProfileIngestBuffer()
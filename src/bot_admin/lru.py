@@ -0,0 +1,86 @@
+"""Процессный LRU-кэш со счётчиками попаданий, общий для кэшей бота"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:  # pylint: disable=R0902
+    """
+    Потокобезопасный словарь с вытеснением давно не использованных записей.
+
+    maxsize=None снимает ограничение размера. Запись старше ttl секунд
+    считается промахом: так процессный кэш видит изменения, сделанные в
+    других процессах, куда сигналы не доходят. Подклассы переопределяют
+    _is_current, чтобы считать промахом устаревшую запись.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _is_current(self, value, version):  # pylint: disable=W0613
+        return True
+
+    def _lookup(self, key, version=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is not None and self.clock() >= expires:
+                    del self._data[key]
+                elif self._is_current(value, version):
+                    self.hits += 1
+                    self._data.move_to_end(key)
+                    return value
+            self.misses += 1
+            return None
+
+    def _store(self, key, value):
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *keys):
+        """
+        Удаление записей с указанными ключами
+        """
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Полная очистка кэша
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Счётчики попаданий и промахов
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
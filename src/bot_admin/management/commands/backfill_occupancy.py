@@ -0,0 +1,24 @@
+"""Перестроение агрегатов занятости из бронирований"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from bot_admin.occupancy import backfill
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчёт OccupancyHour по подтверждённым бронированиям
+    (после загрузки данных в обход сигналов или при расхождении)
+    """
+
+    help = "Rebuild hourly occupancy aggregates from bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--location", type=int, action="append", dest="locations", help="Location id (repeatable; default: all)")
+        parser.add_argument("--since", type=datetime.date.fromisoformat, help="Rebuild only dates from YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        rows = backfill(options["locations"], options["since"])
+        self.stdout.write(f"Rebuilt {rows} occupancy rows")
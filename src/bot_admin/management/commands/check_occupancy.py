@@ -0,0 +1,35 @@
+"""Сверка агрегатов занятости с полным пересчётом"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bot_admin.occupancy import backfill, check
+
+
+class Command(BaseCommand):
+    """
+    Сравнение OccupancyHour с пересчётом из бронирований; с --fix
+    расходящиеся места перестраиваются
+    """
+
+    help = "Compare hourly occupancy aggregates against a full recompute"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--location", type=int, action="append", dest="locations", help="Location id (repeatable; default: all)")
+        parser.add_argument("--since", type=datetime.date.fromisoformat, help="Check only dates from YYYY-MM-DD")
+        parser.add_argument("--fix", action="store_true", help="Rebuild locations with mismatches")
+
+    def handle(self, *args, **options):
+        mismatches = check(options["locations"], options["since"])
+        for mismatch in mismatches[:50]:
+            self.stdout.write(str(mismatch))
+        if not mismatches:
+            self.stdout.write("Occupancy aggregates are consistent")
+            return
+        locations = sorted({mismatch.location_id for mismatch in mismatches})
+        if options["fix"]:
+            backfill(locations, options["since"])
+            self.stdout.write(f"Rebuilt {len(locations)} locations")
+            return
+        raise CommandError(f"{len(mismatches)} mismatched occupancy rows in {len(locations)} locations")
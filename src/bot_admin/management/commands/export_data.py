@@ -0,0 +1,32 @@
+"""Выгрузка мест, пользователей или бронирований в CSV или XLSX"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from bot_admin.export import CHUNK_SIZE, EXPORTS, WRITERS, export_chunks
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка в файл или stdout: память не растёт с числом строк
+    """
+
+    help = "Export locations, users or bookings to CSV or XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(WRITERS), default="csv", dest="fmt")
+        parser.add_argument("--output", default="-", help="Output file (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        chunks = export_chunks(options["name"], options["fmt"], chunk_size=options["chunk_size"])
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(options["output"], "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
@@ -0,0 +1,33 @@
+"""Массовый импорт мест с расписанием из CSV или JSON"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bot_admin.importer import CHUNK_SIZE, LocationImportError, import_locations, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Импорт мест одной транзакцией; при ошибке в любой строке ничего не записывается
+    """
+
+    help = "Import service locations with weekly schedules from CSV or JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file")
+        parser.add_argument("--format", choices=("csv", "json"), dest="fmt", help="Input format (default: by file extension)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows written per batch")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        fmt = options["fmt"] or path.suffix.lstrip(".").lower()
+        try:
+            result = import_locations(read_rows(path.read_bytes(), fmt), options["chunk_size"])
+        except LocationImportError as error:
+            for row_error in error.errors[:50]:
+                self.stderr.write(str(row_error))
+            raise CommandError(f"{len(error.errors)} invalid rows, nothing imported") from error
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(f"Imported {result.locations} locations, {result.workdays} new work days, {result.links} schedule links")
@@ -0,0 +1,21 @@
+"""Запуск рассылки напоминаний о бронированиях"""
+
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from bot_admin.reminders import reminders
+
+
+class Command(BaseCommand):
+    """
+    Цикл ReminderScheduler; напоминания попадают в очередь outbound,
+    отправляет их SendScheduler процесса бота
+    """
+
+    help = "Run booking reminder scheduler"
+
+    def handle(self, *args, **options):
+        reminders.load()
+        self.stdout.write(f"Loaded {len(reminders)} reminders until {reminders.stats()['loaded_until']:%Y-%m-%d %H:%M}")
+        asyncio.run(reminders.run())
@@ -0,0 +1,53 @@
+"""Запуск процессов шардов обработки обновлений Telegram"""
+
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bot_admin.sharding import check_fsm_storage, check_shard_authkey, run_shard, serve_broker
+
+
+class Command(BaseCommand):
+    """
+    Процессы шардов для TELEGRAM_SHARDS; на нескольких узлах каждый узел
+    запускает свою часть шардов (--only), брокер — один из узлов (--serve-broker)
+    """
+
+    help = "Run Telegram update shard workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, default=settings.TELEGRAM_SHARDS, help="Total number of shards")
+        parser.add_argument("--only", default="", help="Comma-separated shard numbers to run on this node (default: all)")
+        parser.add_argument("--broker", default=settings.TELEGRAM_SHARD_BROKER, help="Broker address host:port")
+        parser.add_argument("--serve-broker", action="store_true", help="Also run the broker on this node")
+        parser.add_argument("--workers", type=int, default=settings.TELEGRAM_UPDATE_WORKERS, help="Concurrent chats per shard")
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_WEBHOOK_HANDLER:
+            raise CommandError("TELEGRAM_WEBHOOK_HANDLER is not set")
+        shards = options["shards"]
+        check_fsm_storage(shards)
+        check_shard_authkey(shards)
+        only = [int(shard) for shard in options["only"].split(",") if shard.strip()] or list(range(shards))
+        if any(shard < 0 or shard >= shards for shard in only):
+            raise CommandError(f"Shard numbers must be in 0..{shards - 1}")
+        authkey = settings.TELEGRAM_SHARD_AUTHKEY.encode()
+        context = multiprocessing.get_context("spawn")
+        processes = []
+        if options["serve_broker"]:
+            processes.append(context.Process(target=serve_broker, args=(options["broker"], authkey), name="broker", daemon=True))
+        for shard in only:
+            processes.append(
+                context.Process(
+                    target=run_shard,
+                    args=(shard, options["broker"], authkey, settings.TELEGRAM_WEBHOOK_HANDLER, options["workers"]),
+                    name=f"shard-{shard}",
+                )
+            )
+        for process in processes:
+            process.start()
+            self.stdout.write(f"Started {process.name} (pid {process.pid})")
+        for process in processes:
+            if process.name != "broker":
+                process.join()
@@ -0,0 +1,340 @@
+"""Метрики задержек, запросов к базе, кэшей и очередей в текстовом формате Prometheus"""
+
+import bisect
+import contextvars
+import functools
+import hmac
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин гистограмм задержек (секунды) и числа запросов к базе за обновление
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Операции SQL, различаемые в метке operation; остальные попадают в "other"
+SQL_OPERATIONS = frozenset(("select", "insert", "update", "delete", "savepoint", "release", "rollback", "begin", "commit"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """
+        Увеличение счётчика с метками labels (в порядке labelnames)
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """
+        Текущее значение
+        """
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        """
+        Строки метрики в текстовом формате
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами.
+
+    observe() — поиск корзины bisect и три сложения под блокировкой, поэтому
+    её можно вызывать на каждый запрос к базе.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        Учёт значения с метками labels (в порядке labelnames)
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """
+        Учёт времени выполнения блока
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels):
+        """
+        Число наблюдений
+        """
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def total(self, *labels):
+        """
+        Сумма наблюдений
+        """
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def samples(self):
+        """
+        Строки метрики в текстовом формате: накопленные корзины, _sum и _count
+        """
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Набор метрик процесса.
+
+    Кроме счётчиков и гистограмм, регистрируются источники stats(): их
+    числовые значения на момент выгрузки отдаются как gauge
+    <prefix>_<имя ключа> (размеры очередей, доли попаданий в кэш).
+    """
+
+    def __init__(self, namespace="sba"):
+        self.namespace = namespace
+        self._metrics = {}
+        self._stats = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Регистрация Counter
+        """
+        return self._register(Counter(f"{self.namespace}_{name}", documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Регистрация Histogram
+        """
+        return self._register(Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_stats(self, prefix, stats):
+        """
+        Источник gauge: stats() возвращает словарь; повторная регистрация prefix заменяет источник
+        """
+        self._stats[prefix] = stats
+
+    def unregister_stats(self, prefix):
+        """
+        Удаление источника
+        """
+        self._stats.pop(prefix, None)
+
+    def render(self):
+        """
+        Все метрики в текстовом формате Prometheus
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for prefix, stats in list(self._stats.items()):
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.namespace}_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+DB_QUERY_SECONDS = registry.histogram("db_query_seconds", "Database query latency", ("alias", "operation"))
+UPDATE_SECONDS = registry.histogram("bot_update_seconds", "Telegram update processing latency", ("event_type",))
+UPDATE_QUERIES = registry.histogram(
+    "bot_update_db_queries", "Database queries per Telegram update", ("event_type",), buckets=QUERY_COUNT_BUCKETS
+)
+HANDLER_SECONDS = registry.histogram("bot_handler_seconds", "aiogram handler latency", ("handler", "status"))
+CALL_SECONDS = registry.histogram("call_seconds", "Hot path function latency", ("function",))
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests served by the ASGI application", ("status",))
+
+# Счётчик запросов текущего обновления; sync_to_async копирует контекст, поэтому
+# запросы из потоков ORM попадают в тот же список
+_update_queries = contextvars.ContextVar("update_queries", default=None)
+
+
+def sql_operation(sql):
+    """
+    Операция SQL для метки: первое слово запроса в нижнем регистре
+    """
+    word = sql.lstrip()[:10].split(None, 1)
+    operation = word[0].lower() if word else ""
+    return operation if operation in SQL_OPERATIONS else "other"
+
+
+def query_metrics(execute, sql, params, many, context):
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper): задержка и счётчик запросов обновления
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, context["connection"].alias, sql_operation(sql))
+        counter = _update_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def install_query_metrics(sender, connection, **kwargs):  # pylint: disable=W0613
+    """
+    Обработчик connection_created: обёртка ставится один раз на соединение
+    """
+    if query_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_metrics)
+
+
+@contextmanager
+def count_queries():
+    """
+    Подсчёт запросов к базе в блоке, включая выполненные через sync_to_async: [число]
+    """
+    counter = [0]
+    token = _update_queries.set(counter)
+    try:
+        yield counter
+    finally:
+        _update_queries.reset(token)
+
+
+def timed(name):
+    """
+    Декоратор: время вызовов функции в CALL_SECONDS с меткой function=name
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                CALL_SECONDS.observe(time.perf_counter() - started, name)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsApplication:  # pylint: disable=R0903
+    """
+    ASGI-приложение: GET на path отдаёт registry.render(), остальные запросы
+    передаются в app; ответы app считаются по статусам.
+
+    При непустом token требуется заголовок Authorization: Bearer <token>.
+    """
+
+    def __init__(self, app, path="/metrics", token=""):
+        self.app = app
+        self.path = path
+        self.token = token.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+        elif scope["path"] == self.path:
+            await self._metrics(scope, send)
+        else:
+            await self.app(scope, receive, self._counting(send))
+
+    @staticmethod
+    def _counting(send):
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                HTTP_REQUESTS.inc(str(message["status"]))
+            await send(message)
+
+        return counting_send
+
+    async def _metrics(self, scope, send):
+        status, body = 200, b""
+        token = dict(scope["headers"]).get(b"authorization", b"")
+        if scope["method"] not in ("GET", "HEAD"):
+            status = 405
+        elif self.token and not hmac.compare_digest(token, b"Bearer " + self.token):
+            status = 403
+        elif scope["method"] == "GET":
+            body = registry.render().encode()
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", CONTENT_TYPE.encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def metrics_application(app):
+    """
+    Обёртка ASGI-приложения эндпоинтом метрик по настройкам METRICS_*; без METRICS_ENABLED возвращает app.
+    Эндпоинт доступен из того же приложения, что и вебхук, поэтому без METRICS_TOKEN не включается.
+    """
+    if not settings.METRICS_ENABLED:
+        return app
+    if not settings.METRICS_TOKEN:
+        raise ImproperlyConfigured("METRICS_TOKEN must be set when METRICS_ENABLED is true")
+    return MetricsApplication(app, settings.METRICS_PATH, settings.METRICS_TOKEN)
@@ -0,0 +1,74 @@
+"""Промежуточные обработчики aiogram"""
+
+import time
+
+from aiogram import BaseMiddleware
+
+from .ingest import profile_buffer
+from .metrics import HANDLER_SECONDS, UPDATE_QUERIES, UPDATE_SECONDS, count_queries
+from .routers import acting_as
+
+
+class ActingUserMiddleware(BaseMiddleware):  # pylint: disable=R0903
+    """
+    Обработка обновления от имени отправителя: после его записи чтения
+    идут на основную базу (см. routers.acting_as)
+    """
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        with acting_as(user.id if user is not None else None):
+            return await handler(event, data)
+
+
+class ProfileIngestMiddleware(BaseMiddleware):  # pylint: disable=R0903
+    """
+    Отправитель обновления попадает в буфер профилей (ingest.profile_buffer),
+    который сбрасывается в базу пачками. Регистрируется как outer middleware:
+    dp.update.outer_middleware(ProfileIngestMiddleware())
+    """
+
+    def __init__(self, buffer=profile_buffer):
+        self.buffer = buffer
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is not None:
+            await self.buffer.aadd_user(user)
+        return await handler(event, data)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):  # pylint: disable=R0903
+    """
+    Время обработки обновления и число запросов к базе за него.
+    Регистрируется как outer middleware: dp.update.outer_middleware(UpdateMetricsMiddleware())
+    """
+
+    async def __call__(self, handler, event, data):
+        event_type = getattr(event, "event_type", None) or type(event).__name__
+        started = time.perf_counter()
+        with count_queries() as queries:
+            try:
+                return await handler(event, data)
+            finally:
+                UPDATE_SECONDS.observe(time.perf_counter() - started, event_type)
+                UPDATE_QUERIES.observe(queries[0], event_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):  # pylint: disable=R0903
+    """
+    Время выполнения обработчиков по их именам. Регистрируется как inner
+    middleware наблюдателя: router.message.middleware(HandlerMetricsMiddleware())
+    """
+
+    async def __call__(self, handler, event, data):
+        callback = getattr(data.get("handler"), "callback", None)
+        name = f"{callback.__module__}.{callback.__qualname__}" if callback is not None else type(event).__name__
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name, status)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Booking",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("start", models.DateTimeField(verbose_name="Начало")),
+                ("end", models.DateTimeField(verbose_name="Окончание")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("confirmed", "Подтверждено"), ("cancelled", "Отменено")],
+                        default="confirmed",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="Создано")),
+                (
+                    "location",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bookings",
+                        to="bot_admin.servicelocation",
+                        verbose_name="Место оказания услуги",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="bookings",
+                        to="bot_admin.telegramuser",
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Бронирование",
+                "verbose_name_plural": "Бронирования",
+                "ordering": ["start"],
+                "indexes": [models.Index(fields=["location", "status", "start", "end"], name="booking_overlap_idx")],
+                "constraints": [models.CheckConstraint(condition=models.Q(("end__gt", models.F("start"))), name="booking_end_after_start")],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:56
+
+from django.db import migrations, models
+
+
+def delete_duplicate_photos(apps, schema_editor):
+    """Оставляет последнюю строку для каждого file_unique_id перед добавлением уникальности"""
+    photos = apps.get_model("bot_admin", "TelegramUserProfilePhotos")
+    latest = photos.objects.values("file_unique_id").annotate(last_id=models.Max("id")).values("last_id")
+    photos.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0002_booking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="telegramuser",
+            name="telegram_id",
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="telegramuser",
+            name="bio",
+            field=models.CharField(blank=True, default="", max_length=70),
+        ),
+        migrations.AlterField(
+            model_name="telegramuser",
+            name="is_premium",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="telegramuser",
+            name="language_code",
+            field=models.CharField(blank=True, default="", max_length=35),
+        ),
+        migrations.AlterField(
+            model_name="telegramuser",
+            name="last_name",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="telegramuser",
+            name="username",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="telegramuserprofilephotos",
+            name="file_size",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(delete_duplicate_photos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="telegramuserprofilephotos",
+            name="file_unique_id",
+            field=models.CharField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name="telegramuserprofilephotos",
+            name="height",
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="telegramuserprofilephotos",
+            name="width",
+            field=models.PositiveIntegerField(),
+        ),
+    ]
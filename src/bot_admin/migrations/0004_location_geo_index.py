@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0003_telegram_upsert_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="servicelocation",
+            index=models.Index(fields=["latitude", "longitude"], name="location_geo_idx"),
+        ),
+    ]
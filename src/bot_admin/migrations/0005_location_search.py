@@ -0,0 +1,78 @@
+from django.db import migrations
+
+# Совпадают с bot_admin.search.PG_SEARCH_DOCUMENT и SQLITE_FTS_TABLE
+PG_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(rest_of_address, '')), 'C')"
+)
+SQLITE_FTS_TABLE = "bot_admin_servicelocation_fts"
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS location_search_idx ON bot_admin_servicelocation USING gin (({PG_SEARCH_DOCUMENT}))",
+    "CREATE INDEX IF NOT EXISTS location_name_trgm_idx ON bot_admin_servicelocation USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS location_city_trgm_idx ON bot_admin_servicelocation USING gin (city gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS location_address_trgm_idx ON bot_admin_servicelocation USING gin (rest_of_address gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS location_search_idx",
+    "DROP INDEX IF EXISTS location_name_trgm_idx",
+    "DROP INDEX IF EXISTS location_city_trgm_idx",
+    "DROP INDEX IF EXISTS location_address_trgm_idx",
+]
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+    "name, city, rest_of_address, content='bot_admin_servicelocation', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON bot_admin_servicelocation BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, city, rest_of_address) VALUES (new.id, new.name, new.city, new.rest_of_address); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON bot_admin_servicelocation BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, city, rest_of_address) "
+    "VALUES ('delete', old.id, old.name, old.city, old.rest_of_address); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE ON bot_admin_servicelocation BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, city, rest_of_address) "
+    "VALUES ('delete', old.id, old.name, old.city, old.rest_of_address); "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, city, rest_of_address) VALUES (new.id, new.name, new.city, new.rest_of_address); END",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}",
+]
+
+
+def run_for_vendor(postgresql, sqlite):
+    """Выполнение SQL только для соответствующей СУБД"""
+
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = {"postgresql": postgresql, "sqlite": sqlite}.get(vendor, [])
+        if vendor == "sqlite" and not sqlite_has_fts5(schema_editor.connection):
+            statements = []
+        for statement in statements:
+            schema_editor.execute(statement, params=None)
+
+    return run
+
+
+def sqlite_has_fts5(connection):
+    """Собран ли SQLite с FTS5 и токенизатором trigram (3.34+)"""
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        options = {row[0] for row in cursor.fetchall()}
+    return "ENABLE_FTS5" in options and connection.Database.sqlite_version_info >= (3, 34, 0)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot_admin", "0004_location_geo_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
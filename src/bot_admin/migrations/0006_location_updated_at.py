@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite добавляет поле пересозданием таблицы, при этом удаляются триггеры
+# полнотекстового индекса из 0005; они создаются заново
+location_search = import_module("bot_admin.migrations.0005_location_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0005_location_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicelocation",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Изменено"),
+        ),
+        migrations.RunPython(location_search.run_for_vendor([], location_search.SQLITE_FORWARD), migrations.RunPython.noop),
+    ]
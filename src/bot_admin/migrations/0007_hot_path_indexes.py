@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# Частичные и покрывающие индексы создаются только в PostgreSQL; в SQLite —
+# обычные индексы с теми же именами (таблицы SQLite кластеризованы по rowid,
+# поэтому WorkDay там покрывающий индекс не нужен)
+POSTGRES_FORWARD = [
+    # Соединение available_days -> WorkDay в schedule_cache без обращения к таблице
+    "CREATE INDEX IF NOT EXISTS workday_schedule_idx ON bot_admin_workday (id) INCLUDE (day, start_time, end_time)",
+    # Поиск пользователя по username; у большинства пользователей он пустой
+    "CREATE INDEX IF NOT EXISTS tguser_username_idx ON bot_admin_telegramuser (username) WHERE username <> ''",
+    # Загрузка будущих подтверждённых бронирований в SlotIndex.build
+    'CREATE INDEX IF NOT EXISTS booking_upcoming_idx ON bot_admin_booking ("end") INCLUDE (location_id, start) '
+    "WHERE status = 'confirmed'",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS workday_schedule_idx",
+    "DROP INDEX IF EXISTS tguser_username_idx",
+    "DROP INDEX IF EXISTS booking_upcoming_idx",
+]
+SQLITE_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS tguser_username_idx ON bot_admin_telegramuser (username)",
+    'CREATE INDEX IF NOT EXISTS booking_upcoming_idx ON bot_admin_booking (status, "end")',
+]
+SQLITE_BACKWARD = [
+    "DROP INDEX IF EXISTS tguser_username_idx",
+    "DROP INDEX IF EXISTS booking_upcoming_idx",
+]
+
+
+def run_for_vendor(postgresql, sqlite):
+    """Выполнение SQL только для соответствующей СУБД"""
+
+    def run(apps, schema_editor):
+        for statement in {"postgresql": postgresql, "sqlite": sqlite}.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement, params=None)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot_admin", "0006_location_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0007_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboundMessage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("chat_id", models.BigIntegerField(verbose_name="Чат")),
+                ("method", models.CharField(default="sendMessage", max_length=64, verbose_name="Метод Bot API")),
+                ("payload", models.JSONField(default=dict, verbose_name="Параметры")),
+                (
+                    "priority",
+                    models.SmallIntegerField(
+                        choices=[(0, "Бронирование"), (5, "Уведомление"), (10, "Напоминание")], default=5, verbose_name="Приоритет"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Ожидает отправки"), ("sent", "Отправлено"), ("failed", "Ошибка")],
+                        default="pending",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0, verbose_name="Попытки")),
+                ("next_attempt_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="Следующая попытка")),
+                ("last_error", models.TextField(blank=True, default="", verbose_name="Последняя ошибка")),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="Создано")),
+                ("sent_at", models.DateTimeField(blank=True, null=True, verbose_name="Отправлено")),
+            ],
+            options={
+                "verbose_name": "Исходящее сообщение",
+                "verbose_name_plural": "Исходящие сообщения",
+                "ordering": ["priority", "next_attempt_at", "id"],
+                "indexes": [models.Index(fields=["status", "next_attempt_at", "priority"], name="outbound_due_idx")],
+            },
+        ),
+    ]
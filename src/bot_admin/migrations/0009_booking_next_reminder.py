@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:27
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_upcoming(apps, schema_editor):
+    """Напоминания для уже существующих будущих бронирований"""
+    Booking = apps.get_model("bot_admin", "Booking")
+    now = timezone.now()
+    leads = sorted(settings.BOOKING_REMINDER_LEADS, reverse=True)
+    upcoming = Booking.objects.using(schema_editor.connection.alias).filter(status="confirmed", start__gt=now)
+    for booking in upcoming.only("pk", "start").iterator():
+        times = [booking.start - datetime.timedelta(minutes=lead) for lead in leads]
+        next_time = next((time for time in times if time > now), None)
+        if next_time is not None:
+            Booking.objects.using(schema_editor.connection.alias).filter(pk=booking.pk).update(next_reminder_at=next_time)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0008_outbound_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="next_reminder_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name="Следующее напоминание"),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("next_reminder_at__isnull", False)), fields=["next_reminder_at"], name="booking_reminder_idx"
+            ),
+        ),
+        migrations.RunPython(schedule_upcoming, migrations.RunPython.noop),
+    ]
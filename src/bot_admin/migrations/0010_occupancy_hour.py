@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0009_booking_next_reminder"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyHour",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(verbose_name="Дата")),
+                ("hour", models.PositiveSmallIntegerField(verbose_name="Час")),
+                ("booked_minutes", models.PositiveIntegerField(default=0, verbose_name="Забронировано минут")),
+                ("bookings", models.PositiveIntegerField(default=0, verbose_name="Бронирований")),
+                (
+                    "location",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="bot_admin.servicelocation",
+                        verbose_name="Место оказания услуги",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Занятость за час",
+                "verbose_name_plural": "Занятость по часам",
+                "ordering": ["date", "hour"],
+                "constraints": [models.UniqueConstraint(fields=("location", "date", "hour"), name="occupancy_hour_unique")],
+            },
+        ),
+    ]
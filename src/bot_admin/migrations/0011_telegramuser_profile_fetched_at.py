@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0010_occupancy_hour"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="telegramuser",
+            name="profile_fetched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
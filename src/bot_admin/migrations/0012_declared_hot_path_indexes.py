@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:36
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Индексы 0007 создавались SQL-ом и не попадали в состояние миграций;
+# теперь они объявлены в Meta.indexes, а прежние удаляются перед AddIndex
+hot_path = import_module("bot_admin.migrations.0007_hot_path_indexes")
+RAW_INDEXES = ["workday_schedule_idx", "tguser_username_idx", "booking_upcoming_idx"]
+
+
+def drop_raw_indexes(apps, schema_editor):
+    """Удаление индексов, созданных 0007"""
+    for name in RAW_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}", params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot_admin", "0011_telegramuser_profile_fetched_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_raw_indexes, hot_path.run_for_vendor(hot_path.POSTGRES_FORWARD, hot_path.SQLITE_FORWARD)),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("status", "confirmed")), fields=["end"], include=("location", "start"), name="booking_upcoming_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="telegramuser",
+            index=models.Index(condition=models.Q(("username", ""), _negated=True), fields=["username"], name="tguser_username_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="workday",
+            index=models.Index(fields=["id"], include=("day", "start_time", "end_time"), name="workday_schedule_idx"),
+        ),
+    ]
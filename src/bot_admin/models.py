@@ -5,6 +5,9 @@ import datetime
 from django.db import models
 from django.utils import timezone
 
+from .metrics import timed
+from .schedule_cache import format_interval, format_working_hours, schedule_cache
+
 
 class WorkDay(models.Model):
     """
@@ -26,9 +29,7 @@ class WorkDay(models.Model):
     end_time = models.TimeField(auto_now=False, null=True, blank=True, verbose_name="Время окончания работы")
 
     def __str__(self):
-        start = self.start_time.strftime("%H:%M") if self.start_time else "—"
-        end = self.end_time.strftime("%H:%M") if self.end_time else "—"
-        return f"{start}-{end} {self.get_day_display()}"
+        return f"{format_interval(self.start_time, self.end_time)} {self.get_day_display()}"
 
     def is_time_available(self, time: datetime.time):
         "Проверка доступности времени в рамках дня недели"
@@ -43,6 +44,10 @@ class WorkDay(models.Model):
         verbose_name = "Рабочее время"
         verbose_name_plural = "Рабочие времена"
         ordering = ["day"]
+        indexes = [
+            # Соединение available_days -> WorkDay в schedule_cache без обращения к таблице
+            models.Index(fields=["id"], include=["day", "start_time", "end_time"], name="workday_schedule_idx"),
+        ]
 
 
 class ServiceLocation(models.Model):
@@ -58,6 +63,8 @@ class ServiceLocation(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Широта")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Долгота")
     capacity = models.PositiveIntegerField(default=1, verbose_name="Вместимость")
+    # Версия содержимого карточки; обновляется и при изменении расписания
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
 
     # Временные параметры
     available_days = models.ManyToManyField(
@@ -71,21 +78,20 @@ class ServiceLocation(models.Model):
         verbose_name = "Место оказания услуги"
         verbose_name_plural = "Места оказания услуг"
         ordering = ["name"]
+        indexes = [
+            # Отбор по прямоугольнику координат в geo.locations_within
+            models.Index(fields=["latitude", "longitude"], name="location_geo_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.city}"
 
+    @timed("location.is_available")
     def is_available(self, date, time):
         """
         Проверка доступности места на указанную дату и время
         """
-        weekday = date.weekday()
-        if not self.available_days.exists():
-            return True
-        week_day = self.available_days.filter(day=weekday).first()
-        if not week_day:
-            return False
-        return week_day.is_time_available(time)
+        return schedule_cache.get(self.pk).is_available(date.weekday(), time)
 
     def get_address(self):
         """
@@ -105,14 +111,13 @@ class ServiceLocation(models.Model):
 
     def get_working_hours(self):
         """
-        Получение времени работы в формате строки
+        Получение времени работы в формате строки.
+        Использует prefetch_related("available_days"), если он был выполнен.
         """
-        hours = []
-        for day in self.available_days.order_by("day").all():
-            start = day.start_time.strftime("%H:%M") if day.start_time else "—"
-            end = day.end_time.strftime("%H:%M") if day.end_time else "—"
-            hours.append(f"{day.get_day_display()} {start}-{end}")
-        return ", ".join(hours)
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("available_days")
+        if prefetched is not None:
+            return format_working_hours((day.day, day.start_time, day.end_time) for day in prefetched)
+        return schedule_cache.get(self.pk).working_hours
 
 
 class TelegramUser(models.Model):
@@ -121,13 +126,23 @@ class TelegramUser(models.Model):
     for ChatFullInfo
     """
 
+    telegram_id = models.BigIntegerField(unique=True, null=True, blank=True)
     first_name = models.CharField(max_length=64)
-    last_name = models.CharField(max_length=64)
-    username = models.CharField(max_length=32)
-    bio = models.CharField(max_length=70)
-    language_code = models.CharField(max_length=2)
-    is_premium = models.BooleanField()
+    last_name = models.CharField(max_length=64, blank=True, default="")
+    username = models.CharField(max_length=32, blank=True, default="")
+    bio = models.CharField(max_length=70, blank=True, default="")
+    # IETF language tag, например "pt-br"
+    language_code = models.CharField(max_length=35, blank=True, default="")
+    is_premium = models.BooleanField(default=False)
     datetime = models.DateTimeField(default=timezone.now)
+    # Последняя загрузка профиля через getChat (bot_admin.profiles)
+    profile_fetched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Поиск пользователя по username; у большинства пользователей он пустой
+            models.Index(fields=["username"], name="tguser_username_idx", condition=~models.Q(username="")),
+        ]
 
 
 class TelegramUserProfilePhotos(models.Model):
@@ -139,9 +154,140 @@ class TelegramUserProfilePhotos(models.Model):
 
     tg_user_id = models.ForeignKey(TelegramUser, on_delete=models.CASCADE)
     file_id = models.CharField()
-    file_unique_id = models.CharField()
-    file_size = models.IntegerField()
-    width = models.SmallIntegerField()
-    height = models.SmallIntegerField()
+    file_unique_id = models.CharField(unique=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
     # in bytes
-    file_size = models.SmallIntegerField()
+    file_size = models.PositiveIntegerField(null=True, blank=True)
+
+
+class Booking(models.Model):
+    """
+    Модель бронирования места оказания услуги на интервал [start, end).
+    """
+
+    STATUS_CONFIRMED = "confirmed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (STATUS_CONFIRMED, "Подтверждено"),
+        (STATUS_CANCELLED, "Отменено"),
+    ]
+
+    location = models.ForeignKey(
+        ServiceLocation,
+        on_delete=models.CASCADE,
+        related_name="bookings",
+        verbose_name="Место оказания услуги",
+    )
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="bookings",
+        verbose_name="Пользователь",
+    )
+    start = models.DateTimeField(verbose_name="Начало")
+    end = models.DateTimeField(verbose_name="Окончание")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_CONFIRMED, verbose_name="Статус")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Создано")
+    # Время ближайшего неотправленного напоминания (reminders.ReminderScheduler)
+    next_reminder_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Следующее напоминание")
+
+    class Meta:
+        verbose_name = "Бронирование"
+        verbose_name_plural = "Бронирования"
+        ordering = ["start"]
+        indexes = [
+            models.Index(fields=["location", "status", "start", "end"], name="booking_overlap_idx"),
+            # Загрузка будущих подтверждённых бронирований в SlotIndex.build
+            models.Index(
+                fields=["end"], include=["location", "start"], name="booking_upcoming_idx", condition=models.Q(status="confirmed")
+            ),
+            # Загрузка напоминаний ближайшего горизонта
+            models.Index(fields=["next_reminder_at"], name="booking_reminder_idx", condition=models.Q(next_reminder_at__isnull=False)),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end__gt=models.F("start")), name="booking_end_after_start"),
+        ]
+
+    def __str__(self):
+        return f"{self.location.name}: {self.start:%d.%m.%Y %H:%M} - {self.end:%d.%m.%Y %H:%M}"
+
+
+class OutboundMessage(models.Model):
+    """
+    Исходящий вызов Bot API в очереди отправки (outbound.SendScheduler).
+    Хранится в базе, поэтому неотправленные сообщения переживают перезапуск.
+    """
+
+    # Меньшее значение отправляется раньше
+    PRIORITY_BOOKING = 0
+    PRIORITY_NOTIFICATION = 5
+    PRIORITY_REMINDER = 10
+    PRIORITY_CHOICES = [
+        (PRIORITY_BOOKING, "Бронирование"),
+        (PRIORITY_NOTIFICATION, "Уведомление"),
+        (PRIORITY_REMINDER, "Напоминание"),
+    ]
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    chat_id = models.BigIntegerField(verbose_name="Чат")
+    method = models.CharField(max_length=64, default="sendMessage", verbose_name="Метод Bot API")
+    payload = models.JSONField(default=dict, verbose_name="Параметры")
+    priority = models.SmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_NOTIFICATION, verbose_name="Приоритет")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попытки")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, default="", verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Исходящее сообщение"
+        verbose_name_plural = "Исходящие сообщения"
+        ordering = ["priority", "next_attempt_at", "id"]
+        indexes = [
+            # Выборка готовых к отправке сообщений в SendScheduler
+            models.Index(fields=["status", "next_attempt_at", "priority"], name="outbound_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.method} → {self.chat_id} ({self.get_status_display()})"
+
+
+class OccupancyHour(models.Model):
+    """
+    Агрегат занятости места за час (местное время): сумма минут подтверждённых
+    бронирований и их число. Поддерживается сигналами Booking (occupancy.py).
+    """
+
+    location = models.ForeignKey(
+        ServiceLocation,
+        on_delete=models.CASCADE,
+        related_name="occupancy",
+        verbose_name="Место оказания услуги",
+    )
+    date = models.DateField(verbose_name="Дата")
+    hour = models.PositiveSmallIntegerField(verbose_name="Час")
+    booked_minutes = models.PositiveIntegerField(default=0, verbose_name="Забронировано минут")
+    bookings = models.PositiveIntegerField(default=0, verbose_name="Бронирований")
+
+    class Meta:
+        verbose_name = "Занятость за час"
+        verbose_name_plural = "Занятость по часам"
+        ordering = ["date", "hour"]
+        constraints = [
+            models.UniqueConstraint(fields=["location", "date", "hour"], name="occupancy_hour_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.location_id} {self.date:%d.%m.%Y} {self.hour:02d}:00"
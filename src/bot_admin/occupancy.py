@@ -0,0 +1,178 @@
+"""Агрегаты занятости мест по часам и их сверка с бронированиями"""
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Booking, OccupancyHour, ServiceLocation
+from .schedule_cache import CompiledSchedule, schedule_cache
+
+
+def hourly_minutes(start, end):
+    """
+    Разбиение интервала [start, end) по часам местного времени: [(дата, час, минуты)]
+    """
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    pieces = []
+    cursor = start
+    while cursor < end:
+        boundary = min(end, cursor.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1))
+        minutes = int((boundary - cursor).total_seconds() // 60)
+        if minutes:
+            pieces.append((cursor.date(), cursor.hour, minutes))
+        cursor = boundary
+    return pieces
+
+
+def apply_booking(location_id, start, end, sign):
+    """
+    Прибавление (sign=1) или вычитание (sign=-1) бронирования из агрегатов.
+
+    Вызывается в транзакции записи бронирования. Правки в админке и отмены
+    не берут блокировку места, поэтому недостающие строки создаются через
+    INSERT ... ON CONFLICT DO NOTHING, а счётчики меняются атомарным UPDATE:
+    параллельные транзакции не падают на occupancy_hour_unique и не теряют
+    изменений друг друга.
+    """
+    pieces = hourly_minutes(start, end)
+    if sign > 0:
+        OccupancyHour.objects.bulk_create(
+            [OccupancyHour(location_id=location_id, date=date, hour=hour) for date, hour, _ in pieces],
+            ignore_conflicts=True,
+        )
+    for date, hour, minutes in pieces:
+        OccupancyHour.objects.filter(location_id=location_id, date=date, hour=hour).update(
+            booked_minutes=F("booked_minutes") + sign * minutes, bookings=F("bookings") + sign
+        )
+
+
+def _scope(queryset, location_ids, field="location_id"):
+    return queryset.filter(**{f"{field}__in": location_ids}) if location_ids is not None else queryset
+
+
+def recompute(location_ids=None, since=None):
+    """
+    Полный пересчёт агрегатов по подтверждённым бронированиям:
+    {(location_id, date, hour): (минуты, бронирования)}
+    """
+    bookings = _scope(Booking.objects.filter(status=Booking.STATUS_CONFIRMED), location_ids)
+    if since is not None:
+        bookings = bookings.filter(end__gt=timezone.make_aware(datetime.datetime.combine(since, datetime.time.min)))
+    totals = defaultdict(lambda: [0, 0])
+    for location_id, start, end in bookings.order_by().values_list("location_id", "start", "end").iterator(chunk_size=2000):
+        for date, hour, minutes in hourly_minutes(start, end):
+            if since is None or date >= since:
+                total = totals[location_id, date, hour]
+                total[0] += minutes
+                total[1] += 1
+    return {key: tuple(value) for key, value in totals.items()}
+
+
+def stored(location_ids=None, since=None):
+    """
+    Агрегаты из таблицы OccupancyHour в том же виде, что и recompute (без нулевых строк)
+    """
+    rows = _scope(OccupancyHour.objects.exclude(bookings=0), location_ids)
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+    return {
+        (location_id, date, hour): (minutes, count)
+        for location_id, date, hour, minutes, count in rows.order_by().values_list(
+            "location_id", "date", "hour", "booked_minutes", "bookings"
+        )
+    }
+
+
+def backfill(location_ids=None, since=None, batch_size=1000):
+    """
+    Перестроение агрегатов из бронирований; возвращает число строк
+    """
+    with transaction.atomic():
+        # Пересчёт в той же транзакции, что и запись: бронирования, изменённые
+        # между ними, не потеряются
+        totals = recompute(location_ids, since)
+        rows = _scope(OccupancyHour.objects.all(), location_ids)
+        if since is not None:
+            rows = rows.filter(date__gte=since)
+        rows.delete()
+        OccupancyHour.objects.bulk_create(
+            (
+                OccupancyHour(location_id=location_id, date=date, hour=hour, booked_minutes=minutes, bookings=count)
+                for (location_id, date, hour), (minutes, count) in totals.items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    """Расхождение агрегата с пересчётом: (минуты, бронирования) или None"""
+
+    location_id: int
+    date: datetime.date
+    hour: int
+    expected: tuple
+    actual: tuple
+
+    def __str__(self):
+        return f"location {self.location_id} {self.date} {self.hour:02d}:00: expected {self.expected}, stored {self.actual}"
+
+
+def check(location_ids=None, since=None):
+    """
+    Сверка агрегатов с полным пересчётом; пустой список, если они совпадают
+    """
+    expected = recompute(location_ids, since)
+    actual = stored(location_ids, since)
+    return [
+        Mismatch(*key, expected.get(key), actual.get(key))
+        for key in sorted(expected.keys() | actual.keys())
+        if expected.get(key) != actual.get(key)
+    ]
+
+
+def location_schedule(location):
+    """
+    Скомпилированное расписание места; использует prefetch_related("available_days"), если он был выполнен
+    """
+    prefetched = getattr(location, "_prefetched_objects_cache", {}).get("available_days")
+    if prefetched is None:
+        return schedule_cache.get(location.pk)
+    schedule = defaultdict(list)
+    for day in prefetched:
+        schedule[day.day].append((day.start_time, day.end_time))
+    return CompiledSchedule(schedule)
+
+
+def utilization(location, booked_minutes, dates):
+    """
+    Доля занятой вместимости места за даты dates; None, если место в эти дни закрыто
+    """
+    schedule = location_schedule(location)
+    available = sum(schedule.open_minutes(date.weekday()) for date in dates) * location.capacity
+    return (booked_minutes or 0) / available if available else None
+
+
+def daily_utilization(location_ids, start, end):
+    """
+    Загрузка мест по дням из агрегатов: {location_id: {date: доля занятой вместимости}}.
+    Доступное время берётся из расписания места (schedule_cache) с учётом capacity.
+    """
+    capacities = dict(ServiceLocation.objects.filter(pk__in=location_ids).values_list("pk", "capacity"))
+    schedules = schedule_cache.get_many(list(capacities))
+    booked = (
+        OccupancyHour.objects.filter(location_id__in=capacities, date__gte=start, date__lte=end)
+        .values_list("location_id", "date")
+        .annotate(minutes=Sum("booked_minutes"))
+        .order_by()
+    )
+    result = defaultdict(dict)
+    for location_id, date, minutes in booked:
+        available = schedules[location_id].open_minutes(date.weekday()) * capacities[location_id]
+        result[location_id][date] = minutes / available if available else 0.0
+    return dict(result)
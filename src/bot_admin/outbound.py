@@ -0,0 +1,287 @@
+"""Очередь исходящих сообщений бота с учётом лимитов Telegram"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+
+from aiogram import methods
+from aiogram.exceptions import TelegramAPIError, TelegramMigrateToChat, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods.base import TelegramMethod
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import registry
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+# Классы методов aiogram по имени метода Bot API ("sendMessage")
+API_METHODS = {
+    cls.__api_method__: cls
+    for cls in vars(methods).values()
+    if isinstance(cls, type) and issubclass(cls, TelegramMethod) and hasattr(cls, "__api_method__")
+}
+
+
+def _check_method(method):
+    if method not in API_METHODS:
+        raise ValueError(f"Unknown Bot API method: {method}")
+
+
+def enqueue(chat_id, method="sendMessage", priority=OutboundMessage.PRIORITY_NOTIFICATION, **params):
+    """
+    Постановка вызова Bot API в очередь отправки; неизвестный метод — ValueError
+    """
+    _check_method(method)
+    return OutboundMessage.objects.create(chat_id=chat_id, method=method, priority=priority, payload=params)
+
+
+async def aenqueue(chat_id, method="sendMessage", priority=OutboundMessage.PRIORITY_NOTIFICATION, **params):
+    """
+    Асинхронный вариант enqueue
+    """
+    _check_method(method)
+    return await OutboundMessage.objects.acreate(chat_id=chat_id, method=method, priority=priority, payload=params)
+
+
+class TokenBucket:
+    """
+    Маркерная корзина: rate маркеров в секунду, не больше capacity подряд
+    """
+
+    def __init__(self, rate, capacity=1.0, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def full(self):
+        """
+        Корзина полна (давно не использовалась)
+        """
+        self._refill()
+        return self._tokens >= self.capacity
+
+    def delay(self):
+        """
+        Секунды до появления маркера
+        """
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self):
+        """
+        Списание маркера
+        """
+        self._refill()
+        self._tokens -= 1
+
+    def pause(self, seconds):
+        """
+        Запрет списания на seconds секунд (ответ 429 с retry_after)
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class SendScheduler:  # pylint: disable=R0902
+    """
+    Отправка OutboundMessage через bot.
+
+    Сообщения выбираются по приоритету, но не чаще global_rate в секунду на
+    бота и chat_rate на чат (group_rate для групп). Ответ 429 приостанавливает
+    чат и всю отправку на retry_after. Сетевые ошибки и ошибки сервера
+    повторяются с экспоненциальной задержкой до max_attempts, остальные ошибки
+    Bot API (бот заблокирован, чат не найден) отмечают сообщение как failed.
+
+    Предполагается один планировщик на бота: несколько процессов делили бы
+    лимиты Telegram и отправляли бы одни и те же сообщения.
+    """
+
+    def __init__(self, bot, **options):
+        self.bot = bot
+        self.global_rate = options.get("global_rate", settings.TELEGRAM_SEND_GLOBAL_RATE)
+        self.chat_rate = options.get("chat_rate", settings.TELEGRAM_SEND_CHAT_RATE)
+        self.group_rate = options.get("group_rate", settings.TELEGRAM_SEND_GROUP_RATE)
+        self.concurrency = options.get("concurrency", settings.TELEGRAM_SEND_CONCURRENCY)
+        self.max_attempts = options.get("max_attempts", settings.TELEGRAM_SEND_MAX_ATTEMPTS)
+        self.retry_delay = options.get("retry_delay", settings.TELEGRAM_SEND_RETRY_DELAY)
+        self.batch_size = options.get("batch_size", 100)
+        self.poll_interval = options.get("poll_interval", 1.0)
+        self.clock = options.get("clock", time.monotonic)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self._global = TokenBucket(self.global_rate, clock=self.clock)
+        self._chats = {}
+        self._seq = itertools.count()
+        # (priority, seq, message) — можно отправлять; (время, priority, seq, message) — ждут маркер чата
+        self._ready = []
+        self._deferred = []
+        self._loaded = set()
+        self._tasks = set()
+        self._next_load = 0.0
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {key: value for key, value in self._chats.items() if not value.full}
+            bucket = self._chats[chat_id] = TokenBucket(self.group_rate if chat_id < 0 else self.chat_rate, clock=self.clock)
+        return bucket
+
+    def _push(self, message):
+        heapq.heappush(self._ready, (message.priority, next(self._seq), message))
+
+    def wake(self):
+        """
+        Немедленная проверка новых сообщений в базе
+        """
+        self._next_load = 0.0
+        self._wakeup.set()
+
+    async def _wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except (TimeoutError, asyncio.TimeoutError):
+            pass
+        self._wakeup.clear()
+
+    async def _load(self):
+        """
+        Догрузка готовых к отправке сообщений; False, если новых нет
+        """
+        self._next_load = self.clock() + self.poll_interval
+        queryset = (
+            OutboundMessage.objects.filter(status=OutboundMessage.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .exclude(pk__in=self._loaded)
+            .order_by("priority", "next_attempt_at", "id")
+        )
+        found = False
+        async for message in queryset[: self.batch_size]:
+            self._loaded.add(message.pk)
+            self._push(message)
+            found = True
+        return found
+
+    def _promote(self):
+        now = self.clock()
+        while self._deferred and self._deferred[0][0] <= now:
+            _, priority, seq, message = heapq.heappop(self._deferred)
+            heapq.heappush(self._ready, (priority, seq, message))
+
+    def _idle(self):
+        return not (self._ready or self._deferred or self._tasks)
+
+    async def run(self, until_idle=False):
+        """
+        Цикл отправки; при until_idle завершается, когда готовых сообщений не осталось
+        """
+        registry.register_stats("outbound", self.stats)
+        while True:
+            if len(self._ready) + len(self._deferred) < self.batch_size and (self.clock() >= self._next_load or self._idle()):
+                if not await self._load() and until_idle and self._idle():
+                    return self.stats()
+            self._promote()
+            if not self._ready:
+                timeout = self.poll_interval
+                if self._deferred:
+                    timeout = min(timeout, self._deferred[0][0] - self.clock())
+                await self._wait(max(timeout, 0.0))
+                continue
+            priority, seq, message = heapq.heappop(self._ready)
+            chat_delay = self._chat_bucket(message.chat_id).delay()
+            if chat_delay > 0:
+                heapq.heappush(self._deferred, (self.clock() + chat_delay, priority, seq, message))
+                continue
+            global_delay = self._global.delay()
+            if global_delay > 0:
+                heapq.heappush(self._ready, (priority, seq, message))
+                await self._wait(global_delay)
+                continue
+            await self._slots.acquire()
+            self._chat_bucket(message.chat_id).take()
+            self._global.take()
+            task = asyncio.ensure_future(self._send(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, message):
+        try:
+            method = API_METHODS.get(message.method)
+            if method is None:
+                # Сообщение записано в обход enqueue; повтор не поможет
+                await self._finish(message, OutboundMessage.STATUS_FAILED, f"Unknown Bot API method: {message.method}")
+                return
+            await self.bot(method(chat_id=message.chat_id, **message.payload))
+        except TelegramRetryAfter as error:
+            self.rate_limited += 1
+            self._chat_bucket(message.chat_id).pause(error.retry_after)
+            self._global.pause(error.retry_after)
+            self._push(message)
+        except TelegramMigrateToChat as error:
+            # Группа стала супергруппой: сообщение повторяется в новый чат
+            message.chat_id = error.migrate_to_chat_id
+            await OutboundMessage.objects.filter(pk=message.pk).aupdate(chat_id=message.chat_id)
+            self._push(message)
+        except (TelegramNetworkError, TelegramServerError) as error:
+            await self._retry(message, error)
+        except TelegramAPIError as error:
+            await self._finish(message, OutboundMessage.STATUS_FAILED, error)
+        except Exception as error:  # pylint: disable=W0718
+            logger.exception("Outbound message %s failed", message.pk)
+            await self._retry(message, error)
+        else:
+            await self._finish(message, OutboundMessage.STATUS_SENT)
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    async def _retry(self, message, error):
+        attempts = message.attempts + 1
+        if attempts >= self.max_attempts:
+            await self._finish(message, OutboundMessage.STATUS_FAILED, error, attempts=attempts)
+            return
+        self.retried += 1
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        await OutboundMessage.objects.filter(pk=message.pk).aupdate(
+            attempts=attempts, next_attempt_at=timezone.now() + timedelta(seconds=delay), last_error=str(error)
+        )
+        self._loaded.discard(message.pk)
+
+    async def _finish(self, message, status, error=None, attempts=None):
+        fields = {"status": status, "attempts": attempts if attempts is not None else message.attempts + 1}
+        if status == OutboundMessage.STATUS_SENT:
+            self.sent += 1
+            fields["sent_at"] = timezone.now()
+        else:
+            self.failed += 1
+            fields["last_error"] = str(error)
+        await OutboundMessage.objects.filter(pk=message.pk).aupdate(**fields)
+        self._loaded.discard(message.pk)
+
+    def stats(self):
+        """
+        Счётчики отправки
+        """
+        return {
+            "queued": len(self._ready) + len(self._deferred),
+            "in_flight": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,206 @@
+"""Кэш профилей пользователей Telegram (getChat / getUserProfilePhotos)"""
+
+import asyncio
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .ingest import ProfileIngestBuffer, as_dict
+from .models import TelegramUser, TelegramUserProfilePhotos
+
+
+@dataclass(frozen=True)
+class Profile:  # pylint: disable=R0902
+    """Данные профиля пользователя и момент их получения из Telegram"""
+
+    telegram_id: int
+    first_name: str
+    last_name: str
+    username: str
+    bio: str
+    is_premium: bool
+    photos: tuple
+    fetched_at: datetime.datetime
+
+
+class BotProfileFetcher:  # pylint: disable=R0903
+    """
+    Загрузка профиля через Bot API: getChat и getUserProfilePhotos
+    """
+
+    def __init__(self, bot, photos_limit=10):
+        self.bot = bot
+        self.photos_limit = photos_limit
+
+    async def __call__(self, telegram_id):
+        chat, photos = await asyncio.gather(
+            self.bot.get_chat(chat_id=telegram_id),
+            self.bot.get_user_profile_photos(user_id=telegram_id, limit=self.photos_limit),
+        )
+        return chat, photos
+
+
+class ProfileCache:  # pylint: disable=R0902
+    """
+    Двухуровневый кэш профилей: процессный LRU и кэш Django, затем TelegramUser в базе.
+
+    Запись свежая ttl секунд после fetched_at (TelegramUser.profile_fetched_at); ещё
+    stale_ttl секунд отдаётся устаревшая запись с обновлением в фоне. Параллельные
+    запросы одного пользователя объединяются в одну загрузку из Telegram.
+    """
+
+    def __init__(
+        self, fetcher, ttl=None, stale_ttl=None, maxsize=None, cache_alias="default", now=timezone.now
+    ):  # pylint: disable=R0913,R0917
+        self.fetcher = fetcher
+        self.ttl = datetime.timedelta(seconds=ttl if ttl is not None else settings.PROFILE_CACHE_TTL)
+        self.stale_ttl = datetime.timedelta(seconds=stale_ttl if stale_ttl is not None else settings.PROFILE_CACHE_STALE_TTL)
+        self.maxsize = maxsize if maxsize is not None else settings.PROFILE_CACHE_MAXSIZE
+        self.cache = caches[cache_alias]
+        self.now = now
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._background = set()
+
+    def _key(self, telegram_id):
+        return f"tg-profile:{telegram_id}"
+
+    def _local_get(self, telegram_id):
+        with self._lock:
+            profile = self._local.get(telegram_id)
+            if profile is not None:
+                self._local.move_to_end(telegram_id)
+            return profile
+
+    def _local_set(self, profile):
+        with self._lock:
+            self._local[profile.telegram_id] = profile
+            self._local.move_to_end(profile.telegram_id)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    async def _store(self, profile):
+        self._local_set(profile)
+        timeout = (self.ttl + self.stale_ttl).total_seconds()
+        await self.cache.aset(self._key(profile.telegram_id), asdict(profile), timeout=timeout)
+
+    async def _shared_get(self, telegram_id):
+        data = await self.cache.aget(self._key(telegram_id))
+        if data is None:
+            return None
+        profile = Profile(**data)
+        self._local_set(profile)
+        return profile
+
+    async def _db_get(self, telegram_id):
+        user = await TelegramUser.objects.filter(telegram_id=telegram_id).afirst()
+        if user is None or user.profile_fetched_at is None:
+            return None
+        photos = TelegramUserProfilePhotos.objects.filter(tg_user_id=user).order_by("pk").values_list("file_id", flat=True)
+        profile = Profile(
+            telegram_id=telegram_id,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            username=user.username,
+            bio=user.bio,
+            is_premium=user.is_premium,
+            photos=tuple([file_id async for file_id in photos]),
+            fetched_at=user.profile_fetched_at,
+        )
+        await self._store(profile)
+        return profile
+
+    async def _fetch(self, telegram_id):
+        self.fetches += 1
+        chat, photos = await self.fetcher(telegram_id)
+        fetched_at = self.now()
+        buffer = ProfileIngestBuffer()
+        buffer.add_user(chat, profile_fetched_at=fetched_at)
+        buffer.add_photos(telegram_id, photos)
+        await buffer.aflush()
+        # Профиль строится из ответа Telegram: чтение сразу после записи могло бы уйти на реплику
+        data = as_dict(chat)
+        photo_sizes = photos if isinstance(photos, list) else as_dict(photos).get("photos", ())
+        previous = self._local_get(telegram_id)
+        profile = Profile(
+            telegram_id=telegram_id,
+            first_name=data.get("first_name", ""),
+            last_name=data.get("last_name", ""),
+            username=data.get("username", ""),
+            bio=data.get("bio", ""),
+            # В ChatFullInfo нет is_premium, он приходит только с User
+            is_premium=data.get("is_premium", previous.is_premium if previous is not None else False),
+            photos=tuple(as_dict(size)["file_id"] for sizes in photo_sizes for size in sizes),
+            fetched_at=fetched_at,
+        )
+        await self._store(profile)
+        return profile
+
+    def refresh(self, telegram_id):
+        """
+        Загрузка профиля из Telegram; параллельные вызовы получают одну и ту же задачу
+        """
+        task = self._inflight.get(telegram_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(telegram_id))
+            self._inflight[telegram_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(telegram_id, None))
+        return task
+
+    def _refresh_in_background(self, telegram_id):
+        task = self.refresh(telegram_id)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        # Ошибка фонового обновления не должна теряться с предупреждением asyncio;
+        # устаревшая запись остаётся в кэше до следующей попытки
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def aget(self, telegram_id):
+        """
+        Профиль пользователя: свежий из кэша, устаревший с фоновым обновлением
+        или загруженный из Telegram
+        """
+        profile = self._local_get(telegram_id) or await self._shared_get(telegram_id) or await self._db_get(telegram_id)
+        if profile is not None:
+            age = self.now() - profile.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return profile
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(telegram_id)
+                return profile
+        self.misses += 1
+        return await asyncio.shield(self.refresh(telegram_id))
+
+    async def ainvalidate(self, telegram_id):
+        """
+        Удаление профиля из обоих уровней кэша
+        """
+        with self._lock:
+            self._local.pop(telegram_id, None)
+        await self.cache.adelete(self._key(telegram_id))
+
+    def stats(self):
+        """
+        Счётчики попаданий, устаревших ответов, промахов и загрузок
+        """
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._local),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "hit_ratio": (self.hits + self.stale_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,257 @@
+"""Напоминания о бронированиях на иерархическом колесе таймеров"""
+
+import asyncio
+import datetime
+import logging
+import math
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, OutboundMessage
+from .outbound import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+def reminder_times(start, leads=None):
+    """
+    Моменты напоминаний о бронировании, начинающемся в start, по возрастанию
+    """
+    leads = settings.BOOKING_REMINDER_LEADS if leads is None else leads
+    return sorted(start - datetime.timedelta(minutes=lead) for lead in leads)
+
+
+def next_reminder_time(start, after=None, leads=None):
+    """
+    Ближайшее напоминание позже after (по умолчанию — сейчас); None, если их не осталось
+    """
+    after = timezone.now() if after is None else after
+    return next((time for time in reminder_times(start, leads) if time > after), None)
+
+
+def reminder_text(booking):
+    """
+    Текст напоминания
+    """
+    start = timezone.localtime(booking.start)
+    return f"Напоминание: {booking.location.name}, {start:%d.%m.%Y} в {start:%H:%M}"
+
+
+class TimingWheel:  # pylint: disable=R0902
+    """
+    Иерархическое колесо таймеров.
+
+    Уровень 0 — slots[0] ячеек по tick секунд, каждый следующий уровень —
+    slots[i] ячеек размером с весь предыдущий уровень. Добавление и удаление
+    O(1), advance() стоит O(пройденных тиков + сработавших таймеров):
+    таймер опускается на нижний уровень, только когда до него доходит очередь.
+    """
+
+    def __init__(self, tick=1.0, slots=(60, 60, 24), start=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.spans = [math.prod(slots[:level]) for level in range(len(slots))]
+        self.span = math.prod(slots) * tick
+        self._now = math.floor(start / tick)
+        self._wheels = [[{} for _ in range(size)] for size in slots]
+        self._where = {}
+        self._expired = {}
+
+    def __len__(self):
+        return len(self._where) + len(self._expired)
+
+    def __contains__(self, key):
+        return key in self._where or key in self._expired
+
+    def add(self, key, when, item=None):
+        """
+        Таймер key на момент when (секунды); False, если when дальше span от текущего тика.
+        Повторное добавление key переносит таймер.
+        """
+        self.remove(key)
+        return self._place(key, math.ceil(when / self.tick), item)
+
+    def _place(self, key, due, item):
+        delta = due - self._now
+        if delta <= 0:
+            self._expired[key] = item
+            return True
+        for level, size in enumerate(self.slots):
+            if delta < self.spans[level] * size:
+                slot = (due // self.spans[level]) % size
+                self._wheels[level][slot][key] = (due, item)
+                self._where[key] = (level, slot)
+                return True
+        return False
+
+    def remove(self, key):
+        """
+        Снятие таймера key
+        """
+        self._expired.pop(key, None)
+        where = self._where.pop(key, None)
+        if where is not None:
+            level, slot = where
+            del self._wheels[level][slot][key]
+
+    def advance(self, now):
+        """
+        Переход к моменту now; возвращает [(key, item)] сработавших таймеров
+        """
+        fired = list(self._expired.items())
+        self._expired.clear()
+        target = math.floor(now / self.tick)
+        while self._now < target:
+            self._now += 1
+            # На границе ячейки верхнего уровня её таймеры опускаются ниже
+            for level in range(len(self.slots) - 1, 0, -1):
+                if self._now % self.spans[level] == 0:
+                    cell = self._wheels[level][(self._now // self.spans[level]) % self.slots[level]]
+                    for key, (due, item) in list(cell.items()):
+                        del self._where[key]
+                        self._place(key, due, item)
+                    cell.clear()
+            cell = self._wheels[0][self._now % self.slots[0]]
+            for key, (_, item) in cell.items():
+                del self._where[key]
+                fired.append((key, item))
+            cell.clear()
+            fired.extend(self._expired.items())
+            self._expired.clear()
+        return fired
+
+
+class ReminderScheduler:  # pylint: disable=R0902
+    """
+    Напоминания о подтверждённых бронированиях.
+
+    Из базы по индексу booking_reminder_idx загружаются только напоминания
+    ближайших horizon секунд, они ставятся в TimingWheel. Сигналы Booking
+    переставляют таймеры без обращения к базе; изменения из других процессов
+    подхватываются загрузкой раз в reload секунд. Booking.next_reminder_at
+    сдвигается при отправке, поэтому после перезапуска отправляются только
+    оставшиеся напоминания. Напоминание ставится в очередь outbound с
+    приоритетом PRIORITY_REMINDER.
+    """
+
+    def __init__(self, horizon=None, reload=None, tick=1.0, now=timezone.now):
+        self.horizon = datetime.timedelta(seconds=horizon if horizon is not None else settings.BOOKING_REMINDER_HORIZON)
+        self.reload = datetime.timedelta(seconds=reload if reload is not None else settings.BOOKING_REMINDER_RELOAD)
+        self.tick = tick
+        self.now = now
+        self.sent = 0
+        self.skipped = 0
+        self.wheel = None
+        self._loaded_until = None
+        self._next_load = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.wheel) if self.wheel is not None else 0
+
+    def load(self):
+        """
+        Загрузка напоминаний до now + horizon, включая просроченные (после перезапуска)
+        """
+        now = self.now()
+        until = now + self.horizon
+        due = (
+            Booking.objects.filter(status=Booking.STATUS_CONFIRMED, next_reminder_at__lte=until, start__gt=now)
+            .order_by()
+            .values_list("pk", "next_reminder_at")
+        )
+        with self._lock:
+            if self.wheel is None:
+                self.wheel = TimingWheel(self.tick, start=now.timestamp())
+            for booking_id, when in due:
+                self.wheel.add(booking_id, when.timestamp(), when)
+            self._loaded_until = until
+            self._next_load = now + self.reload
+
+    def clear(self):
+        """
+        Сброс колеса: следующий тик загрузит напоминания из базы заново
+        """
+        with self._lock:
+            self.wheel = None
+            self._loaded_until = None
+            self._next_load = None
+
+    def booking_changed(self, booking_id, status, next_reminder_at):
+        """
+        Перестановка таймера после сохранения бронирования в этом процессе
+        """
+        with self._lock:
+            if self.wheel is None:
+                return
+            if status != Booking.STATUS_CONFIRMED or next_reminder_at is None or next_reminder_at > self._loaded_until:
+                self.wheel.remove(booking_id)
+            else:
+                self.wheel.add(booking_id, next_reminder_at.timestamp(), next_reminder_at)
+
+    def booking_deleted(self, booking_id):
+        """
+        Снятие таймера удалённого бронирования
+        """
+        with self._lock:
+            if self.wheel is not None:
+                self.wheel.remove(booking_id)
+
+    def tick_once(self):
+        """
+        Отправка сработавших напоминаний; возвращает их количество
+        """
+        now = self.now()
+        if self.wheel is None or now >= self._next_load:
+            self.load()
+        with self._lock:
+            fired = self.wheel.advance(now.timestamp())
+        for booking_id, when in fired:
+            self.fire(booking_id, when, now)
+        return len(fired)
+
+    def fire(self, booking_id, when, now=None):
+        """
+        Отправка напоминания, если бронирование всё ещё ждёт именно его
+        """
+        now = self.now() if now is None else now
+        with transaction.atomic():
+            booking = Booking.objects.select_related("location", "user").filter(pk=booking_id).first()
+            next_time = next_reminder_time(booking.start, max(when, now)) if booking is not None else None
+            # Условное обновление: отменённое, перенесённое или уже отправленное напоминание пропускается
+            updated = Booking.objects.filter(pk=booking_id, status=Booking.STATUS_CONFIRMED, next_reminder_at=when).update(
+                next_reminder_at=next_time
+            )
+            if not updated or booking.start <= now:
+                self.skipped += 1
+                return False
+            if booking.user is not None and booking.user.telegram_id is not None:
+                enqueue(booking.user.telegram_id, priority=OutboundMessage.PRIORITY_REMINDER, text=reminder_text(booking))
+            self.sent += 1
+        if next_time is not None:
+            self.booking_changed(booking_id, Booking.STATUS_CONFIRMED, next_time)
+        return True
+
+    async def run(self):
+        """
+        Цикл напоминаний: тик раз в tick секунд
+        """
+        while True:
+            try:
+                await sync_to_async(self.tick_once)()
+            except Exception:  # pylint: disable=W0718
+                logger.exception("Reminder tick failed")
+            await asyncio.sleep(self.tick)
+
+    def stats(self):
+        """
+        Размер колеса и счётчики
+        """
+        return {"scheduled": len(self), "sent": self.sent, "skipped": self.skipped, "loaded_until": self._loaded_until}
+
+
+reminders = ReminderScheduler()
@@ -0,0 +1,112 @@
+"""Асинхронный слой доступа к данным для обработчиков aiogram"""
+
+import datetime
+
+from django.db.models import Prefetch, aprefetch_related_objects
+
+from .models import ServiceLocation, TelegramUser, WorkDay
+from .schedule_cache import schedule_cache
+from .snapshots import alocation_snapshots
+
+
+class Repository:
+    """
+    Базовый асинхронный репозиторий поверх нативного async ORM Django
+    """
+
+    model = None
+
+    def get_queryset(self):
+        """
+        Базовый queryset репозитория
+        """
+        return self.model.objects.all()
+
+    async def aget(self, **lookups):
+        """
+        Один объект; DoesNotExist, если не найден
+        """
+        return await self.get_queryset().aget(**lookups)
+
+    async def afirst(self, **lookups):
+        """
+        Первый объект или None
+        """
+        return await self.get_queryset().filter(**lookups).afirst()
+
+    async def afilter(self, *args, **lookups):
+        """
+        Список объектов по условиям
+        """
+        return [obj async for obj in self.get_queryset().filter(*args, **lookups)]
+
+    async def ain_bulk(self, pks):
+        """
+        Словарь {pk: объект} одним запросом
+        """
+        return await self.get_queryset().ain_bulk(pks)
+
+
+class LocationRepository(Repository):
+    """
+    Места оказания услуг и их расписания
+    """
+
+    model = ServiceLocation
+
+    async def aprefetch_schedules(self, instances):
+        """
+        Загрузка available_days для списка мест одним запросом
+        """
+        await aprefetch_related_objects(instances, Prefetch("available_days", queryset=WorkDay.objects.order_by("day", "start_time")))
+        return instances
+
+    async def afilter_with_schedules(self, *args, **lookups):
+        """
+        Места вместе с расписаниями: два запроса вне зависимости от числа мест
+        """
+        return await self.aprefetch_schedules(await self.afilter(*args, **lookups))
+
+    async def asnapshots(self, *args, **lookups):
+        """
+        Неизменяемые снимки мест с расписаниями (snapshots.LocationSnapshot) одним запросом
+        """
+        return await alocation_snapshots(self.get_queryset().filter(*args, **lookups))
+
+    async def ais_available(self, location, date: datetime.date, time: datetime.time):
+        """
+        Асинхронный вариант ServiceLocation.is_available
+        """
+        compiled = await schedule_cache.aget(getattr(location, "pk", location))
+        return compiled.is_available(date.weekday(), time)
+
+    async def aavailable_locations(self, location_ids, date: datetime.date, time: datetime.time):
+        """
+        id мест, доступных на дату и время; промахи кэша загружаются одним запросом
+        """
+        schedules = await schedule_cache.aget_many(location_ids)
+        return [location_id for location_id in location_ids if schedules[location_id].is_available(date.weekday(), time)]
+
+    async def aworking_hours(self, location):
+        """
+        Асинхронный вариант ServiceLocation.get_working_hours
+        """
+        return (await schedule_cache.aget(getattr(location, "pk", location))).working_hours
+
+
+class TelegramUserRepository(Repository):
+    """
+    Пользователи Telegram
+    """
+
+    model = TelegramUser
+
+    async def aget_by_username(self, username):
+        """
+        Пользователь по username или None
+        """
+        return await self.afirst(username=username)
+
+
+locations = LocationRepository()
+telegram_users = TelegramUserRepository()
@@ -0,0 +1,195 @@
+"""Маршрутизация чтения на реплики с чтением собственных записей"""
+
+import contextlib
+import contextvars
+import itertools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Кто выполняет текущий обработчик (например, Telegram id) и была ли в нём запись;
+# None в _wrote — код вне acting_as (фоновые задачи, буферы, импорт)
+_actor = contextvars.ContextVar("replica_actor", default=None)
+_wrote = contextvars.ContextVar("replica_wrote", default=None)
+
+# Закрепление в pins для кода вне acting_as: после записи в нём все его чтения
+# в процессе идут на основную базу DATABASE_REPLICA_PIN_SECONDS секунд
+UNTRACKED = object()
+
+
+class PinRegistry:
+    """
+    Сроки, до которых чтения пользователя идут на основную базу.
+
+    Хранится в памяти процесса. Все обновления чата попадают в один процесс
+    только при распределении по шардам (run_shards); при нескольких процессах
+    вебхука или опроса следующее обновление может обработать другой процесс,
+    и его чтения в пределах задержки реплики увидят старые данные.
+    Запросы Django закрепляются cookie (ReadYourWritesMiddleware) в любом процессе.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def __len__(self):
+        return len(self._until)
+
+    def pin(self, actor, seconds):
+        """
+        Чтения actor идут на основную базу seconds секунд
+        """
+        now = self.clock()
+        with self._lock:
+            self._until[actor] = max(self._until.get(actor, 0.0), now + seconds)
+            if len(self._until) > 1024:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+
+    def is_pinned(self, actor):
+        """
+        Закреплён ли actor за основной базой
+        """
+        if actor is None:
+            return False
+        until = self._until.get(actor)
+        return until is not None and until > self.clock()
+
+    def clear(self):
+        """
+        Снятие всех закреплений
+        """
+        with self._lock:
+            self._until.clear()
+
+
+pins = PinRegistry()
+
+
+@contextlib.contextmanager
+def acting_as(actor, pinned=False):
+    """
+    Обработка запроса пользователя actor: после собственной записи (или сразу
+    при pinned) его чтения идут на основную базу
+    """
+    actor_token = _actor.set(actor)
+    wrote_token = _wrote.set(pinned)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _actor.reset(actor_token)
+
+
+def wrote():
+    """
+    Была ли запись в текущем контексте acting_as
+    """
+    return bool(_wrote.get())
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись — в основную базу, чтение моделей DATABASE_REPLICA_APPS — на реплики
+    DATABASE_REPLICAS по кругу.
+
+    Чтение идёт на основную базу, если в текущем контексте уже была запись,
+    открыта транзакция на основной базе или пользователь acting_as (для кода
+    вне acting_as — любой код процесса вне acting_as) записывал данные менее
+    DATABASE_REPLICA_PIN_SECONDS секунд назад.
+    """
+
+    def __init__(self):
+        self._next = itertools.count()
+
+    def _replicated(self, model):
+        return model._meta.app_label in settings.DATABASE_REPLICA_APPS
+
+    def db_for_read(self, model, **hints):  # pylint: disable=W0613
+        """
+        База для чтения
+        """
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not self._replicated(model):
+            return None
+        wrote_here = _wrote.get()
+        actor = UNTRACKED if wrote_here is None else _actor.get()
+        if wrote_here or connections[DEFAULT_DB_ALIAS].in_atomic_block or pins.is_pinned(actor):
+            return DEFAULT_DB_ALIAS
+        return replicas[next(self._next) % len(replicas)]
+
+    def db_for_write(self, model, **hints):  # pylint: disable=W0613
+        """
+        База для записи; запись закрепляет пользователя за основной базой
+        """
+        if self._replicated(model):
+            if _wrote.get() is None:
+                pins.pin(UNTRACKED, settings.DATABASE_REPLICA_PIN_SECONDS)
+            else:
+                _wrote.set(True)
+                actor = _actor.get()
+                if actor is not None:
+                    pins.pin(actor, settings.DATABASE_REPLICA_PIN_SECONDS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=W0613
+        """
+        Связи между реплицируемыми моделями разрешены: на основной базе и
+        репликах данные одни и те же
+        """
+        if self._replicated(type(obj1)) and self._replicated(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):  # pylint: disable=W0613
+        """
+        Схему получает только default: реплики получают её через репликацию,
+        а production в рабочем окружении и есть default
+        """
+        if db != DEFAULT_DB_ALIAS:
+            return False
+        return None
+
+
+class ReadYourWritesMiddleware:  # pylint: disable=R0903
+    """
+    Запросы Django с записью выставляют cookie на DATABASE_REPLICA_PIN_SECONDS;
+    пока она есть, чтения клиента идут на основную базу в любом процессе.
+    Работает и в синхронной, и в асинхронной цепочке, чтобы под ASGI не
+    переключать каждый запрос в поток
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = "replica_pin"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        with acting_as(None, pinned=self.cookie_name in request.COOKIES):
+            response = self.get_response(request)
+            self._pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        with acting_as(None, pinned=self.cookie_name in request.COOKIES):
+            response = await self.get_response(request)
+            self._pin(request, response)
+        return response
+
+    def _pin(self, request, response):
+        if wrote() and self.cookie_name not in request.COOKIES:
+            response.set_cookie(self.cookie_name, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
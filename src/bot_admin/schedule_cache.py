@@ -0,0 +1,186 @@
+"""Кэш скомпилированных недельных расписаний мест оказания услуг"""
+
+import bisect
+import datetime
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+
+from .lru import LRUCache
+
+DAY_NAMES = (
+    "Понедельник",
+    "Вторник",
+    "Среда",
+    "Четверг",
+    "Пятница",
+    "Суббота",
+    "Воскресенье",
+)
+
+
+def format_interval(start_time, end_time):
+    """
+    Форматирование интервала работы как в WorkDay.__str__
+    """
+    start = start_time.strftime("%H:%M") if start_time else "—"
+    end = end_time.strftime("%H:%M") if end_time else "—"
+    return f"{start}-{end}"
+
+
+def format_working_hours(entries):
+    """
+    Строка графика работы из записей (день недели, начало, окончание)
+    """
+    ordered = sorted(entries, key=lambda entry: (entry[0], entry[1] or datetime.time.min))
+    return ", ".join(f"{DAY_NAMES[day]} {format_interval(start_time, end_time)}" for day, start_time, end_time in ordered)
+
+
+def weekly_schedule_rows(location_ids):
+    """
+    Запрос строк (место, день недели, начало, окончание) к промежуточной таблице available_days
+    """
+    through = apps.get_model("bot_admin", "ServiceLocation").available_days.through
+    return (
+        through.objects.filter(servicelocation_id__in=location_ids)
+        .order_by("servicelocation_id", "workday__day", "workday__start_time")
+        .values_list("servicelocation_id", "workday__day", "workday__start_time", "workday__end_time")
+    )
+
+
+def group_weekly_schedules(rows):
+    """
+    Группировка строк в {location_id: {weekday: [(start_time, end_time), ...]}}.
+    Места без расписания в словарь не попадают.
+    """
+    schedules = defaultdict(lambda: defaultdict(list))
+    for location_id, day, start_time, end_time in rows:
+        schedules[location_id][day].append((start_time, end_time))
+    return schedules
+
+
+def load_weekly_schedules(location_ids):
+    """
+    Загрузка расписаний одним запросом
+    """
+    return group_weekly_schedules(weekly_schedule_rows(location_ids))
+
+
+async def aload_weekly_schedules(location_ids):
+    """
+    Асинхронная загрузка расписаний одним запросом
+    """
+    return group_weekly_schedules([row async for row in weekly_schedule_rows(location_ids)])
+
+
+class CompiledSchedule:
+    """
+    Недельное расписание в виде отсортированных непересекающихся интервалов по дням недели.
+
+    Пустое расписание означает, что место доступно всегда.
+    """
+
+    __slots__ = ("starts", "ends", "working_hours", "always_available")
+
+    def __init__(self, schedule):
+        self.always_available = not schedule
+        self.starts = []
+        self.ends = []
+        for weekday in range(7):
+            intervals = sorted(
+                (start_time or datetime.time.min, end_time or datetime.time.max) for start_time, end_time in schedule.get(weekday, ())
+            )
+            merged = []
+            for start_time, end_time in intervals:
+                if merged and start_time <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end_time))
+                else:
+                    merged.append((start_time, end_time))
+            self.starts.append(tuple(start_time for start_time, _ in merged))
+            self.ends.append(tuple(end_time for _, end_time in merged))
+        self.working_hours = format_working_hours(
+            (weekday, start_time, end_time) for weekday, intervals in schedule.items() for start_time, end_time in intervals
+        )
+
+    def open_minutes(self, weekday):
+        """
+        Продолжительность работы в день недели в минутах
+        """
+        if self.always_available:
+            return 24 * 60
+        total = 0
+        for start_time, end_time in zip(self.starts[weekday], self.ends[weekday]):
+            # time.max означает конец суток
+            end = 24 * 60 if end_time == datetime.time.max else end_time.hour * 60 + end_time.minute
+            total += end - (start_time.hour * 60 + start_time.minute)
+        return total
+
+    def is_available(self, weekday, time):
+        """
+        Попадает ли время в один из интервалов дня недели
+        """
+        if self.always_available:
+            return True
+        index = bisect.bisect_right(self.starts[weekday], time) - 1
+        return index >= 0 and time <= self.ends[weekday][index]
+
+
+class ScheduleCache(LRUCache):
+    """
+    Процессный кэш CompiledSchedule по id места с необязательным LRU-ограничением.
+
+    Записи удаляются сигналами при изменении WorkDay и связей available_days,
+    изменения из других процессов видны через SCHEDULE_CACHE_TTL секунд.
+    """
+
+    def get(self, location_id):
+        """
+        Скомпилированное расписание места
+        """
+        return self.get_many([location_id])[location_id]
+
+    def _split(self, location_ids):
+        result = {}
+        missing = []
+        for location_id in location_ids:
+            compiled = self._lookup(location_id)
+            if compiled is None:
+                missing.append(location_id)
+            else:
+                result[location_id] = compiled
+        return result, missing
+
+    def _fill(self, result, missing, schedules):
+        for location_id in missing:
+            compiled = CompiledSchedule(schedules.get(location_id, {}))
+            self._store(location_id, compiled)
+            result[location_id] = compiled
+        return result
+
+    def get_many(self, location_ids):
+        """
+        Скомпилированные расписания набора мест; промахи загружаются одним запросом
+        """
+        result, missing = self._split(location_ids)
+        if missing:
+            self._fill(result, missing, load_weekly_schedules(missing))
+        return result
+
+    async def aget(self, location_id):
+        """
+        Асинхронный вариант get
+        """
+        return (await self.aget_many([location_id]))[location_id]
+
+    async def aget_many(self, location_ids):
+        """
+        Асинхронный вариант get_many: попадания обслуживаются без обращения к базе и потокам
+        """
+        result, missing = self._split(location_ids)
+        if missing:
+            self._fill(result, missing, await aload_weekly_schedules(missing))
+        return result
+
+
+schedule_cache = ScheduleCache(maxsize=getattr(settings, "SCHEDULE_CACHE_MAXSIZE", None), ttl=getattr(settings, "SCHEDULE_CACHE_TTL", None))
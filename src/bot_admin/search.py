@@ -0,0 +1,209 @@
+"""Полнотекстовый и нечёткий поиск мест оказания услуг"""
+
+import re
+
+from django.db import OperationalError, connections, router
+from django.db.models import Q
+
+from .models import ServiceLocation
+
+# Веса полей при ранжировании: название важнее города, город важнее адреса
+FIELD_WEIGHTS = (("name", 1.0), ("city", 0.8), ("rest_of_address", 0.6))
+SIMILARITY_THRESHOLD = 0.5
+CANDIDATES_PER_RESULT = 5
+
+# Выражение документа; индекс location_search_idx построен по нему же
+PG_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(rest_of_address, '')), 'C')"
+)
+SQLITE_FTS_TABLE = "bot_admin_servicelocation_fts"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def words(text):
+    """
+    Слова текста в нижнем регистре
+    """
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(text, partial=False):
+    """
+    Множество триграмм как в pg_trgm: каждое слово дополняется двумя пробелами
+    слева и одним справа. При partial последнее слово считается недописанным.
+    """
+    result = set()
+    text_words = words(text)
+    for position, word in enumerate(text_words):
+        padded = f"  {word}" if partial and position == len(text_words) - 1 else f"  {word} "
+        result.update(padded[i:][:3] for i in range(len(padded) - 2))
+    return result
+
+
+def word_similarity(query, text, partial=False):
+    """
+    Доля триграмм запроса, найденных в тексте
+    """
+    query_trigrams = trigrams(query, partial)
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams(text)) / len(query_trigrams)
+
+
+def score(query, values, partial=False):
+    """
+    (лучшее сходство, взвешенный ранг) места по значениям полей FIELD_WEIGHTS
+    """
+    similarities = [(word_similarity(query, value or "", partial), weight) for (_, weight), value in zip(FIELD_WEIGHTS, values)]
+    return max(similarity for similarity, _ in similarities), max(similarity * weight for similarity, weight in similarities)
+
+
+class SearchBackend:
+    """
+    Поиск через icontains; используется для баз без полнотекстового индекса
+    """
+
+    def __init__(self, using):
+        self.using = using
+
+    def candidates(self, query, limit, prefix=False):  # pylint: disable=W0613
+        """
+        [(id, name, city, rest_of_address)] — кандидаты для ранжирования
+        """
+        condition = Q()
+        # LIKE в SQLite не учитывает регистр только для ASCII
+        for word in _WORD_RE.findall(query):
+            for variant in dict.fromkeys((word, word.lower(), word.capitalize())):
+                for field, _ in FIELD_WEIGHTS:
+                    condition |= Q(**{f"{field}__icontains": variant})
+        if not condition:
+            return []
+        rows = (
+            ServiceLocation.objects.using(self.using)
+            .filter(condition)
+            .order_by("pk")
+            .values_list("pk", *(field for field, _ in FIELD_WEIGHTS))
+        )
+        return list(rows if limit is None else rows[: limit * CANDIDATES_PER_RESULT])
+
+    def search(self, query, limit=10, prefix=False):
+        """
+        [(id, ранг)] по убыванию ранга
+        """
+        ranked = []
+        for pk, *values in self.candidates(query, limit, prefix):
+            similarity, rank = score(query, values, partial=prefix)
+            if similarity >= SIMILARITY_THRESHOLD:
+                ranked.append((pk, rank))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 с токенизатором trigram: отбор кандидатов по совпадающим
+    триграммам с ранжированием bm25, затем уточнение ранга в Python
+    """
+
+    def candidates(self, query, limit, prefix=False):
+        grams = sorted({word[i:][:3] for word in words(query) for i in range(len(word) - 2)})
+        if not grams:
+            return super().candidates(query, limit, prefix)
+        match = " OR ".join(f'"{gram}"' for gram in grams)
+        sql = (
+            f"SELECT rowid, name, city, rest_of_address FROM {SQLITE_FTS_TABLE} "  # nosec B608
+            f"WHERE {SQLITE_FTS_TABLE} MATCH %s ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 5.0, 1.0)"
+        )
+        params = [match]
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit * CANDIDATES_PER_RESULT)
+        try:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        except OperationalError:
+            # SQLite без FTS5: миграция не создала индекс
+            return super().candidates(query, limit, prefix)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    PostgreSQL: tsvector с русской морфологией (GIN) и триграммы pg_trgm (GIN)
+    """
+
+    def search(self, query, limit=10, prefix=False):
+        tokens = words(query)
+        if not tokens:
+            return []
+        if prefix:
+            tsquery = "to_tsquery('russian', %s)"
+            text = " & ".join(f"{token}:*" for token in tokens)
+        else:
+            tsquery = "websearch_to_tsquery('russian', %s)"
+            text = query
+        similarity = ", ".join(f"{weight} * word_similarity(%s, {field})" for field, weight in FIELD_WEIGHTS)
+        matches = " OR ".join(f"%s <%% {field}" for field, _ in FIELD_WEIGHTS)
+        sql = (
+            f"SELECT id, ts_rank({PG_SEARCH_DOCUMENT}, q) + greatest({similarity}) AS rank "  # nosec B608
+            f"FROM bot_admin_servicelocation, {tsquery} q "
+            f"WHERE ({PG_SEARCH_DOCUMENT}) @@ q OR {matches} "
+            "ORDER BY rank DESC, id"
+        )
+        params = [*([query] * len(FIELD_WEIGHTS)), text, *([query] * len(FIELD_WEIGHTS))]
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using=None):
+    """
+    Поисковый бэкенд для базы чтения ServiceLocation
+    """
+    using = using or router.db_for_read(ServiceLocation)
+    return BACKENDS.get(connections[using].vendor, SearchBackend)(using)
+
+
+def search_location_ids(query, limit=10, using=None):
+    """
+    id мест по убыванию релевантности; limit=None — все совпадения
+    """
+    return [pk for pk, _ in get_search_backend(using).search(query, limit)]
+
+
+def search_locations(query, limit=10, using=None):
+    """
+    Места по убыванию релевантности с атрибутом search_rank
+    """
+    ranked = get_search_backend(using).search(query, limit)
+    locations = ServiceLocation.objects.using(using).in_bulk([pk for pk, _ in ranked])
+    result = []
+    for pk, rank in ranked:
+        location = locations[pk]
+        location.search_rank = rank
+        result.append(location)
+    return result
+
+
+def autocomplete(prefix, limit=10, using=None):
+    """
+    Подсказки для бота по началу ввода: [(id, "Название - Город")]
+    """
+    ranked = get_search_backend(using).search(prefix, limit, prefix=True)
+    labels = dict(
+        (pk, f"{name} - {city}")
+        for pk, name, city in ServiceLocation.objects.using(using).filter(pk__in=[pk for pk, _ in ranked]).values_list("pk", "name", "city")
+    )
+    return [(pk, labels[pk]) for pk, _ in ranked if pk in labels]
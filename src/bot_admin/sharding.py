@@ -0,0 +1,166 @@
+"""Распределение обновлений Telegram по процессам и узлам по id чата"""
+
+import asyncio
+import json
+import queue
+import time
+import zlib
+from multiprocessing.managers import BaseManager
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .updates import UpdateWorkerPool, update_chat_id
+
+# Очереди шардов в процессе брокера
+_queues = {}
+
+
+def shard_for(update, shards):
+    """
+    Номер шарда обновления: одинаковый для всех обновлений чата на любом узле
+    """
+    chat_id = update_chat_id(update)
+    key = chat_id if chat_id is not None else update.get("update_id", 0)
+    return zlib.crc32(str(key).encode()) % shards
+
+
+def parse_address(address):
+    """
+    "host:port" в (host, port)
+    """
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _shard_queue(shard):
+    return _queues.setdefault(shard, queue.Queue())
+
+
+class BrokerManager(BaseManager):
+    """Менеджер multiprocessing, раздающий очереди шардов по TCP"""
+
+
+BrokerManager.register("shard_queue", callable=_shard_queue)
+
+
+def serve_broker(address, authkey):
+    """
+    Запуск брокера в текущем процессе (блокирует); заменяет Redis или RabbitMQ
+    на одной машине и в тестовых стендах из нескольких узлов
+    """
+    manager = BrokerManager(address=parse_address(address), authkey=authkey)
+    manager.get_server().serve_forever()
+
+
+class ShardBroker:
+    """
+    Клиент брокера: FIFO-очередь на каждый шард. Один потребитель на шард
+    сохраняет порядок обновлений каждого чата.
+    """
+
+    def __init__(self, address, authkey, connect_timeout=10.0):
+        self.manager = BrokerManager(address=parse_address(address), authkey=authkey)
+        self.connect_timeout = connect_timeout
+        self._connected = False
+        self._queues = {}
+
+    def _connect(self):
+        # Брокер может запускаться одновременно с потребителями
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                self.manager.connect()
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+        self._connected = True
+
+    def _queue(self, shard):
+        proxy = self._queues.get(shard)
+        if proxy is None:
+            if not self._connected:
+                self._connect()
+            proxy = self._queues[shard] = self.manager.shard_queue(shard)  # pylint: disable=E1101
+        return proxy
+
+    def put(self, shard, update):
+        """
+        Публикация обновления (None — сигнал остановки потребителя)
+        """
+        self._queue(shard).put(None if update is None else json.dumps(update, separators=(",", ":")))
+
+    def get(self, shard, timeout=None):
+        """
+        Следующее обновление шарда; queue.Empty по истечении timeout
+        """
+        payload = self._queue(shard).get(timeout=timeout)
+        return None if payload is None else json.loads(payload)
+
+
+class ShardPublisher:  # pylint: disable=R0903
+    """
+    handler для UpdateWorkerPool вебхука: вместо обработки отправляет
+    обновление в очередь шарда. Порядок внутри чата сохраняет UpdateQueue
+    вебхука, который не передаёт следующее обновление чата до публикации
+    предыдущего.
+    """
+
+    def __init__(self, broker, shards):
+        self.broker = broker
+        self.shards = shards
+
+    async def __call__(self, update):
+        await asyncio.to_thread(self.broker.put, shard_for(update, self.shards), update)
+
+
+def check_fsm_storage(shards):
+    """
+    ImproperlyConfigured, если несколько шардов используют процессный кэш для FSM
+    """
+    if shards > 1 and isinstance(caches[settings.FSM_CACHE_ALIAS], LocMemCache):
+        raise ImproperlyConfigured("FSM_CACHE_URL must point to a shared cache (db, file, redis) when TELEGRAM_SHARDS > 1")
+
+
+def check_shard_authkey(shards):
+    """
+    ImproperlyConfigured, если несколько шардов запускаются без общего TELEGRAM_SHARD_AUTHKEY
+    """
+    if shards > 1 and not settings.TELEGRAM_SHARD_AUTHKEY:
+        raise ImproperlyConfigured("TELEGRAM_SHARD_AUTHKEY must be set to the same value for all processes when TELEGRAM_SHARDS > 1")
+
+
+async def consume_shard(broker, shard, handler, workers=32, maxsize=1000):
+    """
+    Потребитель шарда: обновления из брокера обрабатываются UpdateWorkerPool
+    (параллельно по чатам, последовательно внутри чата) до сигнала остановки
+    """
+    # Модели доступны только после django.setup() в run_shard
+    from .ingest import profile_buffer  # pylint: disable=C0415
+
+    pool = UpdateWorkerPool(handler, workers=workers, maxsize=maxsize, background=(profile_buffer.run,))
+    pool.start()
+    try:
+        while True:
+            update = await asyncio.to_thread(broker.get, shard)
+            if update is None:
+                break
+            await pool.queue.put(update)
+    finally:
+        await pool.stop()
+    return pool.stats()
+
+
+def run_shard(shard, address, authkey, handler_path, workers):
+    """
+    Точка входа процесса шарда
+    """
+    django.setup()
+    broker = ShardBroker(address, authkey)
+    return asyncio.run(consume_shard(broker, shard, import_string(handler_path), workers=workers))
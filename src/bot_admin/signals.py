@@ -0,0 +1,141 @@
+"""Bot Admin Signals"""
+
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cards import location_cards
+from .geo import geo_index
+from .models import Booking, ServiceLocation, WorkDay
+from .occupancy import apply_booking
+from .reminders import next_reminder_time, reminders
+from .schedule_cache import schedule_cache
+from .slot_index import slot_index
+
+
+def evict_cards(*location_ids):
+    """
+    Удаление карточек мест из кэша сразу и после фиксации транзакции
+    """
+    location_cards.invalidate(*location_ids)
+    transaction.on_commit(lambda: location_cards.invalidate(*location_ids))
+
+
+def evict_schedules(*location_ids):
+    """
+    Удаление расписаний из кэша сразу и повторно после фиксации транзакции,
+    чтобы параллельные чтения не закэшировали незафиксированное состояние
+    """
+    if not location_ids:
+        return
+    schedule_cache.invalidate(*location_ids)
+    evict_cards(*location_ids)
+    transaction.on_commit(lambda: schedule_cache.invalidate(*location_ids))
+    transaction.on_commit(lambda: slot_index.schedules_changed(*location_ids))
+
+
+def schedules_changed(*location_ids):
+    """
+    Изменение расписаний мест: расписание входит в карточку места, поэтому
+    её версия (updated_at) меняется одним запросом в той же транзакции
+    """
+    if not location_ids:
+        return
+    ServiceLocation.objects.filter(pk__in=location_ids).update(updated_at=timezone.now())
+    evict_schedules(*location_ids)
+
+
+@receiver(post_save, sender=WorkDay)
+def workday_saved(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Изменение рабочего времени затрагивает все связанные места"
+    schedules_changed(*instance.service_locations.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=WorkDay)
+def workday_deleting(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Связи удаляются вместе с WorkDay, поэтому места запоминаются заранее"
+    instance.schedule_location_ids = list(instance.service_locations.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=WorkDay)
+def workday_deleted(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Удаление рабочего времени"
+    schedules_changed(*getattr(instance, "schedule_location_ids", ()))
+
+
+@receiver(post_save, sender=ServiceLocation)
+def location_saved(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Новое место, изменение вместимости или координат"
+    evict_cards(instance.pk)
+    location_id, capacity = instance.pk, instance.capacity
+    latitude, longitude = instance.latitude, instance.longitude
+    transaction.on_commit(lambda: slot_index.location_changed(location_id, capacity))
+    transaction.on_commit(lambda: geo_index.update(location_id, latitude, longitude))
+
+
+@receiver(post_delete, sender=ServiceLocation)
+def location_deleted(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Удаление места"
+    evict_schedules(instance.pk)
+    evict_cards(instance.pk)
+    location_id = instance.pk
+    transaction.on_commit(lambda: slot_index.location_deleted(location_id))
+    transaction.on_commit(lambda: geo_index.remove(location_id))
+
+
+@receiver(pre_save, sender=Booking)
+def booking_saving(sender, instance, using, update_fields=None, **kwargs):  # pylint: disable=W0613
+    "Новое, перенесённое или отменённое бронирование получает время ближайшего напоминания"
+    if update_fields is None or {"start", "status"} & set(update_fields):
+        confirmed = instance.status == Booking.STATUS_CONFIRMED
+        instance.next_reminder_at = next_reminder_time(instance.start) if confirmed else None
+    # Прежнее состояние нужно, чтобы вычесть бронирование из агрегатов занятости;
+    # читается из базы, в которую идёт запись, а не с реплики, и блокируется до конца
+    # транзакции, чтобы параллельная запись не вычла то же состояние второй раз
+    previous = None
+    if instance.pk is not None:
+        bookings = Booking.objects.using(using)
+        if connections[using].features.has_select_for_update and connections[using].in_atomic_block:
+            bookings = bookings.select_for_update()
+        previous = bookings.filter(pk=instance.pk).values_list("location_id", "start", "end", "status").first()
+    instance.occupancy_before = previous
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Создание, перенос или отмена бронирования"
+    state = (instance.pk, instance.location_id, instance.start, instance.end, instance.status)
+    reminder = (instance.pk, instance.status, instance.next_reminder_at)
+    before = getattr(instance, "occupancy_before", None)
+    after = (instance.location_id, instance.start, instance.end, instance.status)
+    if before != after:
+        if before is not None and before[3] == Booking.STATUS_CONFIRMED:
+            apply_booking(*before[:3], -1)
+        if instance.status == Booking.STATUS_CONFIRMED:
+            apply_booking(*after[:3], 1)
+    transaction.on_commit(lambda: slot_index.booking_changed(*state))
+    transaction.on_commit(lambda: reminders.booking_changed(*reminder))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):  # pylint: disable=W0613
+    "Удаление бронирования"
+    if instance.status == Booking.STATUS_CONFIRMED:
+        apply_booking(instance.location_id, instance.start, instance.end, -1)
+    booking_id = instance.pk
+    transaction.on_commit(lambda: slot_index.booking_deleted(booking_id))
+    transaction.on_commit(lambda: reminders.booking_deleted(booking_id))
+
+
+@receiver(m2m_changed, sender=ServiceLocation.available_days.through)
+def available_days_changed(sender, instance, action, reverse, pk_set, **kwargs):  # pylint: disable=W0613,R0913
+    "Изменение связей available_days с любой стороны"
+    if not reverse:
+        # add() уже связанных дней присылает пустой pk_set: расписание не изменилось
+        if action == "post_clear" or (action in ("post_add", "post_remove") and pk_set):
+            schedules_changed(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        schedules_changed(*pk_set)
+    elif action == "pre_clear":
+        schedules_changed(*instance.service_locations.values_list("pk", flat=True))
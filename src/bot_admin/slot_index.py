@@ -0,0 +1,396 @@
+"""Индекс свободных слотов мест оказания услуг на битовых масках"""
+
+import datetime
+import heapq
+import threading
+import time
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import timed
+from .models import Booking, ServiceLocation
+from .schedule_cache import schedule_cache
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _seconds(value: datetime.time):
+    if value == datetime.time.max:
+        return SECONDS_PER_DAY
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+@dataclass(frozen=True)
+class FreeSlot:
+    """Свободный интервал места"""
+
+    location_id: int
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+class SlotIndex:  # pylint: disable=R0902
+    """
+    Занятость мест по дням в виде битовых масок слотов фиксированной длины.
+
+    Бит k маски дня соответствует слоту [k * step, (k + 1) * step) по местному
+    времени. Маски рабочих часов строятся по дням недели из schedule_cache,
+    счётчики занятости хранятся только для дат с бронированиями и обновляются
+    инкрементально сигналами Booking. Сигналы других процессов сюда не
+    доходят, поэтому индекс перестраивается, если он старше reload секунд.
+    Закончившиеся (по now) бронирования удаляются из индекса при поиске.
+
+    Запросы к базе выполняются до захвата блокировки индекса: под ней
+    только подменяются уже загруженные данные.
+    """
+
+    def __init__(self, step_minutes=30, reload=None, clock=time.monotonic, now=timezone.now):
+        if (24 * 60) % step_minutes:
+            raise ValueError("step_minutes must divide a day")
+        self.step = datetime.timedelta(minutes=step_minutes)
+        self.slots_per_day = 24 * 60 // step_minutes
+        self.reload = reload if reload is not None else getattr(settings, "SLOT_INDEX_RELOAD", None)
+        self.clock = clock
+        self.now = now
+        self.built = False
+        self._built_at = None
+        # Увеличивается при каждом изменении, влияющем на свободные слоты
+        self.version = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._capacity = {}
+        self._open = {}
+        self._counts = {}
+        self._full = defaultdict(int)
+        self._bookings = {}
+        # Куча (окончание, id бронирования) для удаления закончившихся
+        self._ends = []
+        self._runs = {}
+        self._date_runs = {}
+
+    # Построение
+
+    def build(self):
+        """
+        Полная загрузка: места, расписания и будущие подтверждённые бронирования
+        """
+        capacity = dict(ServiceLocation.objects.values_list("pk", "capacity"))
+        # Расписания могли измениться в другом процессе
+        schedule_cache.invalidate(*capacity)
+        open_masks = self._open_masks(list(capacity))
+        bookings = list(
+            Booking.objects.filter(status=Booking.STATUS_CONFIRMED, end__gt=self.now())
+            .order_by()
+            .values_list("pk", "location_id", "start", "end")
+        )
+        with self._lock:
+            self._capacity = capacity
+            self._open = open_masks
+            self._counts = {}
+            self._full = defaultdict(int)
+            self._bookings = {}
+            self._ends = []
+            self._runs = {}
+            self._date_runs = {}
+            for booking_id, location_id, start, end in bookings:
+                self._add(booking_id, location_id, start, end)
+                self._ends.append((end, booking_id))
+            heapq.heapify(self._ends)
+            self.built = True
+            self._built_at = self.clock()
+            self.version += 1
+
+    def _expired(self):
+        return not self.built or (self.reload is not None and self.clock() - self._built_at >= self.reload)
+
+    def ensure_built(self):
+        """
+        Построение индекса при первом обращении и перестроение устаревшего
+        """
+        if self._expired():
+            # Отдельная блокировка: индекс строит один поток, а поиск до замены
+            # данных продолжает работать по прежним
+            with self._build_lock:
+                if self._expired():
+                    self.build()
+
+    def _open_masks(self, location_ids):
+        """
+        Маски рабочих слотов по дням недели; читает расписания из schedule_cache
+        (и из базы), поэтому вызывается без блокировки индекса
+        """
+        step = int(self.step.total_seconds())
+        masks = {}
+        for location_id, compiled in schedule_cache.get_many(location_ids).items():
+            week = []
+            for weekday in range(7):
+                mask = 0
+                if compiled.always_available:
+                    mask = (1 << self.slots_per_day) - 1
+                else:
+                    for start_time, end_time in zip(compiled.starts[weekday], compiled.ends[weekday]):
+                        first = -(-_seconds(start_time) // step)
+                        last = _seconds(end_time) // step
+                        if last > first:
+                            mask |= ((1 << (last - first)) - 1) << first
+                week.append(mask)
+            masks[location_id] = tuple(week)
+        return masks
+
+    # Инкрементальные обновления
+
+    def _day_slots(self, start, end):
+        """
+        Разбиение интервала на (дата, первый слот, последний слот + 1) по местному времени
+        """
+        tz = timezone.get_default_timezone()
+        start = start.astimezone(tz).replace(tzinfo=None)
+        end = end.astimezone(tz).replace(tzinfo=None)
+        step = self.step.total_seconds()
+        day = start.date()
+        while datetime.datetime.combine(day, datetime.time.min) < end:
+            day_start = datetime.datetime.combine(day, datetime.time.min)
+            first = int(max((start - day_start).total_seconds(), 0) // step)
+            last = -int(-min((end - day_start).total_seconds(), SECONDS_PER_DAY) // step)
+            if last > first:
+                yield day, first, last
+            day += datetime.timedelta(days=1)
+
+    def _apply(self, location_id, start, end, delta):
+        capacity = self._capacity.get(location_id, 1)
+        for day, first, last in self._day_slots(start, end):
+            key = (location_id, day)
+            self._date_runs.pop(key, None)
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = array("I", [0]) * self.slots_per_day
+            for slot in range(first, last):
+                counts[slot] = max(counts[slot] + delta, 0)
+                if counts[slot] >= capacity:
+                    self._full[key] |= 1 << slot
+                else:
+                    self._full[key] &= ~(1 << slot)
+            if not self._full[key]:
+                del self._full[key]
+                if not any(counts):
+                    del self._counts[key]
+
+    def _add(self, booking_id, location_id, start, end):
+        self._bookings[booking_id] = (location_id, start, end)
+        self._apply(location_id, start, end, 1)
+
+    def _remove(self, booking_id):
+        entry = self._bookings.pop(booking_id, None)
+        if entry is not None:
+            self._apply(*entry, -1)
+
+    def _prune(self):
+        """
+        Удаление закончившихся бронирований; записи кучи перенесённых или
+        отменённых бронирований пропускаются
+        """
+        now = self.now()
+        pruned = False
+        while self._ends and self._ends[0][0] <= now:
+            end, booking_id = heapq.heappop(self._ends)
+            entry = self._bookings.get(booking_id)
+            if entry is not None and entry[2] == end:
+                self._remove(booking_id)
+                pruned = True
+        if pruned:
+            self.version += 1
+
+    def booking_changed(self, booking_id, location_id, start, end, status):
+        """
+        Учёт созданного, изменённого или отменённого бронирования
+        """
+        if not self.built:
+            return
+        with self._lock:
+            entry = (location_id, start, end)
+            if self._bookings.get(booking_id) == entry and status == Booking.STATUS_CONFIRMED:
+                return
+            self._remove(booking_id)
+            if status == Booking.STATUS_CONFIRMED:
+                self._add(booking_id, *entry)
+                heapq.heappush(self._ends, (end, booking_id))
+            self.version += 1
+
+    def booking_deleted(self, booking_id):
+        """
+        Учёт удалённого бронирования
+        """
+        if not self.built:
+            return
+        with self._lock:
+            self._remove(booking_id)
+            self.version += 1
+
+    def location_changed(self, location_id, capacity):
+        """
+        Учёт созданного места или изменения вместимости
+        """
+        if not self.built or self._capacity.get(location_id) == capacity:
+            return
+        open_masks = self._open_masks([location_id]) if location_id not in self._open else {}
+        with self._lock:
+            if self._capacity.get(location_id) == capacity:
+                return
+            self._capacity[location_id] = capacity
+            self._open.update(open_masks)
+            entries = [(pk, entry) for pk, entry in self._bookings.items() if entry[0] == location_id]
+            for booking_id, _ in entries:
+                self._remove(booking_id)
+            for booking_id, entry in entries:
+                self._add(booking_id, *entry)
+            self.version += 1
+
+    def location_deleted(self, location_id):
+        """
+        Удаление места из индекса
+        """
+        if not self.built:
+            return
+        with self._lock:
+            self._capacity.pop(location_id, None)
+            self._open.pop(location_id, None)
+            for booking_id in [pk for pk, entry in self._bookings.items() if entry[0] == location_id]:
+                self._remove(booking_id)
+            self._drop_runs([location_id])
+            self.version += 1
+
+    def schedules_changed(self, *location_ids):
+        """
+        Пересчёт масок рабочих часов после изменения расписаний
+        """
+        if not self.built:
+            return
+        known = [location_id for location_id in location_ids if location_id in self._capacity]
+        open_masks = self._open_masks(known)
+        with self._lock:
+            self._open.update({location_id: week for location_id, week in open_masks.items() if location_id in self._capacity})
+            self._drop_runs(known)
+            self.version += 1
+
+    def _drop_runs(self, location_ids):
+        location_ids = set(location_ids)
+        self._runs = {key: value for key, value in self._runs.items() if key[0] not in location_ids}
+        self._date_runs = {key: value for key, value in self._date_runs.items() if key[0] not in location_ids}
+
+    # Поиск
+
+    def _start_mask(self, free, length):
+        mask = free
+        for shift in range(1, length):
+            mask &= free >> shift
+        return mask
+
+    def free_mask(self, location_id, date: datetime.date):
+        """
+        Маска свободных слотов места на дату; у неизвестного индексу места свободных слотов нет
+        """
+        week = self._open.get(location_id)
+        if week is None:
+            return 0
+        return week[date.weekday()] & ~self._full.get((location_id, date), 0)
+
+    def _run_mask(self, location_id, date, weekday, length):
+        """
+        Маска начал свободных серий из length слотов; дни без бронирований
+        кэшируются по дню недели, дни с бронированиями — по дате
+        """
+        if (location_id, date) in self._full:
+            runs = self._date_runs.setdefault((location_id, date), {})
+            key = length
+        else:
+            runs = self._runs
+            key = (location_id, weekday, length)
+        mask = runs.get(key)
+        if mask is None:
+            mask = runs[key] = self._start_mask(self.free_mask(location_id, date), length)
+        return mask
+
+    def _length(self, duration):
+        return max(1, -(-int(duration.total_seconds()) // int(self.step.total_seconds())))
+
+    def day_masks(self, dates, duration: datetime.timedelta = None, location_ids=None):
+        """
+        Для каждой даты — маска слотов, с которых хотя бы в одном месте
+        начинается свободный интервал длительностью duration (по умолчанию один слот)
+        """
+        self.ensure_built()
+        length = self._length(duration) if duration else 1
+        with self._lock:
+            self._prune()
+            candidates = list(self._capacity) if location_ids is None else [pk for pk in location_ids if pk in self._capacity]
+            masks = []
+            for date in dates:
+                weekday = date.weekday()
+                mask = 0
+                for location_id in candidates:
+                    mask |= self._run_mask(location_id, date, weekday, length)
+                masks.append(mask)
+            return masks
+
+    @timed("slot_index.find_free_slots")
+    def find_free_slots(  # pylint: disable=R0913,R0914,R0917
+        self,
+        date_from: datetime.date,
+        duration: datetime.timedelta,
+        days=7,
+        limit=10,
+        time_from: datetime.time = None,
+        time_to: datetime.time = None,
+        location_ids=None,
+        per_location=1,
+    ):
+        """
+        limit самых ранних свободных интервалов длительностью duration.
+
+        Начало интервала ищется в окне [time_from, time_to] каждого дня,
+        не более per_location интервалов на место. Интервалы не переходят
+        через полночь.
+        """
+        self.ensure_built()
+        length = self._length(duration)
+        step = int(self.step.total_seconds())
+        first = -(-_seconds(time_from) // step) if time_from else 0
+        last = _seconds(time_to) // step if time_to else self.slots_per_day - 1
+        window = ((1 << (last - first + 1)) - 1) << first if last >= first else 0
+        tz = timezone.get_default_timezone()
+        result = []
+        with self._lock:
+            self._prune()
+            candidates = list(self._capacity) if location_ids is None else [pk for pk in location_ids if pk in self._capacity]
+            taken = defaultdict(int)
+            for offset in range(days):
+                date = date_from + datetime.timedelta(days=offset)
+                weekday = date.weekday()
+                found = []
+                for location_id in candidates:
+                    if taken[location_id] >= per_location:
+                        continue
+                    mask = self._run_mask(location_id, date, weekday, length) & window
+                    count = 0
+                    while mask and count + taken[location_id] < per_location:
+                        lowest = mask & -mask
+                        found.append((lowest.bit_length() - 1, location_id))
+                        mask ^= lowest
+                        count += 1
+                found.sort()
+                for slot, location_id in found:
+                    if taken[location_id] >= per_location:
+                        continue
+                    taken[location_id] += 1
+                    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time.min) + slot * self.step, tz)
+                    result.append(FreeSlot(location_id=location_id, start=start, end=start + length * self.step))
+                    if len(result) >= limit:
+                        return result
+        return result
+
+
+slot_index = SlotIndex()
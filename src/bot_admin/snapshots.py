@@ -0,0 +1,153 @@
+"""Неизменяемые снимки мест с недельным расписанием для бота, кэшей и передачи между процессами"""
+
+import datetime
+from decimal import Decimal
+from functools import cached_property
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+
+from .models import ServiceLocation
+from .schedule_cache import CompiledSchedule, format_working_hours
+
+# Поля ServiceLocation в снимке, в порядке values_list
+LOCATION_FIELDS = ("pk", "name", "description", "city", "rest_of_address", "latitude", "longitude", "capacity")
+SNAPSHOT_FIELDS = ("id",) + LOCATION_FIELDS[1:]
+
+
+class WorkDaySnapshot(BaseModel):
+    """Рабочий интервал дня недели; пустое время — весь день"""
+
+    model_config = ConfigDict(frozen=True)
+
+    day: int
+    start_time: Optional[datetime.time] = None
+    end_time: Optional[datetime.time] = None
+
+
+class LocationSnapshot(BaseModel):
+    """
+    Снимок ServiceLocation с расписанием.
+
+    Не держит ссылок на ORM, поэтому не выполняет запросов: доступность и
+    график работы считаются по собственному расписанию (CompiledSchedule
+    строится при первом обращении).
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    description: str = ""
+    city: str = ""
+    rest_of_address: str = ""
+    latitude: Optional[Decimal] = None
+    longitude: Optional[Decimal] = None
+    capacity: int = 1
+    schedule: tuple[WorkDaySnapshot, ...] = ()
+
+    @cached_property
+    def compiled(self):
+        """
+        Скомпилированное расписание (не входит в сериализацию и сравнение)
+        """
+        weekly = {}
+        for entry in self.schedule:
+            weekly.setdefault(entry.day, []).append((entry.start_time, entry.end_time))
+        return CompiledSchedule(weekly)
+
+    def is_available(self, date: datetime.date, time: datetime.time):
+        """
+        Проверка доступности места на дату и время, как ServiceLocation.is_available
+        """
+        return self.compiled.is_available(date.weekday(), time)
+
+    def open_minutes(self, weekday):
+        """
+        Продолжительность работы в день недели в минутах
+        """
+        return self.compiled.open_minutes(weekday)
+
+    def get_address(self):
+        """
+        Полный адрес, как ServiceLocation.get_address
+        """
+        return ", ".join(part for part in (self.city, self.rest_of_address) if part)
+
+    def get_working_hours(self):
+        """
+        График работы строкой, как ServiceLocation.get_working_hours
+        """
+        return format_working_hours((entry.day, entry.start_time, entry.end_time) for entry in self.schedule)
+
+
+_SNAPSHOTS = TypeAdapter(list[LocationSnapshot])
+
+
+def dumps(snapshots):
+    """
+    Сериализация списка снимков в JSON (bytes)
+    """
+    return _SNAPSHOTS.dump_json(list(snapshots))
+
+
+def loads(data):
+    """
+    Список снимков из результата dumps
+    """
+    return _SNAPSHOTS.validate_json(data)
+
+
+def _rows(queryset=None):
+    """
+    Строки мест с расписанием. Места queryset выбираются подзапросом: JOIN по
+    available_days к самому queryset переиспользовал бы его фильтры по расписанию
+    и обрезал бы расписание, а срез queryset нельзя переупорядочить
+    """
+    fields = LOCATION_FIELDS + ("available_days__day", "available_days__start_time", "available_days__end_time")
+    locations = ServiceLocation.objects.all()
+    if queryset is not None:
+        locations = locations.using(queryset.db).filter(pk__in=queryset.values("pk"))
+    return locations.order_by("pk", "available_days__day", "available_days__start_time").values_list(*fields)
+
+
+def _build(rows):
+    """
+    Снимки из строк _rows: строки одного места идут подряд (LEFT JOIN по available_days).
+    Данные из базы уже типизированы, поэтому снимки создаются model_construct без
+    проверки, а одинаковые интервалы разделяются между местами.
+    """
+    snapshots = []
+    intervals = {}
+    current_id, current, schedule = None, {}, []
+
+    def finish():
+        if current_id is not None:
+            snapshots.append(LocationSnapshot.model_construct(**current, schedule=tuple(schedule)))
+
+    for *location, day, start_time, end_time in rows:
+        if current_id != location[0]:
+            finish()
+            current_id, current, schedule = location[0], dict(zip(SNAPSHOT_FIELDS, location)), []
+        if day is not None:
+            key = (day, start_time, end_time)
+            entry = intervals.get(key)
+            if entry is None:
+                entry = intervals[key] = WorkDaySnapshot.model_construct(day=day, start_time=start_time, end_time=end_time)
+            schedule.append(entry)
+    finish()
+    return snapshots
+
+
+def location_snapshots(queryset=None):
+    """
+    Снимки мест queryset (по умолчанию всех) одним запросом, по возрастанию id
+    """
+    return _build(_rows(queryset))
+
+
+async def alocation_snapshots(queryset=None):
+    """
+    Асинхронный вариант location_snapshots
+    """
+    return _build([row async for row in _rows(queryset)])
@@ -1,12 +1,149 @@
-# pylint: disable=C0116
+# pylint: disable=C0116,C0302
 "Tests"
 
+import asyncio
+import csv
 import datetime
+import io
+import json
+import multiprocessing
+import random
+import re
+import tempfile
+import threading
+import zipfile
+from xml.etree import ElementTree
+from collections import defaultdict
+from decimal import Decimal
+from types import SimpleNamespace
 
-from django.test import TestCase
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import PhotoSize, Update, User, UserProfilePhotos
+from aiohttp import web
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
-from .models import ServiceLocation, WorkDay
+from .availability import availability_grid, date_range, time_slots
+from .booking import BookingError, CapacityExceeded, cancel, overlapping, peak_occupancy, reserve
+from .cards import LocationCallback, LocationCardCache, location_cards
+from .calendar_keyboard import BookingCalendar, CalendarCallback
+from . import export
+from .fsm import DjangoCacheStorage
+from .importer import LocationImportError, import_locations, read_rows
+from .geo import GeoIndex, bounding_box, bounding_box_filter, geo_index, haversine, locations_within, nearest_locations
+from .ingest import ProfileIngestBuffer
+from .metrics import (
+    CALL_SECONDS,
+    DB_QUERY_SECONDS,
+    UPDATE_QUERIES,
+    Histogram,
+    MetricsApplication,
+    count_queries,
+    install_query_metrics,
+    metrics_application,
+    query_metrics,
+    registry,
+    sql_operation,
+)
+from .middlewares import ActingUserMiddleware, HandlerMetricsMiddleware, ProfileIngestMiddleware, UpdateMetricsMiddleware
+from .models import Booking, OccupancyHour, OutboundMessage, ServiceLocation, TelegramUser, TelegramUserProfilePhotos, WorkDay
+from .occupancy import check, daily_utilization, hourly_minutes, recompute, stored
+from .outbound import SendScheduler, TokenBucket, aenqueue, enqueue
+from .reminders import TimingWheel, next_reminder_time, reminders
+from .profiles import BotProfileFetcher, ProfileCache
+from .repositories import locations, telegram_users
+from .routers import PinRegistry, PrimaryReplicaRouter, ReadYourWritesMiddleware, acting_as, pins
+from .search import SearchBackend, autocomplete, search_location_ids, search_locations, word_similarity
+from .schedule_cache import ScheduleCache, schedule_cache, weekly_schedule_rows
+from .sharding import ShardBroker, ShardPublisher, check_fsm_storage, check_shard_authkey, consume_shard, serve_broker, shard_for
+from .slot_index import SlotIndex, slot_index
+from . import snapshots
+from .updates import UpdateQueue, UpdateWorkerPool, update_chat_id
+from .webhook import WebhookApplication, webhook_application
+
+
+class FakeBotAPI:
+    "Local fake Telegram Bot API server"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = defaultdict(list)
+        # Ответы с ошибкой, которые метод вернёт до первого успешного
+        self.errors = defaultdict(list)
+        self.bios = {}
+        self.url = None
+        self._runner = None
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._runner.cleanup()
+
+    def bot(self):
+        return Bot("42:TEST", session=AiohttpSession(api=TelegramAPIServer.from_base(self.url)))
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        data["at"] = asyncio.get_running_loop().time()
+        self.calls[method].append(data)
+        await asyncio.sleep(self.delay)
+        if self.errors[method]:
+            status, error = self.errors[method].pop(0)
+            return web.json_response({"ok": False, "error_code": status, **error}, status=status)
+        result = getattr(self, method)(data)
+        return web.json_response({"ok": True, "result": result})
+
+    def getChat(self, data):  # pylint: disable=C0103
+        chat_id = int(data["chat_id"])
+        return {
+            "id": chat_id,
+            "type": "private",
+            "first_name": f"User {chat_id}",
+            "username": f"user{chat_id}",
+            "bio": self.bios.get(chat_id, "bio"),
+            "accent_color_id": 0,
+            "max_reaction_count": 11,
+            "accepted_gift_types": {
+                "unlimited_gifts": False,
+                "limited_gifts": False,
+                "unique_gifts": False,
+                "premium_subscription": False,
+                "gifts_from_channels": False,
+            },
+        }
+
+    def sendMessage(self, data):  # pylint: disable=C0103
+        chat_id = int(data["chat_id"])
+        return {"message_id": len(self.calls["sendMessage"]), "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": data["text"]}
+
+    def getUserProfilePhotos(self, data):  # pylint: disable=C0103
+        user_id = data["user_id"]
+        size = {"file_id": f"photo-{user_id}", "file_unique_id": f"unique-{user_id}", "width": 640, "height": 640, "file_size": 70000}
+        return {"total_count": 1, "photos": [[size]]}
 
 
 class WorkDayTestCase(TestCase):
@@ -37,6 +174,7 @@ class ServiceLocationTestCase(TestCase):
     "ServiceLocation Test"
 
     def setUp(self):
+        schedule_cache.clear()
         self.workday = WorkDay.objects.create(day=0, start_time=datetime.time(8, 0), end_time=datetime.time(19, 0))
         self.service_location = ServiceLocation.objects.create(
             name="Test Location",
@@ -76,3 +214,1868 @@ class ServiceLocationTestCase(TestCase):
 
         expected_hours = "Понедельник 08:00-19:00, Четверг 08:00-11:00"
         self.assertEqual(self.service_location.get_working_hours(), expected_hours)
+
+
+class AvailabilityGridTestCase(TestCase):
+    "AvailabilityGrid Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.monday = WorkDay.objects.create(day=0, start_time=datetime.time(8, 0), end_time=datetime.time(19, 0))
+        self.thursday = WorkDay.objects.create(day=3, start_time=datetime.time(8, 0), end_time=datetime.time(11, 0))
+        self.locations = [ServiceLocation.objects.create(name=f"Location {i}", city="Москва") for i in range(60)]
+        for location in self.locations[:50]:
+            location.available_days.add(self.monday, self.thursday)
+
+    def test_matches_is_available(self):
+        slots = time_slots(60)
+        start, end = datetime.date(2025, 8, 4), datetime.date(2025, 8, 10)
+        sample = self.locations[:2] + self.locations[-2:]
+        grid = availability_grid(sample, start, end, slots)
+        for location in sample:
+            for date in date_range(start, end):
+                for slot in slots:
+                    self.assertEqual(grid.is_available(location.pk, date, slot), location.is_available(date, slot))
+
+    def test_available_dates(self):
+        grid = availability_grid(self.locations[:1], datetime.date(2025, 8, 4), datetime.date(2025, 8, 10), time_slots(60))
+        self.assertEqual(grid.available_dates(self.locations[0].pk), [datetime.date(2025, 8, 4), datetime.date(2025, 8, 7)])
+
+    def test_query_count_is_constant(self):
+        slots = time_slots(30)
+        for count, days in ((1, 1), (10, 7), (60, 31)):
+            schedule_cache.clear()
+            with self.assertNumQueries(1):
+                grid = availability_grid(
+                    [location.pk for location in self.locations[:count]],
+                    datetime.date(2025, 8, 1),
+                    datetime.date(2025, 8, days),
+                    slots,
+                )
+            self.assertEqual(len(grid.matrix), count)
+            self.assertEqual(len(grid.matrix[0]), days)
+            self.assertEqual(len(grid.matrix[0][0]), len(slots))
+
+    def test_warm_cache_needs_no_queries(self):
+        availability_grid(self.locations, datetime.date(2025, 8, 1), datetime.date(2025, 8, 31), time_slots(30))
+        with self.assertNumQueries(0):
+            availability_grid(self.locations, datetime.date(2025, 8, 1), datetime.date(2025, 8, 31), time_slots(30))
+
+
+class ScheduleCacheTestCase(TestCase):
+    "ScheduleCache Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.morning = WorkDay.objects.create(day=2, start_time=datetime.time(8, 0), end_time=datetime.time(12, 0))
+        self.evening = WorkDay.objects.create(day=2, start_time=datetime.time(15, 0), end_time=datetime.time(20, 0))
+        self.location = ServiceLocation.objects.create(name="Cached", city="Казань")
+        self.location.available_days.add(self.morning, self.evening)
+
+    def test_multiple_intervals_per_day(self):
+        wednesday = datetime.date(2025, 8, 6)
+        self.assertTrue(self.location.is_available(wednesday, datetime.time(9, 0)))
+        self.assertFalse(self.location.is_available(wednesday, datetime.time(13, 0)))
+        self.assertTrue(self.location.is_available(wednesday, datetime.time(20, 0)))
+        self.assertEqual(self.location.get_working_hours(), "Среда 08:00-12:00, Среда 15:00-20:00")
+
+    def test_hits_and_misses(self):
+        cache = ScheduleCache()
+        with self.assertNumQueries(1):
+            cache.get(self.location.pk)
+            cache.get(self.location.pk)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+    def test_lru_bound(self):
+        cache = ScheduleCache(maxsize=2)
+        other = [ServiceLocation.objects.create(name=f"Other {i}") for i in range(2)]
+        cache.get(self.location.pk)
+        cache.get(other[0].pk)
+        cache.get(self.location.pk)
+        cache.get(other[1].pk)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        now = [0.0]
+        cache = ScheduleCache(ttl=60, clock=lambda: now[0])
+        self.assertFalse(cache.get(self.location.pk).always_available)
+        # Изменение из другого процесса: сигнал до этого кэша не дошёл
+        ServiceLocation.available_days.through.objects.filter(servicelocation_id=self.location.pk).delete()
+        self.assertFalse(cache.get(self.location.pk).always_available)
+        now[0] = 60
+        self.assertTrue(cache.get(self.location.pk).always_available)
+        with self.assertNumQueries(0):
+            cache.get(self.location.pk)
+
+    def test_eviction_on_workday_save(self):
+        wednesday = datetime.date(2025, 8, 6)
+        self.assertFalse(self.location.is_available(wednesday, datetime.time(21, 0)))
+        self.evening.end_time = datetime.time(22, 0)
+        self.evening.save()
+        self.assertTrue(self.location.is_available(wednesday, datetime.time(21, 0)))
+
+    def test_eviction_on_workday_delete(self):
+        self.assertNotEqual(self.location.get_working_hours(), "Среда 08:00-12:00")
+        self.evening.delete()
+        self.assertEqual(self.location.get_working_hours(), "Среда 08:00-12:00")
+
+    def test_eviction_on_m2m_changes(self):
+        friday = WorkDay.objects.create(day=4, start_time=datetime.time(10, 0), end_time=datetime.time(11, 0))
+        self.location.get_working_hours()
+        self.location.available_days.add(friday)
+        self.assertIn("Пятница", self.location.get_working_hours())
+        friday.service_locations.remove(self.location)
+        self.assertNotIn("Пятница", self.location.get_working_hours())
+        self.morning.service_locations.clear()
+        self.assertEqual(self.location.get_working_hours(), "Среда 15:00-20:00")
+        self.location.available_days.clear()
+        self.assertEqual(self.location.get_working_hours(), "")
+        self.assertTrue(self.location.is_available(datetime.date(2025, 8, 7), datetime.time(3, 0)))
+
+
+class BookingTestCase(TestCase):
+    "Booking reservation Test"
+
+    def setUp(self):
+        self.location = ServiceLocation.objects.create(name="Room", city="Москва", capacity=2)
+        self.start = timezone.make_aware(datetime.datetime(2025, 9, 1, 10, 0))
+
+    def hours(self, begin, finish):
+        return self.start + datetime.timedelta(hours=begin), self.start + datetime.timedelta(hours=finish)
+
+    def test_peak_occupancy(self):
+        start, end = self.hours(0, 4)
+        self.assertEqual(peak_occupancy([self.hours(0, 1), self.hours(1, 2)], start, end), 1)
+        self.assertEqual(peak_occupancy([self.hours(0, 2), self.hours(1, 3)], start, end), 2)
+        self.assertEqual(peak_occupancy([], start, end), 0)
+
+    def test_capacity_enforced(self):
+        reserve(self.location, *self.hours(0, 2))
+        reserve(self.location, *self.hours(1, 3))
+        with self.assertRaises(CapacityExceeded):
+            reserve(self.location, *self.hours(1, 2))
+        # Смежные интервалы не пересекаются
+        reserve(self.location, *self.hours(2, 4))
+        self.assertEqual(Booking.objects.filter(location=self.location).count(), 3)
+
+    def test_cancel_frees_capacity(self):
+        first = reserve(self.location, *self.hours(0, 2))
+        reserve(self.location, *self.hours(0, 2))
+        with self.assertRaises(CapacityExceeded):
+            reserve(self.location, *self.hours(0, 2))
+        cancel(first)
+        reserve(self.location, *self.hours(0, 2))
+
+    def test_invalid_interval(self):
+        with self.assertRaises(BookingError):
+            reserve(self.location, *self.hours(2, 1))
+
+    def test_single_overlap_query(self):
+        reserve(self.location, *self.hours(0, 1))
+        with CaptureQueriesContext(connection) as queries:
+            reserve(self.location, *self.hours(0, 1))
+        booking_selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and '"bot_admin_booking"' in q["sql"]]
+        self.assertEqual(len(booking_selects), 1)
+
+
+class BookingConcurrencyTestCase(TransactionTestCase):
+    "Concurrent reservation stress Test"
+
+    def test_no_overbooking(self):
+        location = ServiceLocation.objects.create(name="Hall", capacity=3)
+        start = timezone.make_aware(datetime.datetime(2025, 9, 1, 10, 0))
+        end = start + datetime.timedelta(hours=1)
+        results = []
+        barrier = threading.Barrier(12)
+
+        def worker():
+            barrier.wait()
+            for _ in range(3):
+                try:
+                    reserve(location, start, end)
+                    results.append(True)
+                except CapacityExceeded:
+                    results.append(False)
+
+        threads = [threading.Thread(target=worker) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(Booking.objects.filter(location=location, status=Booking.STATUS_CONFIRMED).count(), 3)
+
+    def test_concurrent_cancels(self):
+        location = ServiceLocation.objects.create(name="Hall", capacity=3)
+        start = timezone.make_aware(datetime.datetime(2025, 9, 1, 10, 0))
+        kept = reserve(location, start, start + datetime.timedelta(hours=1))
+        booking = reserve(location, start, start + datetime.timedelta(hours=1))
+        # Каждый поток отменяет свою копию бронирования, загруженную до отмены
+        copies = [Booking.objects.get(pk=booking.pk) for _ in range(8)]
+        barrier = threading.Barrier(len(copies))
+        errors = []
+
+        def worker(copy):
+            barrier.wait()
+            try:
+                cancel(copy)
+            except Exception as error:  # pylint: disable=W0718
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker, args=(copy,)) for copy in copies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(all(copy.status == Booking.STATUS_CANCELLED for copy in copies))
+        self.assertEqual(stored(), {(location.pk, kept.start.date(), timezone.localtime(kept.start).hour): (60, 1)})
+        self.assertEqual(check(), [])
+
+
+class SlotIndexTestCase(TestCase):
+    "SlotIndex Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.monday = datetime.date(2025, 9, 1)
+        workday = WorkDay.objects.create(day=0, start_time=datetime.time(9, 0), end_time=datetime.time(18, 0))
+        self.locations = [ServiceLocation.objects.create(name=f"Room {i}", capacity=1) for i in range(3)]
+        for location in self.locations:
+            location.available_days.add(workday)
+        # Бронирования тестов в прошлом: индекс не должен считать их закончившимися
+        self.addCleanup(setattr, slot_index, "now", slot_index.now)
+        slot_index.now = lambda: self.at(0)
+        slot_index.build()
+
+    def at(self, hour, minute=0, date=None):
+        return timezone.make_aware(datetime.datetime.combine(date or self.monday, datetime.time(hour, minute)))
+
+    def test_earliest_slots_within_working_hours(self):
+        slots = slot_index.find_free_slots(self.monday, datetime.timedelta(hours=2), days=7, limit=3, time_from=datetime.time(10, 0))
+        self.assertEqual([slot.start for slot in slots], [self.at(10)] * 3)
+        self.assertEqual({slot.location_id for slot in slots}, {location.pk for location in self.locations})
+        self.assertEqual(slots[0].end, self.at(12))
+
+    def test_no_slot_past_closing_time(self):
+        slots = slot_index.find_free_slots(
+            self.monday, datetime.timedelta(hours=2), days=1, time_from=datetime.time(17, 0), location_ids=[self.locations[0].pk]
+        )
+        self.assertEqual(slots, [])
+
+    def test_incremental_booking_updates(self):
+        location = self.locations[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = reserve(location, self.at(10), self.at(11, 30))
+        slots = slot_index.find_free_slots(
+            self.monday, datetime.timedelta(hours=1), days=1, time_from=datetime.time(10, 0), location_ids=[location.pk]
+        )
+        self.assertEqual(slots[0].start, self.at(11, 30))
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel(booking)
+        slots = slot_index.find_free_slots(
+            self.monday, datetime.timedelta(hours=1), days=1, time_from=datetime.time(10, 0), location_ids=[location.pk]
+        )
+        self.assertEqual(slots[0].start, self.at(10))
+
+    def test_capacity_and_schedule_changes(self):
+        location = self.locations[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve(location, self.at(9), self.at(18))
+        self.assertEqual(slot_index.free_mask(location.pk, self.monday), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.capacity = 2
+            location.save()
+        self.assertNotEqual(slot_index.free_mask(location.pk, self.monday), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.available_days.clear()
+        # Место без расписания доступно круглосуточно
+        self.assertEqual(slot_index.free_mask(location.pk, self.monday), (1 << slot_index.slots_per_day) - 1)
+
+    def test_ended_bookings_are_pruned(self):
+        location = self.locations[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve(location, self.at(9), self.at(18))
+        self.assertEqual(slot_index.free_mask(location.pk, self.monday), 0)
+        version = slot_index.version
+        slot_index.now = lambda: self.at(18)
+        slot_index.find_free_slots(self.monday, datetime.timedelta(hours=1))
+        self.assertNotEqual(slot_index.free_mask(location.pk, self.monday), 0)
+        self.assertGreater(slot_index.version, version)
+
+    def test_reload_sees_other_processes(self):
+        now = [0.0]
+        index = SlotIndex(reload=60, clock=lambda: now[0])
+        index.build()
+        location = self.locations[0]
+        day = self.monday + datetime.timedelta(weeks=520)
+        # bulk_create не отправляет сигналов, как запись из другого процесса
+        Booking.objects.bulk_create([Booking(location=location, start=self.at(9, date=day), end=self.at(18, date=day))])
+        index.ensure_built()
+        self.assertNotEqual(index.free_mask(location.pk, day), 0)
+        now[0] = 60
+        index.ensure_built()
+        self.assertEqual(index.free_mask(location.pk, day), 0)
+
+    def test_spans_several_days_and_per_location(self):
+        index = SlotIndex(step_minutes=60)
+        index.build()
+        slots = index.find_free_slots(
+            self.monday, datetime.timedelta(hours=1), days=14, limit=4, location_ids=[self.locations[0].pk], per_location=4
+        )
+        self.assertEqual([slot.start for slot in slots], [self.at(9), self.at(10), self.at(11), self.at(12)])
+        slots = index.find_free_slots(self.monday + datetime.timedelta(days=1), datetime.timedelta(hours=1), days=7)
+        self.assertTrue(all(slot.start.date() == self.monday + datetime.timedelta(days=7) for slot in slots))
+
+
+class BookingCalendarTestCase(TestCase):
+    "BookingCalendar Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        # Сентябрь 2025 начинается с понедельника
+        self.today = datetime.date(2025, 9, 1)
+        weekdays = [WorkDay.objects.create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(18, 0)) for day in range(5)]
+        self.location = ServiceLocation.objects.create(name="Room", capacity=1)
+        self.location.available_days.add(*weekdays)
+        self.index = SlotIndex(now=lambda: timezone.make_aware(datetime.datetime(2025, 9, 1)))
+        self.calendar = BookingCalendar(index=self.index)
+
+    def day_buttons(self, markup):
+        buttons = {}
+        for row in markup.inline_keyboard[2:]:
+            for button in row:
+                data = CalendarCallback.unpack(button.callback_data)
+                if data.action == "day":
+                    buttons[data.day] = button
+        return buttons
+
+    def test_weekends_and_booked_days_are_disabled(self):
+        start = timezone.make_aware(datetime.datetime(2025, 9, 3, 9, 0))
+        booking = Booking.objects.create(location=self.location, start=start, end=start + datetime.timedelta(hours=9))
+        self.index.build()
+        # build() загружает только будущие бронирования
+        self.index.booking_changed(booking.pk, self.location.pk, booking.start, booking.end, Booking.STATUS_CONFIRMED)
+        markup = self.calendar.render(2025, 9, today=self.today)
+        days = self.day_buttons(markup)
+        expected = [date.day for date in date_range(self.today, datetime.date(2025, 9, 30)) if date.weekday() < 5 and date.day != 3]
+        self.assertEqual(sorted(days), expected)
+        self.assertEqual(markup.inline_keyboard[0][1].text, "Сентябрь 2025")
+        self.assertEqual(len(markup.inline_keyboard), 2 + 5)
+        # Бронирование на час оставляет день доступным, но не для восьмичасового интервала
+        self.index.booking_changed(booking.pk, self.location.pk, start, start + datetime.timedelta(hours=1), Booking.STATUS_CONFIRMED)
+        self.assertIn(3, self.day_buttons(self.calendar.render(2025, 9, today=self.today)))
+        self.assertNotIn(3, self.day_buttons(self.calendar.render(2025, 9, duration=datetime.timedelta(hours=9), today=self.today)))
+
+    def test_past_days_and_previous_month(self):
+        markup = self.calendar.render(2025, 9, today=datetime.date(2025, 9, 15))
+        self.assertEqual(min(self.day_buttons(markup)), 15)
+        self.assertEqual(CalendarCallback.unpack(markup.inline_keyboard[0][0].callback_data).action, "ignore")
+        following = CalendarCallback.unpack(markup.inline_keyboard[0][2].callback_data)
+        self.assertEqual((following.year, following.month), (2025, 10))
+        december = self.calendar.render(2025, 12, today=self.today)
+        self.assertEqual(CalendarCallback.unpack(december.inline_keyboard[0][2].callback_data).year, 2026)
+
+    def test_memoized_until_index_changes(self):
+        markup = self.calendar.render(2025, 9, today=self.today)
+        self.assertIs(self.calendar.render(2025, 9, today=self.today), markup)
+        self.assertEqual(self.calendar.stats()["hits"], 1)
+        self.index.schedules_changed(self.location.pk)
+        self.assertIsNot(self.calendar.render(2025, 9, today=self.today), markup)
+
+    def test_matches_schedule_semantics(self):
+        other = ServiceLocation.objects.create(name="Always open")
+        self.index.build()
+        days = self.day_buttons(self.calendar.render(2025, 9, location_ids=[self.location.pk], today=self.today))
+        expected = [
+            date.day
+            for date in date_range(self.today, datetime.date(2025, 9, 30))
+            if self.location.is_available(date, datetime.time(12, 0))
+        ]
+        self.assertEqual(sorted(days), expected)
+        self.assertEqual(len(self.day_buttons(self.calendar.render(2025, 9, location_ids=[other.pk], today=self.today))), 30)
+
+
+class ServiceLocationAdminTestCase(TestCase):
+    "ServiceLocationAdmin Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+        self.workdays = [WorkDay.objects.create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(18, 0)) for day in range(7)]
+
+    def create_locations(self, count):
+        for i in range(ServiceLocation.objects.count(), count):
+            location = ServiceLocation.objects.create(name=f"Location {i:03}", city="Москва")
+            location.available_days.add(*self.workdays[: i % 7 + 1])
+
+    def count_queries(self, url):
+        # Прогрев кэша ContentType и сессии
+        self.client.get(url, secure=True)
+        schedule_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_constant(self):
+        url = reverse("admin:bot_admin_servicelocation_changelist")
+        self.create_locations(10)
+        small = self.count_queries(url)
+        self.create_locations(100)
+        self.assertEqual(self.count_queries(url), small)
+        with self.assertNumQueries(small):
+            response = self.client.get(url, secure=True)
+        self.assertContains(response, "Понедельник 09:00-18:00, Вторник 09:00-18:00")
+
+    def test_changelist_shows_week_occupancy(self):
+        self.create_locations(1)
+        location = ServiceLocation.objects.get()
+        location.capacity = 2
+        location.save()
+        location.available_days.add(*self.workdays)
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.datetime.combine(today - datetime.timedelta(days=1), datetime.time(9, 0)))
+        reserve(location, start, start + datetime.timedelta(hours=9))
+        response = self.client.get(reverse("admin:bot_admin_servicelocation_changelist"), secure=True)
+        # 540 минут из 7 × 540 минут работы при вместимости 2
+        self.assertContains(response, '<td class="field-get_week_occupancy">7%</td>', html=True)
+        response = self.client.get(reverse("admin:bot_admin_occupancyhour_changelist"), secure=True)
+        self.assertContains(response, "50%")
+
+    def test_change_form_query_count_is_constant(self):
+        self.create_locations(1)
+        location = ServiceLocation.objects.get()
+        url = reverse("admin:bot_admin_servicelocation_change", args=[location.pk])
+        small = self.count_queries(url)
+        location.available_days.add(*self.workdays)
+        for day in range(7):
+            WorkDay.objects.create(day=day, start_time=datetime.time(20, 0), end_time=datetime.time(22, 0))
+        self.assertEqual(self.count_queries(url), small)
+
+
+class RepositoryTestCase(TestCase):
+    "Async repositories Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.workday = WorkDay.objects.create(day=0, start_time=datetime.time(8, 0), end_time=datetime.time(19, 0))
+        self.location = ServiceLocation.objects.create(name="Async", city="Москва")
+        self.location.available_days.add(self.workday)
+        self.other = ServiceLocation.objects.create(name="Always", city="Москва")
+        TelegramUser.objects.create(first_name="Ivan", last_name="", username="ivan", bio="", language_code="ru", is_premium=False)
+
+    async def test_aget_and_afilter(self):
+        location = await locations.aget(pk=self.location.pk)
+        self.assertEqual(location.name, "Async")
+        self.assertEqual(len(await locations.afilter(city="Москва")), 2)
+        self.assertIsNone(await locations.afirst(city="Казань"))
+        self.assertEqual(set(await locations.ain_bulk([self.location.pk])), {self.location.pk})
+
+    async def test_prefetch_schedules(self):
+        loaded = await locations.afilter_with_schedules(city="Москва")
+        hours = {location.name: location.get_working_hours() for location in loaded}
+        self.assertEqual(hours, {"Async": "Понедельник 08:00-19:00", "Always": ""})
+
+    async def test_availability(self):
+        monday = datetime.date(2025, 8, 4)
+        self.assertTrue(await locations.ais_available(self.location, monday, datetime.time(9, 0)))
+        self.assertFalse(await locations.ais_available(self.location.pk, monday, datetime.time(20, 0)))
+        available = await locations.aavailable_locations([self.location.pk, self.other.pk], monday, datetime.time(20, 0))
+        self.assertEqual(available, [self.other.pk])
+        self.assertEqual(await locations.aworking_hours(self.location), "Понедельник 08:00-19:00")
+        self.assertGreater(schedule_cache.hits, 0)
+
+    async def test_telegram_users(self):
+        user = await telegram_users.aget_by_username("ivan")
+        self.assertEqual(user.first_name, "Ivan")
+        self.assertIsNone(await telegram_users.aget_by_username("nobody"))
+
+
+class ProfileIngestBufferTestCase(TestCase):
+    "ProfileIngestBuffer Test"
+
+    def photos(self, prefix, size=2_500_000):
+        return UserProfilePhotos(
+            total_count=1,
+            photos=[[PhotoSize(file_id=f"{prefix}-file", file_unique_id=f"{prefix}-unique", width=1280, height=1280, file_size=size)]],
+        )
+
+    def test_dedup_and_merge(self):
+        buffer = ProfileIngestBuffer()
+        buffer.add_user(User(id=1, is_bot=False, first_name="Ivan", language_code="ru", is_premium=True))
+        buffer.add_user({"id": 1, "first_name": "Ivan", "username": "ivan", "bio": "Hello"})
+        buffer.add_photos(1, self.photos("a"))
+        buffer.add_photos(1, self.photos("a", size=3_000_000))
+        self.assertEqual(buffer.flush(), (1, 1))
+        user = TelegramUser.objects.get(telegram_id=1)
+        self.assertEqual((user.username, user.bio, user.language_code, user.is_premium), ("ivan", "Hello", "ru", True))
+        photo = TelegramUserProfilePhotos.objects.get()
+        self.assertEqual((photo.tg_user_id, photo.file_size), (user, 3_000_000))
+        self.assertEqual(buffer.flush(), (0, 0))
+
+    def test_upsert_keeps_missing_fields(self):
+        buffer = ProfileIngestBuffer()
+        buffer.add_user({"id": 5, "first_name": "Anna", "bio": "Bio"})
+        buffer.flush()
+        buffer.add_user(User(id=5, is_bot=False, first_name="Anna", last_name="K"))
+        buffer.flush()
+        user = TelegramUser.objects.get(telegram_id=5)
+        self.assertEqual((user.last_name, user.bio), ("K", "Bio"))
+        self.assertEqual(TelegramUser.objects.count(), 1)
+
+    def test_photos_only_do_not_touch_users(self):
+        TelegramUser.objects.create(telegram_id=7, first_name="Olga")
+        before = TelegramUser.objects.get(telegram_id=7).datetime
+        buffer = ProfileIngestBuffer()
+        buffer.add_photos(7, self.photos("o"))
+        # Фотографии неизвестного пользователя не создают его с пустым именем
+        buffer.add_photos(8, self.photos("x"))
+        self.assertEqual(buffer.flush(), (0, 1))
+        self.assertEqual(TelegramUser.objects.get(telegram_id=7).datetime, before)
+        self.assertFalse(TelegramUser.objects.filter(telegram_id=8).exists())
+        self.assertEqual(TelegramUserProfilePhotos.objects.get().tg_user_id.telegram_id, 7)
+
+    def test_query_count_does_not_grow(self):
+        def fill(buffer, count, offset):
+            for i in range(offset, offset + count):
+                buffer.add_user({"id": i, "first_name": f"User {i}", "username": f"user{i}"})
+                buffer.add_photos(i, self.photos(str(i)))
+
+        counts = []
+        for count, offset in ((5, 0), (50, 1000)):
+            buffer = ProfileIngestBuffer(max_size=10_000)
+            fill(buffer, count, offset)
+            with CaptureQueriesContext(connection) as queries:
+                buffer.flush()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(TelegramUserProfilePhotos.objects.count(), 55)
+
+    def test_flush_thresholds(self):
+        now = [0.0]
+        buffer = ProfileIngestBuffer(max_size=3, max_delay=5.0, clock=lambda: now[0])
+        self.assertFalse(buffer.should_flush())
+        self.assertFalse(buffer.add_user({"id": 1, "first_name": "A"}))
+        now[0] = 5.0
+        self.assertTrue(buffer.should_flush())
+        buffer.flush()
+        buffer.add_user({"id": 2, "first_name": "B"})
+        buffer.add_user({"id": 3, "first_name": "C"})
+        self.assertTrue(buffer.add_user({"id": 4, "first_name": "D"}))
+
+    async def test_async_flush(self):
+        buffer = ProfileIngestBuffer(max_size=1)
+        await buffer.aadd_user({"id": 9, "first_name": "Async"})
+        self.assertEqual(buffer.flushes, 1)
+        self.assertTrue(await TelegramUser.objects.filter(telegram_id=9).aexists())
+
+    def test_failed_flush_keeps_batch(self):
+        buffer = ProfileIngestBuffer()
+        buffer.add_user({"id": 10, "first_name": "Broken", "is_premium": "maybe"})
+        buffer.add_photos(10, self.photos("b"))
+        with self.assertRaises(ValidationError):
+            buffer.flush()
+        self.assertEqual(len(buffer), 2)
+        # Данные, добавленные после неудачной записи, новее возвращённых
+        buffer.add_user({"id": 10, "is_premium": True})
+        self.assertEqual(buffer.flush(), (1, 1))
+        user = TelegramUser.objects.get(telegram_id=10)
+        self.assertEqual((user.first_name, user.is_premium), ("Broken", True))
+
+    async def test_run_survives_failed_flush(self):
+        buffer = ProfileIngestBuffer(max_delay=0)
+        buffer.add_user({"id": 11, "first_name": "Broken", "is_premium": "maybe"})
+        task = asyncio.create_task(buffer.run(interval=0.001))
+        with self.assertLogs("bot_admin.ingest", "ERROR"):
+            await asyncio.sleep(0.05)
+        self.assertFalse(task.done())
+        buffer.add_user({"id": 11, "is_premium": False})
+        while len(buffer):
+            await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        self.assertEqual(buffer.flushes, 1)
+        self.assertTrue(await TelegramUser.objects.filter(telegram_id=11, first_name="Broken").aexists())
+
+    async def test_middleware_buffers_sender(self):
+        buffer = ProfileIngestBuffer()
+        middleware = ProfileIngestMiddleware(buffer)
+
+        async def handler(event, data):  # pylint: disable=W0613
+            return "handled"
+
+        user = User(id=12, is_bot=False, first_name="Sender")
+        self.assertEqual(await middleware(handler, None, {"event_from_user": user}), "handled")
+        self.assertEqual(await middleware(handler, None, {}), "handled")
+        self.assertEqual(len(buffer), 1)
+        await buffer.aflush()
+        self.assertTrue(await TelegramUser.objects.filter(telegram_id=12, first_name="Sender").aexists())
+
+
+class ProfileCacheTestCase(TestCase):
+    "ProfileCache Test"
+
+    def setUp(self):
+        caches["default"].clear()
+        self.offset = datetime.timedelta()
+
+    def profile_cache(self, bot, **kwargs):
+        return ProfileCache(BotProfileFetcher(bot), ttl=60, stale_ttl=600, now=lambda: timezone.now() + self.offset, **kwargs)
+
+    async def test_miss_then_hit(self):
+        async with FakeBotAPI() as api:
+            bot = api.bot()
+            profiles = self.profile_cache(bot)
+            profile = await profiles.aget(100)
+            self.assertEqual((profile.username, profile.bio, profile.photos), ("user100", "bio", ("photo-100",)))
+            await profiles.aget(100)
+            await bot.session.close()
+        self.assertEqual(len(api.calls["getChat"]), 1)
+        self.assertEqual((profiles.hits, profiles.misses), (1, 1))
+        user = await TelegramUser.objects.aget(telegram_id=100)
+        self.assertEqual(user.bio, "bio")
+
+    async def test_shared_tier_and_database(self):
+        async with FakeBotAPI() as api:
+            bot = api.bot()
+            await self.profile_cache(bot).aget(200)
+            # Новый процесс: пустой LRU, запись берётся из кэша Django
+            self.assertEqual((await self.profile_cache(bot).aget(200)).username, "user200")
+            await caches["default"].aclear()
+            # Кэш Django пуст: свежесть определяется по TelegramUser.profile_fetched_at
+            self.assertEqual((await self.profile_cache(bot).aget(200)).username, "user200")
+            await bot.session.close()
+        self.assertEqual(len(api.calls["getChat"]), 1)
+
+    async def test_user_updates_do_not_refresh_profile(self):
+        async with FakeBotAPI() as api:
+            bot = api.bot()
+            await self.profile_cache(bot).aget(250)
+            await caches["default"].aclear()
+            long_ago = timezone.now() - datetime.timedelta(days=1)
+            await TelegramUser.objects.filter(telegram_id=250).aupdate(profile_fetched_at=long_ago)
+            # Данные User из входящего обновления не продлевают свежесть профиля
+            buffer = ProfileIngestBuffer()
+            buffer.add_user({"id": 250, "first_name": "Renamed"})
+            await buffer.aflush()
+            self.assertEqual((await self.profile_cache(bot).aget(250)).first_name, "User 250")
+            await bot.session.close()
+        self.assertEqual(len(api.calls["getChat"]), 2)
+
+    async def test_stale_while_revalidate(self):
+        async with FakeBotAPI() as api:
+            bot = api.bot()
+            profiles = self.profile_cache(bot)
+            await profiles.aget(300)
+            api.bios[300] = "updated"
+            self.offset = datetime.timedelta(seconds=120)
+            stale = await profiles.aget(300)
+            self.assertEqual(stale.bio, "bio")
+            await asyncio.gather(*profiles._background)  # pylint: disable=W0212
+            self.offset = datetime.timedelta()
+            self.assertEqual((await profiles.aget(300)).bio, "updated")
+            self.offset = datetime.timedelta(seconds=3600)
+            # За пределами окна устаревания профиль загружается синхронно
+            api.bios[300] = "fresh"
+            self.assertEqual((await profiles.aget(300)).bio, "fresh")
+            await bot.session.close()
+        self.assertEqual(profiles.stale_hits, 1)
+        self.assertEqual(len(api.calls["getChat"]), 3)
+
+    async def test_concurrent_requests_collapse(self):
+        async with FakeBotAPI(delay=0.05) as api:
+            bot = api.bot()
+            profiles = self.profile_cache(bot)
+            results = await asyncio.gather(*(profiles.aget(400) for _ in range(20)))
+            await bot.session.close()
+        self.assertEqual({profile.username for profile in results}, {"user400"})
+        self.assertEqual(len(api.calls["getChat"]), 1)
+        self.assertEqual(len(api.calls["getUserProfilePhotos"]), 1)
+
+
+class GeoTestCase(TestCase):
+    "Geospatial search Test"
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.points = {}
+        for i in range(300):
+            lat, lon = round(rng.uniform(55.0, 56.5), 6), round(rng.uniform(36.5, 38.5), 6)
+            location = ServiceLocation.objects.create(name=f"Point {i}", latitude=lat, longitude=lon)
+            self.points[location.pk] = (lat, lon)
+        ServiceLocation.objects.create(name="No coordinates")
+        self.moscow = (55.7558, 37.6173)
+
+    def brute_force(self, lat, lon):
+        return sorted((haversine(lat, lon, *point), pk) for pk, point in self.points.items())
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine(55.7558, 37.6173, 59.9343, 30.3351), 633.0, delta=1)
+
+    def test_bounding_box_antimeridian(self):
+        _, _, lon_ranges = bounding_box(0, 179.9, 50)
+        self.assertEqual(len(lon_ranges), 2)
+
+    def test_nearest_matches_brute_force(self):
+        index = GeoIndex(cell_degrees=0.05)
+        for lat, lon in (self.moscow, (55.0, 36.5), (60.0, 30.0), (-33.9, 151.2)):
+            expected = self.brute_force(lat, lon)[:7]
+            self.assertEqual([pk for _, pk in index.nearest(lat, lon, 7)], [pk for _, pk in expected])
+
+    def test_within_matches_brute_force(self):
+        index = GeoIndex()
+        expected = [pk for distance, pk in self.brute_force(*self.moscow) if distance <= 10]
+        self.assertEqual([pk for _, pk in index.within(*self.moscow, 10)], expected)
+        self.assertEqual([location.pk for _, location in locations_within(*self.moscow, 10)], expected)
+
+    def test_nearest_sql(self):
+        expected = [pk for _, pk in self.brute_force(*self.moscow)[:5]]
+        self.assertEqual([location.pk for _, location in nearest_locations(*self.moscow, 5, start_radius_km=1)], expected)
+
+    def test_max_km(self):
+        self.assertEqual(GeoIndex().nearest(-33.9, 151.2, 5, max_km=100), [])
+
+    def test_index_follows_saves(self):
+        geo_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            location = ServiceLocation.objects.create(name="Kremlin", latitude=55.752, longitude=37.6175)
+        self.assertEqual(geo_index.nearest(55.752, 37.6175, 1)[0][1], location.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.latitude, location.longitude = -33.9, 151.2
+            location.save()
+        self.assertEqual(geo_index.nearest(-33.9, 151.2, 1)[0][1], location.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.delete()
+        self.assertNotEqual(geo_index.nearest(-33.9, 151.2, 1)[0][1], location.pk)
+
+
+class SearchTestCase(TestCase):
+    "Location search Test"
+
+    def setUp(self):
+        self.red_square = ServiceLocation.objects.create(
+            name="Конференц-зал Красная площадь", city="Москва", rest_of_address="Красная пл., 1"
+        )
+        self.tverskaya = ServiceLocation.objects.create(name="Коворкинг", city="Москва", rest_of_address="ул. Тверская, д. 7")
+        self.nevsky = ServiceLocation.objects.create(name="Лофт на Невском", city="Санкт-Петербург", rest_of_address="Невский пр., 28")
+        for i in range(50):
+            ServiceLocation.objects.create(name=f"Склад {i}", city="Казань", rest_of_address=f"ул. Баумана, {i}")
+
+    def test_word_similarity(self):
+        self.assertEqual(word_similarity("москва", "г. Москва"), 1.0)
+        self.assertGreaterEqual(word_similarity("масква", "Москва"), 0.5)
+        self.assertLess(word_similarity("казань", "Москва"), 0.5)
+
+    def test_typo_tolerance(self):
+        ids = search_location_ids("Масква")
+        self.assertEqual(set(ids), {self.red_square.pk, self.tverskaya.pk})
+
+    def test_morphology_and_ranking(self):
+        results = search_locations("Невском")
+        self.assertEqual(results[0], self.nevsky)
+        self.assertGreater(results[0].search_rank, 0)
+        # Совпадение в названии ранжируется выше совпадения в адресе
+        self.assertEqual(search_location_ids("Красная площадь")[0], self.red_square.pk)
+
+    def test_autocomplete(self):
+        self.assertEqual(autocomplete("Твер"), [(self.tverskaya.pk, "Коворкинг - Москва")])
+        self.assertEqual(autocomplete("Ло")[0], (self.nevsky.pk, "Лофт на Невском - Санкт-Петербург"))
+        self.assertEqual(autocomplete("   "), [])
+
+    def test_index_follows_updates(self):
+        self.nevsky.name = "Студия"
+        self.nevsky.save()
+        self.assertEqual(search_location_ids("Студия"), [self.nevsky.pk])
+        self.nevsky.delete()
+        self.assertEqual(search_location_ids("Студия"), [])
+
+    def test_fallback_backend(self):
+        self.assertEqual([pk for pk, _ in SearchBackend("default").search("Тверская")], [self.tverskaya.pk])
+
+    def test_admin_search(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+        url = reverse("admin:bot_admin_servicelocation_changelist")
+        response = self.client.get(url, {"q": "Пeтербург Невский"}, secure=True)
+        self.assertContains(response, "Лофт на Невском")
+        self.assertNotContains(response, "Коворкинг")
+
+
+class LocationCardCacheTestCase(TestCase):
+    "LocationCardCache Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.workday = WorkDay.objects.create(day=0, start_time=datetime.time(9, 0), end_time=datetime.time(18, 0))
+        self.location = ServiceLocation.objects.create(
+            name="Лофт <Север>", city="Москва", rest_of_address="ул. Тверская, 1", latitude=55.757, longitude=37.615, description="Зал"
+        )
+        self.location.available_days.add(self.workday)
+        # Изменение расписания сдвигает updated_at
+        self.location.refresh_from_db()
+        self.cards = LocationCardCache(maxsize=10)
+
+    def test_version_bumped_only_by_schedule_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            # День уже связан с местом: расписание не меняется
+            self.location.available_days.add(self.workday)
+            self.location.delete()
+        self.assertFalse([query for query in queries if "updated_at" in query["sql"]])
+        other = ServiceLocation.objects.create(name="Другое")
+        other.available_days.add(self.workday)
+        other.refresh_from_db()
+        with self.assertNumQueries(3):
+            # Сохранение, выбор связанных мест и одно обновление их версий
+            self.workday.save()
+        self.assertGreater(ServiceLocation.objects.get(pk=other.pk).updated_at, other.updated_at)
+
+    def test_render_and_encoding(self):
+        card = self.cards.get(self.location.pk)
+        self.assertIn("<b>Лофт &lt;Север&gt; - Москва</b>", card.text)
+        self.assertIn("Понедельник 09:00-18:00", card.text)
+        body = json.loads(card.request_body(42))
+        self.assertEqual(body["chat_id"], 42)
+        self.assertEqual(body["text"], card.text)
+        buttons = body["reply_markup"]["inline_keyboard"][0]
+        self.assertEqual(LocationCallback.unpack(buttons[1]["callback_data"]).action, "geo")
+        self.assertEqual(json.loads(card.webhook_body(42))["method"], "sendMessage")
+        self.assertEqual(card.message_kwargs()["reply_markup"].inline_keyboard[0][0].text, "Забронировать")
+
+    def test_hits_without_queries(self):
+        with self.assertNumQueries(2):
+            card = self.cards.get(self.location)
+        with self.assertNumQueries(0):
+            self.assertIs(self.cards.get(self.location), card)
+        # По id версия читается одним запросом, отрисовки нет
+        with self.assertNumQueries(1):
+            self.assertIs(self.cards.get(self.location.pk), card)
+        self.assertEqual(self.cards.stats()["hits"], 2)
+
+    def test_evicted_on_change(self):
+        self.cards = location_cards
+        self.cards.clear()
+        card = self.cards.get(self.location.pk)
+        self.workday.end_time = datetime.time(20, 0)
+        self.workday.save()
+        updated = self.cards.get(self.location.pk)
+        self.assertIn("09:00-20:00", updated.text)
+        self.assertGreater(updated.version, card.version)
+        self.location.name = "Лофт"
+        self.location.save()
+        self.assertIn("<b>Лофт - Москва</b>", self.cards.get(self.location.pk).text)
+
+    def test_version_check_for_other_processes(self):
+        card = self.cards.get(self.location.pk)
+        # Изменение из другого процесса: сигнал до этого кэша не дошёл
+        ServiceLocation.objects.filter(pk=self.location.pk).update(name="Другое", updated_at=timezone.now())
+        self.assertIs(self.cards.get(self.location), card)
+        self.assertIn("Другое", self.cards.get(self.location.pk).text)
+        fresh = ServiceLocation.objects.get(pk=self.location.pk)
+        self.assertIs(self.cards.get(fresh), self.cards.get(self.location.pk))
+
+    async def test_aget(self):
+        card = await self.cards.aget(self.location.pk)
+        self.assertIs(await self.cards.aget(self.location.pk), card)
+        await ServiceLocation.objects.filter(pk=self.location.pk).aupdate(name="Другое", updated_at=timezone.now())
+        self.assertIn("Другое", (await self.cards.aget(self.location.pk)).text)
+        with self.assertRaises(ServiceLocation.DoesNotExist):
+            await self.cards.aget(0)
+
+
+class QueryPlanTestCase(TestCase):
+    "Hot path query plans"
+
+    def assertUsesIndexes(self, queryset):  # pylint: disable=C0103
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                # На маленьких таблицах планировщик всё равно выбрал бы Seq Scan
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+            self.assertNotIn("Seq Scan", plan, plan)
+        else:
+            plan = queryset.explain()
+            full_scans = [line for line in plan.splitlines() if re.search(r"\bSCAN (?!CONSTANT)", line) and "INDEX" not in line]
+            self.assertEqual(full_scans, [], plan)
+
+    def test_schedule_rows(self):
+        self.assertUsesIndexes(weekly_schedule_rows([1, 2, 3]))
+        self.assertUsesIndexes(ServiceLocation.available_days.through.objects.filter(workday_id=1))
+
+    def test_telegram_user_lookups(self):
+        self.assertUsesIndexes(TelegramUser.objects.filter(telegram_id=1))
+        # SQLite выбирает частичный индекс, только если его условие повторено в запросе
+        self.assertUsesIndexes(TelegramUser.objects.filter(username="user").exclude(username=""))
+
+    def test_bookings(self):
+        now = timezone.now()
+        self.assertUsesIndexes(overlapping(1, now, now + datetime.timedelta(hours=1)))
+        self.assertUsesIndexes(Booking.objects.filter(status=Booking.STATUS_CONFIRMED, end__gt=now).order_by())
+
+    def test_locations_by_coordinates(self):
+        self.assertUsesIndexes(ServiceLocation.objects.filter(bounding_box_filter(55.75, 37.62, 10)))
+
+    def test_due_reminders_and_messages(self):
+        now = timezone.now()
+        self.assertUsesIndexes(Booking.objects.filter(status=Booking.STATUS_CONFIRMED, next_reminder_at__lte=now, start__gt=now).order_by())
+        self.assertUsesIndexes(OutboundMessage.objects.filter(status=OutboundMessage.STATUS_PENDING, next_attempt_at__lte=now))
+
+
+class DatabaseSettingsTestCase(TestCase):
+    "Connection-time database settings"
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+class MigrationsTestCase(TestCase):
+    """Миграции соответствуют моделям"""
+
+    def test_no_missing_migrations(self):
+        call_command("makemigrations", check=True, dry_run=True, stdout=io.StringIO())
+
+    @override_settings(DATABASE_ROUTERS=["bot_admin.routers.PrimaryReplicaRouter"], DATABASE_REPLICAS=["replica_1"])
+    def test_no_missing_migrations_with_router(self):
+        # С роутером makemigrations обходит все псевдонимы, включая ненастроенный production
+        call_command("makemigrations", check=True, dry_run=True, stdout=io.StringIO())
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"], DATABASE_REPLICA_PIN_SECONDS=5.0)
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    "PrimaryReplicaRouter Test"
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.now = [0.0]
+        self.pins_clock = pins.clock
+        pins.clock = lambda: self.now[0]
+        pins.clear()
+
+    def tearDown(self):
+        pins.clock = self.pins_clock
+        pins.clear()
+
+    def test_reads_go_to_replicas_round_robin(self):
+        self.assertEqual([self.router.db_for_read(ServiceLocation) for _ in range(3)], ["replica_1", "replica_2", "replica_1"])
+        self.assertEqual(self.router.db_for_write(ServiceLocation), "default")
+        # Модели вне DATABASE_REPLICA_APPS (сессии, пользователи админки) читаются с основной базы
+        self.assertIsNone(self.router.db_for_read(get_user_model()))
+        self.assertFalse(self.router.allow_migrate("replica_1", "bot_admin"))
+        self.assertFalse(self.router.allow_migrate("production", "bot_admin"))
+        self.assertIsNone(self.router.allow_migrate("default", "bot_admin"))
+
+    def test_read_your_writes(self):
+        with acting_as(42):
+            self.assertNotEqual(self.router.db_for_read(Booking), "default")
+            self.router.db_for_write(Booking)
+            self.assertEqual(self.router.db_for_read(ServiceLocation), "default")
+        # Следующее обновление того же пользователя
+        with acting_as(42):
+            self.assertEqual(self.router.db_for_read(Booking), "default")
+        with acting_as(7):
+            self.assertNotEqual(self.router.db_for_read(Booking), "default")
+        self.now[0] = 6.0
+        with acting_as(42):
+            self.assertNotEqual(self.router.db_for_read(Booking), "default")
+
+    def test_writes_outside_acting_as(self):
+        self.router.db_for_write(Booking)
+        # Буферы и импорт вне acting_as читают собственные записи
+        self.assertEqual(self.router.db_for_read(Booking), "default")
+        with acting_as(7):
+            self.assertNotEqual(self.router.db_for_read(Booking), "default")
+        self.now[0] = 6.0
+        self.assertNotEqual(self.router.db_for_read(Booking), "default")
+
+    def test_allow_relation(self):
+        self.assertTrue(self.router.allow_relation(ServiceLocation(pk=1), WorkDay(pk=1)))
+        self.assertIsNone(self.router.allow_relation(ServiceLocation(pk=1), get_user_model()(pk=1)))
+
+    async def test_write_inside_sync_to_async(self):
+        with acting_as(42):
+            await sync_to_async(self.router.db_for_write)(Booking)
+            self.assertEqual(self.router.db_for_read(Booking), "default")
+
+    async def test_aiogram_middleware(self):
+        async def handler(event, data):  # pylint: disable=W0613
+            self.router.db_for_write(Booking)
+            return self.router.db_for_read(Booking)
+
+        user = User(id=42, is_bot=False, first_name="Test")
+        self.assertEqual(await ActingUserMiddleware()(handler, None, {"event_from_user": user}), "default")
+        self.assertTrue(pins.is_pinned(42))
+
+    def test_pin_registry_prunes_expired(self):
+        pin_registry = PinRegistry(clock=lambda: self.now[0])
+        for actor in range(1100):
+            pin_registry.pin(actor, 1.0)
+        self.now[0] = 2.0
+        pin_registry.pin("late", 1.0)
+        self.assertEqual(len(pin_registry), 1)
+
+    def test_middleware_sets_pin_cookie(self):
+        def view(request):
+            self.router.db_for_write(Booking)
+            return HttpResponse()
+
+        response = ReadYourWritesMiddleware(view)(RequestFactory().post("/"))
+        self.assertIn(ReadYourWritesMiddleware.cookie_name, response.cookies)
+
+        def read_view(request):
+            return HttpResponse(self.router.db_for_read(Booking))
+
+        request = RequestFactory().get("/")
+        request.COOKIES[ReadYourWritesMiddleware.cookie_name] = "1"
+        self.assertEqual(ReadYourWritesMiddleware(read_view)(request).content, b"default")
+
+    async def test_async_middleware(self):
+        async def view(request):
+            self.router.db_for_write(Booking)
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().post("/"))
+        self.assertIn(ReadYourWritesMiddleware.cookie_name, response.cookies)
+
+        # Синхронное представление за async-цепочкой Django выполняет в потоке
+        @sync_to_async
+        def sync_view(request):
+            self.router.db_for_write(Booking)
+            return HttpResponse()
+
+        response = await ReadYourWritesMiddleware(sync_view)(RequestFactory().post("/"))
+        self.assertIn(ReadYourWritesMiddleware.cookie_name, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class PrimaryReplicaTransactionTestCase(TestCase):
+    "Reads inside a transaction on the primary"
+
+    def test_atomic_reads_use_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Booking), "default")
+
+
+async def call_asgi(app, method="POST", path="/telegram/webhook/", body=b"", headers=()):
+    "Один HTTP-запрос к ASGI-приложению: (статус, тело)"
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+class WebhookTestCase(SimpleTestCase):
+    "Webhook and update queue Test"
+
+    def message(self, update_id, chat_id):
+        return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": str(update_id)}}
+
+    def test_update_chat_id(self):
+        self.assertEqual(update_chat_id(self.message(1, 10)), 10)
+        self.assertEqual(update_chat_id({"update_id": 2, "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": 11}}}}), 11)
+        self.assertEqual(update_chat_id({"update_id": 3, "callback_query": {"from": {"id": 7}}}), 7)
+        self.assertEqual(update_chat_id({"update_id": 4, "poll_answer": {"user": {"id": 5}}}), 5)
+        self.assertIsNone(update_chat_id({"update_id": 5, "poll": {"id": "x"}}))
+
+    async def test_per_chat_order_and_parallel_chats(self):
+        handled = defaultdict(list)
+        active = set()
+        overlap = []
+
+        async def handler(update):
+            chat_id = update["message"]["chat"]["id"]
+            self.assertNotIn(chat_id, active)
+            active.add(chat_id)
+            overlap.append(len(active))
+            await asyncio.sleep(random.random() / 1000)
+            handled[chat_id].append(update["update_id"])
+            active.discard(chat_id)
+
+        pool = UpdateWorkerPool(handler, workers=8, maxsize=50)
+        pool.start()
+        for update_id in range(200):
+            await pool.queue.put(self.message(update_id, update_id % 5))
+        await pool.stop()
+        for chat_id in range(5):
+            self.assertEqual(handled[chat_id], list(range(chat_id, 200, 5)))
+        self.assertGreater(max(overlap), 1)
+        self.assertEqual(pool.stats()["processed"], 200)
+
+    async def test_backpressure(self):
+        queue = UpdateQueue(maxsize=2)
+        await queue.put(self.message(1, 1))
+        await queue.put(self.message(2, 2))
+        with self.assertRaises((TimeoutError, asyncio.TimeoutError)):
+            await queue.put(self.message(3, 3), timeout=0.01)
+        key, _ = await queue.get()
+        queue.done(key)
+        await queue.put(self.message(3, 3), timeout=0.01)
+        self.assertEqual(len(queue), 2)
+
+    async def test_failed_handler_does_not_stop_worker(self):
+        async def handler(update):
+            if update["update_id"] == 1:
+                raise ValueError("boom")
+
+        pool = UpdateWorkerPool(handler, workers=1)
+        pool.start()
+        for update_id in range(3):
+            await pool.queue.put(self.message(update_id, 1))
+        with self.assertLogs("bot_admin.updates", "ERROR"):
+            await pool.stop()
+        self.assertEqual((pool.processed, pool.failed), (2, 1))
+
+    async def test_background_tasks(self):
+        events = []
+
+        async def background():
+            events.append("started")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                events.append("stopped")
+
+        pool = UpdateWorkerPool(lambda update: asyncio.sleep(0), workers=1, background=[background])
+        pool.start()
+        await asyncio.sleep(0)
+        self.assertEqual(events, ["started"])
+        await pool.stop()
+        self.assertEqual(events, ["started", "stopped"])
+
+    async def test_webhook_application(self):
+        received = []
+        released = asyncio.Event()
+
+        async def handler(update):
+            await released.wait()
+            received.append(update["update_id"])
+
+        async def django_app(scope, receive, send):  # pylint: disable=W0613
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b"django"})
+
+        pool = UpdateWorkerPool(handler, workers=2, maxsize=1)
+        app = WebhookApplication(django_app, pool, "/telegram/webhook/", secret_token="secret", put_timeout=0.01)
+        token = [(b"x-telegram-bot-api-secret-token", b"secret")]
+        body = json.dumps(self.message(1, 1)).encode()
+        self.assertEqual(await call_asgi(app, body=body, headers=token), (200, b"{}"))
+        self.assertEqual((await call_asgi(app, body=body))[0], 403)
+        self.assertEqual((await call_asgi(app, body=b"{", headers=token))[0], 400)
+        self.assertEqual((await call_asgi(app, method="GET", headers=token))[0], 405)
+        self.assertEqual(await call_asgi(app, method="GET", path="/admin/"), (404, b"django"))
+        # Очередь на одно обновление занята: Telegram получит 503 и повторит доставку
+        self.assertEqual((await call_asgi(app, body=json.dumps(self.message(2, 2)).encode(), headers=token))[0], 503)
+        released.set()
+        await pool.stop()
+        self.assertEqual(received, [1])
+
+    async def test_body_size_limit(self):
+        pool = UpdateWorkerPool(lambda update: asyncio.sleep(0), workers=1)
+        app = WebhookApplication(None, pool, "/telegram/webhook/", max_body=128)
+        body = json.dumps({**self.message(1, 1), "padding": "x" * 128}).encode()
+        self.assertEqual((await call_asgi(app, body=body))[0], 413)
+        self.assertEqual((await call_asgi(app, body=b"{}", headers=[(b"content-length", b"129")]))[0], 413)
+        self.assertEqual((await call_asgi(app, body=json.dumps(self.message(1, 1)).encode()))[0], 200)
+        await pool.stop()
+
+    def test_secret_required(self):
+        with override_settings(TELEGRAM_WEBHOOK_HANDLER="bot_admin.tests.call_asgi", TELEGRAM_WEBHOOK_SECRET=""):
+            with self.assertRaises(ImproperlyConfigured):
+                webhook_application(None)
+        with override_settings(TELEGRAM_WEBHOOK_HANDLER="", TELEGRAM_WEBHOOK_SECRET=""):
+            self.assertIsNone(webhook_application(None))
+
+    async def test_lifespan(self):
+        pool = UpdateWorkerPool(lambda update: asyncio.sleep(0), workers=2)
+        app = WebhookApplication(None, pool, "/hook/")
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+            if message["type"] == "lifespan.startup.complete":
+                self.assertTrue(pool.running)
+
+        await app({"type": "lifespan"}, receive, send)
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertFalse(pool.running)
+
+
+class ShardingTestCase(SimpleTestCase):
+    "Sharding by chat id Test"
+
+    def message(self, update_id, chat_id):
+        return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}}}
+
+    def test_shard_for_is_stable(self):
+        shards = [shard_for(self.message(update_id, 12345), 4) for update_id in range(10)]
+        self.assertEqual(len(set(shards)), 1)
+        spread = {shard_for(self.message(0, chat_id), 4) for chat_id in range(100)}
+        self.assertEqual(spread, {0, 1, 2, 3})
+
+    def test_broker_round_trip(self):
+        context = multiprocessing.get_context("fork")
+        broker_process = context.Process(target=serve_broker, args=("127.0.0.1:50771", b"test"), daemon=True)
+        broker_process.start()
+        self.addCleanup(broker_process.terminate)
+        handled = defaultdict(list)
+
+        def handler_for(shard):
+            async def handle(update):
+                await asyncio.sleep(random.random() / 1000)
+                handled[update["message"]["chat"]["id"]].append((shard, update["update_id"]))
+
+            return handle
+
+        async def exchange():
+            publisher = ShardPublisher(ShardBroker("127.0.0.1:50771", b"test"), 3)
+            consumers = [consume_shard(ShardBroker("127.0.0.1:50771", b"test"), shard, handler_for(shard), workers=4) for shard in range(3)]
+            tasks = [asyncio.ensure_future(consumer) for consumer in consumers]
+            for update_id in range(60):
+                await publisher(self.message(update_id, update_id % 7))
+            for shard in range(3):
+                await asyncio.to_thread(publisher.broker.put, shard, None)
+            return await asyncio.gather(*tasks)
+
+        stats = asyncio.run(exchange())
+        self.assertEqual(sum(item["processed"] for item in stats), 60)
+        for chat_id, entries in handled.items():
+            self.assertEqual(len({shard for shard, _ in entries}), 1)
+            self.assertEqual([update_id for _, update_id in entries], list(range(chat_id, 60, 7)))
+
+    def test_fsm_storage_must_be_shared(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_fsm_storage(2)
+        check_fsm_storage(1)
+        with self.assertRaises(CommandError):
+            call_command("run_shards", shards=2)
+
+    def test_authkey_required(self):
+        with override_settings(TELEGRAM_SHARD_AUTHKEY=""):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shard_authkey(2)
+            check_shard_authkey(1)
+        with override_settings(TELEGRAM_SHARD_AUTHKEY="shared"):
+            check_shard_authkey(2)
+
+
+class DjangoCacheStorageTestCase(SimpleTestCase):
+    "DjangoCacheStorage Test"
+
+    class Booking(StatesGroup):  # pylint: disable=R0903
+        "Booking states"
+
+        date = State()
+
+    def setUp(self):
+        self.key = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+    def tearDown(self):
+        caches[settings.FSM_CACHE_ALIAS].clear()
+
+    async def test_state_and_data_are_shared(self):
+        first, second = DjangoCacheStorage(), DjangoCacheStorage()
+        await first.set_state(self.key, self.Booking.date)
+        await first.update_data(self.key, {"location_id": 5})
+        self.assertEqual(await second.get_state(self.key), "Booking:date")
+        self.assertEqual(await second.get_data(self.key), {"location_id": 5})
+        self.assertEqual(await second.get_value(self.key, "location_id"), 5)
+        self.assertIsNone(await second.get_state(StorageKey(bot_id=1, chat_id=11, user_id=11)))
+        await second.set_state(self.key, None)
+        await second.set_data(self.key, {})
+        self.assertIsNone(await first.get_state(self.key))
+        self.assertEqual(await first.get_data(self.key), {})
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    "TokenBucket Test"
+
+    def test_rate_and_pause(self):
+        now = [0.0]
+        bucket = TokenBucket(2.0, capacity=2.0, clock=lambda: now[0])
+        bucket.take()
+        bucket.take()
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+        now[0] = 0.5
+        self.assertEqual(bucket.delay(), 0.0)
+        bucket.pause(3)
+        self.assertAlmostEqual(bucket.delay(), 3.5)
+        now[0] = 10.0
+        self.assertTrue(bucket.full)
+
+
+class SendSchedulerTestCase(TestCase):
+    "SendScheduler Test"
+
+    async def send_all(self, api, **options):
+        bot = api.bot()
+        try:
+            return await SendScheduler(bot, **options).run(until_idle=True)
+        finally:
+            await bot.session.close()
+
+    async def test_priority_and_rate_limits(self):
+        for number in range(3):
+            await aenqueue(100, priority=OutboundMessage.PRIORITY_REMINDER, text=f"reminder {number}")
+        await aenqueue(200, priority=OutboundMessage.PRIORITY_REMINDER, text="reminder")
+        await aenqueue(100, priority=OutboundMessage.PRIORITY_BOOKING, text="confirmed")
+        async with FakeBotAPI() as api:
+            stats = await self.send_all(api, global_rate=50.0, chat_rate=10.0)
+        self.assertEqual(stats["sent"], 5)
+        calls = api.calls["sendMessage"]
+        self.assertEqual(calls[0]["text"], "confirmed")
+        chat_calls = [call for call in calls if call["chat_id"] == "100"]
+        self.assertEqual([call["text"] for call in chat_calls], ["confirmed", "reminder 0", "reminder 1", "reminder 2"])
+        for previous, following in zip(chat_calls, chat_calls[1:]):
+            self.assertGreater(following["at"] - previous["at"], 0.09)
+        for previous, following in zip(calls, calls[1:]):
+            self.assertGreater(following["at"] - previous["at"], 0.018)
+        self.assertFalse(await OutboundMessage.objects.exclude(status=OutboundMessage.STATUS_SENT).aexists())
+
+    async def test_retry_after(self):
+        await aenqueue(100, text="hello")
+        async with FakeBotAPI() as api:
+            api.errors["sendMessage"].append((429, {"description": "Too Many Requests", "parameters": {"retry_after": 1}}))
+            stats = await self.send_all(api, chat_rate=100.0)
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["sent"], 1)
+        first, second = api.calls["sendMessage"]
+        self.assertGreaterEqual(second["at"] - first["at"], 1.0)
+        message = await OutboundMessage.objects.aget()
+        self.assertEqual((message.status, message.attempts), (OutboundMessage.STATUS_SENT, 1))
+
+    async def test_unknown_method_fails_at_once(self):
+        with self.assertRaises(ValueError):
+            await aenqueue(100, method="sendTelepathy", text="hello")
+        message = await OutboundMessage.objects.acreate(chat_id=100, method="sendTelepathy", payload={"text": "hello"})
+        async with FakeBotAPI() as api:
+            stats = await self.send_all(api)
+        self.assertEqual((stats["failed"], stats["retried"]), (1, 0))
+        await message.arefresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboundMessage.STATUS_FAILED, 1))
+        self.assertIn("sendTelepathy", message.last_error)
+
+    async def test_persistent_retry(self):
+        message = await sync_to_async(enqueue)(100, text="hello")
+        blocked = await aenqueue(300, text="blocked")
+        async with FakeBotAPI() as api:
+            api.errors["sendMessage"].append((500, {"description": "Internal Server Error"}))
+            api.errors["sendMessage"].append((403, {"description": "Forbidden: bot was blocked by the user"}))
+            stats = await self.send_all(api, concurrency=1, retry_delay=60.0)
+            self.assertEqual((stats["retried"], stats["failed"]), (1, 1))
+            await message.arefresh_from_db()
+            await blocked.arefresh_from_db()
+            self.assertEqual((message.status, message.attempts), (OutboundMessage.STATUS_PENDING, 1))
+            self.assertGreater(message.next_attempt_at, timezone.now() + datetime.timedelta(seconds=50))
+            self.assertEqual(blocked.status, OutboundMessage.STATUS_FAILED)
+            self.assertIn("blocked", blocked.last_error)
+            # Перезапуск планировщика подхватывает сообщение из базы
+            await OutboundMessage.objects.filter(pk=message.pk).aupdate(next_attempt_at=timezone.now())
+            stats = await self.send_all(api)
+        self.assertEqual(stats["sent"], 1)
+        await message.arefresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboundMessage.STATUS_SENT, 2))
+        self.assertIsNotNone(message.sent_at)
+
+
+class TimingWheelTestCase(SimpleTestCase):
+    "TimingWheel Test"
+
+    def test_timers_fire_once_on_time(self):
+        wheel = TimingWheel(tick=1.0, slots=(8, 8, 8), start=1000.0)
+        rng = random.Random(7)
+        timers = {key: 1000.0 + rng.uniform(0, 500) for key in range(300)}
+        for key, when in timers.items():
+            self.assertTrue(wheel.add(key, when, when))
+        self.assertFalse(wheel.add("far", 1000.0 + 512))
+        wheel.remove(0)
+        del timers[0]
+        fired = {}
+        now = 1000.0
+        while now < 1600.0:
+            now += rng.uniform(0.1, 20)
+            for key, when in wheel.advance(now):
+                self.assertNotIn(key, fired)
+                self.assertLessEqual(when, now)
+                fired[key] = now
+        self.assertEqual(set(fired), set(timers))
+        self.assertEqual(len(wheel), 0)
+
+    def test_reschedule_and_overdue(self):
+        wheel = TimingWheel(start=0.0)
+        wheel.add("a", 100.0)
+        wheel.add("a", 5.0)
+        wheel.add("late", -10.0)
+        self.assertEqual([key for key, _ in wheel.advance(1.0)], ["late"])
+        self.assertEqual([key for key, _ in wheel.advance(5.0)], ["a"])
+        self.assertEqual(wheel.advance(200.0), [])
+
+
+class ReminderSchedulerTestCase(TestCase):
+    "ReminderScheduler Test"
+
+    def setUp(self):
+        self.location = ServiceLocation.objects.create(name="Room", city="Москва", capacity=5)
+        self.user = TelegramUser.objects.create(telegram_id=100, first_name="User")
+        self.now = timezone.now()
+        self.clock = [self.now]
+
+    def book(self, hours):
+        start = self.now + datetime.timedelta(hours=hours)
+        with self.captureOnCommitCallbacks(execute=True):
+            return reserve(self.location, start, start + datetime.timedelta(hours=1), user=self.user)
+
+    def scheduler(self):
+        "Общий планировщик процесса, как после перезапуска"
+        defaults = (reminders.horizon, reminders.reload, reminders.now)
+        self.addCleanup(self.restore, *defaults)
+        reminders.clear()
+        reminders.horizon, reminders.reload = datetime.timedelta(hours=3), datetime.timedelta(hours=1)
+        reminders.now = lambda: self.clock[0]
+        return reminders
+
+    def restore(self, horizon, reload, now):
+        reminders.clear()
+        reminders.horizon, reminders.reload, reminders.now = horizon, reload, now
+
+    def advance(self, scheduler, **delta):
+        self.clock[0] += datetime.timedelta(**delta)
+        return scheduler.tick_once()
+
+    @override_settings(BOOKING_REMINDER_LEADS=[1440, 60])
+    def test_reminders_are_sent_once(self):
+        soon, later, cancelled = self.book(2), self.book(26), self.book(2.5)
+        # Напоминание за сутки для ближайшего бронирования уже в прошлом
+        self.assertEqual(soon.next_reminder_at, soon.start - datetime.timedelta(hours=1))
+        self.assertEqual(later.next_reminder_at, later.start - datetime.timedelta(hours=24))
+        self.assertEqual(next_reminder_time(later.start, later.next_reminder_at), later.start - datetime.timedelta(hours=1))
+        scheduler = self.scheduler()
+        scheduler.load()
+        self.assertEqual(len(scheduler), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel(cancelled)
+        self.assertEqual(len(scheduler), 2)
+        self.assertEqual(self.advance(scheduler, minutes=59), 0)
+        with self.assertNumQueries(0):
+            self.advance(scheduler, seconds=50)
+        self.assertEqual(self.advance(scheduler, minutes=1, seconds=10), 1)
+        message = OutboundMessage.objects.get()
+        self.assertEqual((message.chat_id, message.priority), (100, OutboundMessage.PRIORITY_REMINDER))
+        self.assertIn("Room", message.payload["text"])
+        soon.refresh_from_db()
+        self.assertIsNone(soon.next_reminder_at)
+        # Перезапуск: отправленное напоминание не повторяется, суточное загружается по горизонту
+        restarted = self.scheduler()
+        self.assertEqual(self.advance(restarted, minutes=10), 0)
+        self.advance(restarted, hours=1, minutes=30)
+        self.assertEqual(OutboundMessage.objects.count(), 2)
+        later.refresh_from_db()
+        self.assertEqual(later.next_reminder_at, later.start - datetime.timedelta(hours=1))
+        self.assertEqual(restarted.stats()["sent"], 2)
+
+    @override_settings(BOOKING_REMINDER_LEADS=[60])
+    def test_stale_timer_is_skipped(self):
+        booking = self.book(1.5)
+        scheduler = self.scheduler()
+        scheduler.load()
+        # Отмена в другом процессе: сигнал сюда не доходит
+        Booking.objects.filter(pk=booking.pk).update(status=Booking.STATUS_CANCELLED)
+        self.assertEqual(self.advance(scheduler, minutes=31), 1)
+        self.assertEqual(scheduler.stats()["skipped"], 1)
+        self.assertFalse(OutboundMessage.objects.exists())
+
+
+class OccupancyTestCase(TestCase):
+    "Occupancy aggregates Test"
+
+    def setUp(self):
+        schedule_cache.clear()
+        self.location = ServiceLocation.objects.create(name="Room", city="Москва", capacity=2)
+        self.location.available_days.add(
+            *[WorkDay.objects.create(day=day, start_time=datetime.time(9, 0), end_time=datetime.time(18, 0)) for day in range(7)]
+        )
+        self.day = datetime.date(2025, 9, 1)
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(hour, minute)))
+
+    def test_hourly_minutes(self):
+        self.assertEqual(hourly_minutes(self.at(10, 30), self.at(12, 15)), [(self.day, 10, 30), (self.day, 11, 60), (self.day, 12, 15)])
+        self.assertEqual(
+            hourly_minutes(self.at(23, 30), self.at(23, 30) + datetime.timedelta(hours=1))[-1], (datetime.date(2025, 9, 2), 0, 30)
+        )
+
+    def test_incremental_updates_match_recompute(self):
+        first = reserve(self.location, self.at(10, 30), self.at(12, 15))
+        second = reserve(self.location, self.at(11), self.at(12))
+        self.assertEqual(stored()[self.location.pk, self.day, 11], (120, 2))
+        second.start, second.end = self.at(14), self.at(15)
+        second.save()
+        cancel(first)
+        reserve(self.location, self.at(9), self.at(10))
+        Booking.objects.get(start=self.at(9)).delete()
+        self.assertEqual(stored(), {(self.location.pk, self.day, 14): (60, 1)})
+        self.assertEqual(stored(), recompute())
+        self.assertEqual(check(), [])
+
+    def test_rows_created_by_another_writer(self):
+        # Строку часа успела создать параллельная транзакция без блокировки места
+        OccupancyHour.objects.create(location=self.location, date=self.day, hour=10, booked_minutes=30, bookings=1)
+        booking = Booking.objects.create(location=self.location, start=self.at(10), end=self.at(11))
+        self.assertEqual(stored()[self.location.pk, self.day, 10], (90, 2))
+        cancel(booking)
+        self.assertEqual(stored()[self.location.pk, self.day, 10], (30, 1))
+
+    def test_checker_and_backfill(self):
+        booking = reserve(self.location, self.at(10), self.at(11, 30))
+        # Запись в обход сигналов
+        Booking.objects.filter(pk=booking.pk).update(end=self.at(12))
+        mismatches = check([self.location.pk])
+        self.assertEqual([(item.hour, item.expected, item.actual) for item in mismatches], [(11, (60, 1), (30, 1))])
+        with self.assertRaises(CommandError):
+            call_command("check_occupancy", stdout=io.StringIO())
+        call_command("check_occupancy", fix=True, stdout=io.StringIO())
+        self.assertEqual(check(), [])
+        OccupancyHour.objects.all().delete()
+        call_command("backfill_occupancy", since=self.day, stdout=io.StringIO())
+        self.assertEqual(stored(), {(self.location.pk, self.day, 10): (60, 1), (self.location.pk, self.day, 11): (60, 1)})
+
+    def test_utilization_reads_aggregates(self):
+        reserve(self.location, self.at(10), self.at(12))
+        reserve(self.location, self.at(10), self.at(11))
+        # Вместимость, расписание (schedule_cache) и агрегаты
+        with self.assertNumQueries(3):
+            result = daily_utilization([self.location.pk], self.day, self.day)
+        # 180 минут из 9 часов работы при вместимости 2
+        self.assertAlmostEqual(result[self.location.pk][self.day], 180 / 1080)
+
+
+class ExportTestCase(TestCase):
+    "Streaming export Test"
+
+    def setUp(self):
+        self.location = ServiceLocation.objects.create(name="Room", city="Москва", capacity=3, latitude="55.750000", longitude="37.620000")
+        self.user = TelegramUser.objects.create(telegram_id=100, first_name="=HYPERLINK(1)", is_premium=True)
+        start = timezone.make_aware(datetime.datetime(2025, 9, 1, 10, 0))
+        for hour in range(3):
+            Booking.objects.create(location=self.location, user=self.user, start=start, end=start + datetime.timedelta(hours=hour + 1))
+
+    def sheet_rows(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            root = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        namespace = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        return [
+            ["".join(cell.itertext()) for cell in row.findall("x:c", namespace)]
+            for row in root.find("x:sheetData", namespace).findall("x:row", namespace)
+        ]
+
+    def test_csv(self):
+        data = b"".join(export.export_chunks("bookings", "csv")).decode("utf-8-sig")
+        rows = list(csv.reader(io.StringIO(data)))
+        self.assertEqual(rows[0], ["ID", "Место", "Telegram ID", "Начало", "Окончание", "Статус", "Создано"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:6], ["Room", "100", "01.09.2025 10:00", "01.09.2025 11:00", "Подтверждено"])
+        users = list(csv.reader(io.StringIO(b"".join(export.export_chunks("users", "csv")).decode("utf-8-sig"))))
+        self.assertEqual(users[1][2], "'=HYPERLINK(1)")
+
+    def test_xlsx(self):
+        rows = self.sheet_rows(b"".join(export.export_chunks("locations", "xlsx")))
+        self.assertEqual(rows[0][:3], ["ID", "Название", "Город"])
+        self.assertEqual(rows[1][1:7], ["Room", "Москва", "", "55.750000", "37.620000", "3"])
+        users = self.sheet_rows(b"".join(export.export_chunks("users", "xlsx")))
+        self.assertEqual(users[1][2], "=HYPERLINK(1)")
+
+    def test_output_is_streamed_in_chunks(self):
+        self.addCleanup(setattr, export, "FLUSH_BYTES", export.FLUSH_BYTES)
+        export.FLUSH_BYTES = 100
+        TelegramUser.objects.bulk_create(TelegramUser(telegram_id=1000 + number, first_name=f"User {number}") for number in range(200))
+        with self.assertNumQueries(1):
+            chunks = list(export.export_chunks("users", "csv", chunk_size=50))
+        self.assertGreater(len(chunks), 10)
+        # Сжатые данные XLSX zlib отдаёт блоками, поэтому порций меньше
+        with self.assertNumQueries(1):
+            chunks = list(export.export_chunks("users", "xlsx", chunk_size=50))
+        self.assertEqual(len(self.sheet_rows(b"".join(chunks))), 202)
+        # Порог порции считается в байтах UTF-8, а не в символах
+        buffer = export._Buffer()  # pylint: disable=W0212
+        buffer.write("Москва")
+        self.assertEqual(buffer.size, 12)
+
+    async def test_async_response(self):
+        response = export.export_response("bookings", "csv", asynchronous=True)
+        self.assertTrue(response.is_async)
+        data = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8-sig")
+        self.assertEqual(len(list(csv.reader(io.StringIO(data)))), 4)
+
+    def test_admin_action_and_command(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("admin:bot_admin_booking_changelist"),
+            {"action": "export_xlsx", "_selected_action": list(Booking.objects.values_list("pk", flat=True)[:2])},
+            secure=True,
+        )
+        self.assertEqual(response["Content-Type"], export.CONTENT_TYPES["xlsx"])
+        self.assertIn("bookings-", response["Content-Disposition"])
+        self.assertEqual(len(self.sheet_rows(b"".join(response.streaming_content))), 3)
+        with tempfile.NamedTemporaryFile(suffix=".csv") as output:
+            call_command("export_data", "locations", output=output.name)
+            with open(output.name, encoding="utf-8-sig") as exported:
+                self.assertIn("Room", exported.read())
+
+
+class LocationImportTestCase(TestCase):
+    "Bulk location import Test"
+
+    CSV = (
+        "name,city,latitude,longitude,capacity,schedule\n"
+        "Room A,Москва,55.75,37.62,2,Пн 09:00-18:00; Вт 09:00-18:00\n"
+        "Room B,Казань,,,,Суббота; 6 10:00-14:00\n"
+    )
+
+    def rows(self, count, schedule="Пн 09:00-18:00; Ср 10:00-12:00"):
+        return [{"name": f"Room {number}", "city": "Москва", "schedule": schedule} for number in range(count)]
+
+    def test_csv(self):
+        existing = WorkDay.objects.create(day=0, start_time=datetime.time(9), end_time=datetime.time(18))
+        result = import_locations(read_rows(self.CSV.encode("utf-8-sig"), "csv"))
+        self.assertEqual((result.locations, result.workdays, result.links), (2, 3, 4))
+        room_a = ServiceLocation.objects.get(name="Room A")
+        self.assertEqual(room_a.capacity, 2)
+        self.assertEqual(str(room_a.latitude), "55.750000")
+        self.assertIn(existing, room_a.available_days.all())
+        room_b = ServiceLocation.objects.get(name="Room B")
+        self.assertIsNone(room_b.latitude)
+        self.assertEqual(room_b.capacity, 1)
+        self.assertEqual(sorted(room_b.available_days.values_list("day", "start_time")), [(5, None), (6, datetime.time(10))])
+
+    def test_invalid_rows_import_nothing(self):
+        rows = read_rows(json.dumps([{"name": "Ok"}, {"name": "", "capacity": 0}, {"name": "Bad", "schedule": "Пн 18:00-09:00"}]), "json")
+        with self.assertRaises(LocationImportError) as raised:
+            import_locations(rows)
+        self.assertEqual([error.row for error in raised.exception.errors], [2, 3])
+        self.assertIn("capacity", str(raised.exception.errors[0]))
+        self.assertFalse(ServiceLocation.objects.exists())
+
+    def test_query_count_does_not_grow(self):
+        self.assertEqual(import_locations(self.rows(1)).workdays, 2)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(import_locations(self.rows(5)).workdays, 0)
+        with CaptureQueriesContext(connection) as large:
+            import_locations(self.rows(60))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(WorkDay.objects.count(), 2)
+        self.assertEqual(ServiceLocation.available_days.through.objects.count(), 132)
+        # Порции по chunk_size добавляют запросы на порцию, а не на строку
+        with CaptureQueriesContext(connection) as chunked:
+            import_locations(self.rows(60), chunk_size=30)
+        self.assertEqual(len(chunked) - len(large), 3)
+
+    def test_indexes_updated_on_commit(self):
+        self.addCleanup(geo_index.__init__)
+        geo_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_locations([{"name": "Geo", "latitude": "55.75", "longitude": "37.62"}])
+        self.assertEqual(geo_index.nearest(55.75, 37.62, 1)[0][1], result.location_ids[0])
+
+    def test_command_and_admin(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as source:
+            source.write(self.CSV)
+            source.flush()
+            output = io.StringIO()
+            call_command("import_locations", source.name, stdout=output)
+        self.assertIn("Imported 2 locations", output.getvalue())
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as source:
+            source.write('[{"name": ""}]')
+            source.flush()
+            with self.assertRaises(CommandError):
+                call_command("import_locations", source.name, stderr=io.StringIO())
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+        url = reverse("admin:bot_admin_servicelocation_import")
+        self.assertContains(self.client.get(reverse("admin:bot_admin_servicelocation_changelist"), secure=True), url)
+        upload = io.BytesIO(json.dumps(self.rows(3)).encode())
+        upload.name = "locations.json"
+        response = self.client.post(url, {"file": upload, "fmt": "json"}, secure=True)
+        self.assertRedirects(response, reverse("admin:bot_admin_servicelocation_changelist"), fetch_redirect_response=False)
+        self.assertEqual(ServiceLocation.objects.count(), 5)
+        upload = io.BytesIO(b"[{}]")
+        upload.name = "locations.json"
+        response = self.client.post(url, {"file": upload, "fmt": "json"}, secure=True)
+        self.assertContains(response, "row 1")
+
+
+class MetricsTestCase(TestCase):
+    "Instrumentation and metrics endpoint Test"
+
+    def setUp(self):
+        # По умолчанию METRICS_ENABLED выключен, и обёртка запросов не ставится
+        if query_metrics not in connection.execute_wrappers:
+            install_query_metrics(None, connection)
+            self.addCleanup(connection.execute_wrappers.remove, query_metrics)
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "Test", ("kind",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, "a")
+        self.assertEqual(histogram.count("a"), 4)
+        self.assertAlmostEqual(histogram.total("a"), 4.05)
+        self.assertEqual(
+            histogram.samples(),
+            [
+                'test_seconds_bucket{kind="a",le="0.1"} 1',
+                'test_seconds_bucket{kind="a",le="1.0"} 3',
+                'test_seconds_bucket{kind="a",le="+Inf"} 4',
+                'test_seconds_sum{kind="a"} 4.05',
+                'test_seconds_count{kind="a"} 4',
+            ],
+        )
+
+    def test_sql_operation(self):
+        self.assertEqual(sql_operation(' SELECT "x" FROM y'), "select")
+        self.assertEqual(sql_operation("SAVEPOINT s1"), "savepoint")
+        self.assertEqual(sql_operation("PRAGMA foreign_keys"), "other")
+
+    def test_query_wrapper(self):
+        before = DB_QUERY_SECONDS.count("default", "select")
+        calls = CALL_SECONDS.count("location.is_available")
+        location = ServiceLocation.objects.create(name="Room")
+        with count_queries() as queries:
+            list(ServiceLocation.objects.all())
+            location.is_available(datetime.date(2025, 9, 1), datetime.time(10))
+        self.assertEqual(queries[0], 2)
+        self.assertEqual(DB_QUERY_SECONDS.count("default", "select"), before + 2)
+        self.assertEqual(CALL_SECONDS.count("location.is_available"), calls + 1)
+
+    async def test_middlewares(self):
+        async def handler(event, data):  # pylint: disable=W0613
+            await sync_to_async(ServiceLocation.objects.count)()
+            return await sync_to_async(ServiceLocation.objects.exists)()
+
+        async def failing(event, data):
+            raise ValueError("boom")
+
+        update = Update.model_validate({"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}})
+        count = UPDATE_QUERIES.count("message")
+        queries = UPDATE_QUERIES.total("message")
+        self.assertFalse(await UpdateMetricsMiddleware()(handler, update, {}))
+        self.assertEqual(UPDATE_QUERIES.count("message"), count + 1)
+        self.assertEqual(UPDATE_QUERIES.total("message") - queries, 2)
+
+        with self.assertRaises(ValueError):
+            await HandlerMetricsMiddleware()(failing, update.message, {"handler": SimpleNamespace(callback=failing)})
+        self.assertIn(f'handler="{__name__}.{failing.__qualname__}",status="error"', registry.render())
+
+    async def test_endpoint(self):
+        async def django_app(scope, receive, send):  # pylint: disable=W0613
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b"django"})
+
+        metrics = MetricsApplication(django_app, token="secret")
+        self.assertEqual(await call_asgi(metrics, method="GET", path="/admin/"), (404, b"django"))
+        self.assertEqual((await call_asgi(metrics, method="GET", path="/metrics"))[0], 403)
+        self.assertEqual((await call_asgi(metrics, method="POST", path="/metrics"))[0], 405)
+        status, body = await call_asgi(metrics, method="GET", path="/metrics", headers=[(b"authorization", b"Bearer secret")])
+        self.assertEqual(status, 200)
+        text = body.decode()
+        self.assertIn("# TYPE sba_db_query_seconds histogram", text)
+        self.assertIn('sba_http_requests_total{status="404"}', text)
+        self.assertIn("sba_schedule_cache_hit_ratio ", text)
+        self.assertIn("sba_reminders_scheduled ", text)
+
+    def test_token_required(self):
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN=""):
+            with self.assertRaises(ImproperlyConfigured):
+                metrics_application(None)
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN="secret"):
+            self.assertEqual(metrics_application(None).token, b"secret")
+        with override_settings(METRICS_ENABLED=False):
+            self.assertIsNone(metrics_application(None))
+
+
+class LocationSnapshotTestCase(TestCase):
+    "Location snapshot Test"
+
+    def setUp(self):
+        self.monday = WorkDay.objects.create(day=0, start_time=datetime.time(9), end_time=datetime.time(18))
+        self.sunday = WorkDay.objects.create(day=6)
+        self.room = ServiceLocation.objects.create(
+            name="Room", city="Москва", rest_of_address="ул. Ленина, 1", latitude="55.750000", capacity=2
+        )
+        self.room.available_days.set([self.monday, self.sunday])
+        self.hall = ServiceLocation.objects.create(name="Hall")
+        self.hall.available_days.set([self.monday])
+        self.open_air = ServiceLocation.objects.create(name="Open air")
+
+    def test_bulk_from_one_query(self):
+        working_hours = self.room.get_working_hours()
+        with self.assertNumQueries(1):
+            located = snapshots.location_snapshots()
+        self.assertEqual(len(located), 3)
+        room, hall, open_air = located[0], located[1], located[2]
+        with self.assertNumQueries(0):
+            self.assertEqual((room.id, room.capacity, room.latitude), (self.room.pk, 2, Decimal("55.750000")))
+            self.assertEqual(room.get_address(), self.room.get_address())
+            self.assertEqual(room.get_working_hours(), working_hours)
+            self.assertEqual(open_air.schedule, ())
+            # Одинаковые интервалы разных мест — один объект
+            self.assertIs(room.schedule[0], hall.schedule[0])
+            monday, sunday = datetime.date(2025, 9, 1), datetime.date(2025, 9, 7)
+            self.assertTrue(room.is_available(monday, datetime.time(10)))
+            self.assertFalse(hall.is_available(monday, datetime.time(19)))
+            self.assertTrue(room.is_available(sunday, datetime.time(23)))
+            self.assertFalse(hall.is_available(sunday, datetime.time(12)))
+            self.assertTrue(open_air.is_available(sunday, datetime.time(3)))
+            self.assertEqual(room.open_minutes(0), 540)
+
+    def test_frozen_and_round_trip(self):
+        room = snapshots.location_snapshots(ServiceLocation.objects.filter(pk=self.room.pk))[0]
+        with self.assertRaises(ValueError):
+            room.name = "Other"
+        room.is_available(datetime.date(2025, 9, 1), datetime.time(10))
+        data = snapshots.dumps(snapshots.location_snapshots())
+        self.assertIsInstance(data, bytes)
+        restored = snapshots.loads(data)
+        self.assertEqual(restored, snapshots.location_snapshots())
+        self.assertEqual(restored[0], room)
+        self.assertEqual(hash(restored[0]), hash(room))
+        self.assertEqual(restored[0].schedule[0].start_time, datetime.time(9))
+
+    def test_filtered_by_schedule(self):
+        tuesday = WorkDay.objects.create(day=1, start_time=datetime.time(10), end_time=datetime.time(16))
+        self.hall.available_days.add(tuesday)
+        # Фильтр по расписанию выбирает места, но не обрезает их расписание
+        with self.assertNumQueries(1):
+            located = snapshots.location_snapshots(ServiceLocation.objects.filter(name="Hall", available_days__day=0))
+        self.assertEqual([[entry.day for entry in snapshot.schedule] for snapshot in located], [[0, 1]])
+        self.assertEqual(
+            [snapshot.name for snapshot in snapshots.location_snapshots(ServiceLocation.objects.order_by("-pk")[:2])], ["Hall", "Open air"]
+        )
+
+    async def test_repository(self):
+        result = await locations.asnapshots(name__in=["Room", "Hall"])
+        self.assertEqual([snapshot.name for snapshot in result], ["Room", "Hall"])
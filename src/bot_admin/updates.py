@@ -0,0 +1,190 @@
+"""Очередь обновлений Telegram с порядком внутри чата и пул воркеров для их обработки"""
+
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Поля Update, из которых берётся чат (или пользователь) для упорядочивания
+UPDATE_CHAT_PATHS = (
+    ("message", "chat"),
+    ("edited_message", "chat"),
+    ("channel_post", "chat"),
+    ("edited_channel_post", "chat"),
+    ("business_message", "chat"),
+    ("callback_query", "message", "chat"),
+    ("callback_query", "from"),
+    ("inline_query", "from"),
+    ("chosen_inline_result", "from"),
+    ("shipping_query", "from"),
+    ("pre_checkout_query", "from"),
+    ("my_chat_member", "chat"),
+    ("chat_member", "chat"),
+    ("chat_join_request", "chat"),
+    ("message_reaction", "chat"),
+    ("poll_answer", "user"),
+)
+
+
+def update_chat_id(update):
+    """
+    id чата (или пользователя) обновления; None, если обновление ни к кому не относится
+    """
+    for path in UPDATE_CHAT_PATHS:
+        value = update
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+            if value is None:
+                break
+        else:
+            return value.get("id")
+    return None
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь обновлений с порядком внутри чата.
+
+    Обновления одного чата выдаются строго по одному: следующее становится
+    доступным после done() для предыдущего. Разные чаты обрабатываются
+    параллельно. put() ждёт освобождения места, когда в очереди maxsize
+    обновлений.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._size = 0
+        self._pending = {}
+        self._busy = set()
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(maxsize)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __len__(self):
+        return self._size
+
+    async def put(self, update, timeout=None):
+        """
+        Добавление обновления; TimeoutError, если место не освободилось за timeout секунд
+        """
+        await asyncio.wait_for(self._slots.acquire(), timeout)
+        chat_id = update_chat_id(update)
+        # Обновления без чата не упорядочиваются между собой
+        key = chat_id if chat_id is not None else ("update", update.get("update_id"))
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+            if key not in self._busy:
+                self._ready.put_nowait(key)
+        queue.append(update)
+        self._size += 1
+        self._idle.clear()
+
+    async def get(self):
+        """
+        (ключ чата, обновление) — следующее обновление чата, который сейчас не обрабатывается
+        """
+        key = await self._ready.get()
+        queue = self._pending[key]
+        update = queue.popleft()
+        if not queue:
+            del self._pending[key]
+        self._busy.add(key)
+        return key, update
+
+    def done(self, key):
+        """
+        Обновление чата обработано: место освобождается, следующее обновление чата становится доступным
+        """
+        self._busy.discard(key)
+        self._size -= 1
+        self._slots.release()
+        if key in self._pending:
+            self._ready.put_nowait(key)
+        if not self._size:
+            self._idle.set()
+
+    async def join(self):
+        """
+        Ожидание обработки всех обновлений
+        """
+        await self._idle.wait()
+
+
+class UpdateWorkerPool:  # pylint: disable=R0902
+    """
+    Воркеры, разбирающие UpdateQueue и передающие обновления в handler(update).
+    background — async-функции без аргументов (например profile_buffer.run),
+    которые работают, пока запущены воркеры, и отменяются после них
+    """
+
+    def __init__(self, handler, workers=32, maxsize=10000, background=()):
+        self.handler = handler
+        self.workers = workers
+        self.background = tuple(background)
+        self.queue = UpdateQueue(maxsize)
+        self.processed = 0
+        self.failed = 0
+        self._tasks = []
+        self._background_tasks = []
+
+    @property
+    def running(self):
+        """
+        Запущены ли воркеры
+        """
+        return bool(self._tasks)
+
+    def start(self):
+        """
+        Запуск воркеров в текущем цикле событий
+        """
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+            self._background_tasks = [asyncio.ensure_future(task()) for task in self.background]
+
+    async def stop(self, drain=True):
+        """
+        Остановка воркеров; при drain — после обработки уже принятых обновлений
+        """
+        if drain and self._tasks:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+
+    async def _work(self):
+        while True:
+            key, update = await self.queue.get()
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except Exception:  # pylint: disable=W0718
+                self.failed += 1
+                logger.exception("Update %s failed", update.get("update_id"))
+            finally:
+                self.queue.done(key)
+
+    def stats(self):
+        """
+        Размер очереди и счётчики обработки
+        """
+        return {"queued": len(self.queue), "maxsize": self.queue.maxsize, "processed": self.processed, "failed": self.failed}
+
+
+def aiogram_handler(dispatcher, bot):
+    """
+    handler для UpdateWorkerPool, передающий обновления в Dispatcher aiogram
+    """
+
+    async def handle(update):
+        await dispatcher.feed_raw_update(bot, update)
+
+    return handle
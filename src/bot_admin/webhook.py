@@ -0,0 +1,148 @@
+"""Приём обновлений Telegram через вебхук ASGI-приложения с передачей в пул воркеров (updates)"""
+
+import asyncio
+import hmac
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .ingest import profile_buffer
+from .metrics import registry
+from .updates import UpdateWorkerPool
+
+
+async def _respond(send, status, body=b""):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class WebhookApplication:  # pylint: disable=R0903
+    """
+    ASGI-приложение: POST на path с обновлением Telegram ставится в очередь
+    и сразу подтверждается, остальные запросы передаются в app.
+
+    Если очередь не освобождается за put_timeout секунд, отвечает 503, и
+    Telegram повторит доставку позже. Тело больше max_body байт отклоняется
+    с 413 без чтения остатка. Воркеры запускаются при lifespan startup или
+    при первом обновлении.
+    """
+
+    def __init__(self, app, pool, path, secret_token="", put_timeout=1.0, max_body=1024 * 1024):  # pylint: disable=R0913,R0917
+        self.app = app
+        self.pool = pool
+        self.path = path
+        self.secret_token = secret_token.encode()
+        self.put_timeout = put_timeout
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == self.path:
+            await self._webhook(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.pool.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.pool.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _reject(self, scope):
+        """
+        Код ответа для запроса, тело которого читать не нужно, или None
+        """
+        if scope["method"] != "POST":
+            return 405
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-telegram-bot-api-secret-token", b"")
+        if self.secret_token and not hmac.compare_digest(token, self.secret_token):
+            return 403
+        length = headers.get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_body:
+            return 413
+        return None
+
+    async def _read(self, receive):
+        """
+        Обновление из тела запроса: (None, обновление) или (код ответа, None)
+        """
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > self.max_body:
+                return 413, None
+            if not message.get("more_body"):
+                break
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400, None
+        return (None, update) if isinstance(update, dict) else (400, None)
+
+    async def _enqueue(self, update):
+        self.pool.start()
+        try:
+            await self.pool.queue.put(update, timeout=self.put_timeout)
+        except (TimeoutError, asyncio.TimeoutError):
+            return 503
+        return 200
+
+    async def _webhook(self, scope, receive, send):
+        status, update = self._reject(scope), None
+        if status is None:
+            status, update = await self._read(receive)
+        if status is None:
+            status = await self._enqueue(update)
+        await _respond(send, status, b"{}" if status == 200 else b"")
+
+
+def webhook_application(app):
+    """
+    Обёртка ASGI-приложения Django вебхуком по настройкам TELEGRAM_WEBHOOK_*.
+    Без TELEGRAM_WEBHOOK_HANDLER возвращает app без изменений; при TELEGRAM_SHARDS > 1
+    обновления публикуются в брокер шардов. Без TELEGRAM_WEBHOOK_SECRET
+    вебхук не запускается: иначе обновления мог бы прислать кто угодно.
+    """
+    if not settings.TELEGRAM_WEBHOOK_HANDLER:
+        return app
+    if not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise ImproperlyConfigured("TELEGRAM_WEBHOOK_SECRET must be set when TELEGRAM_WEBHOOK_HANDLER is set")
+    background = ()
+    if settings.TELEGRAM_SHARDS > 1:
+        # Обработка в процессах шардов (manage.py run_shards), здесь только публикация
+        from .sharding import ShardBroker, ShardPublisher, check_fsm_storage, check_shard_authkey  # pylint: disable=C0415
+
+        check_fsm_storage(settings.TELEGRAM_SHARDS)
+        check_shard_authkey(settings.TELEGRAM_SHARDS)
+        handler = ShardPublisher(
+            ShardBroker(settings.TELEGRAM_SHARD_BROKER, settings.TELEGRAM_SHARD_AUTHKEY.encode()), settings.TELEGRAM_SHARDS
+        )
+    else:
+        handler = import_string(settings.TELEGRAM_WEBHOOK_HANDLER)
+        # Пользователей из обновлений копит ProfileIngestMiddleware, сброс по времени — здесь
+        background = (profile_buffer.run,)
+    pool = UpdateWorkerPool(
+        handler,
+        workers=settings.TELEGRAM_UPDATE_WORKERS,
+        maxsize=settings.TELEGRAM_UPDATE_QUEUE_SIZE,
+        background=background,
+    )
+    registry.register_stats("webhook", pool.stats)
+    return WebhookApplication(
+        app,
+        pool,
+        settings.TELEGRAM_WEBHOOK_PATH,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        put_timeout=settings.TELEGRAM_UPDATE_PUT_TIMEOUT,
+        max_body=settings.TELEGRAM_WEBHOOK_MAX_BODY,
+    )
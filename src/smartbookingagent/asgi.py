@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smartbookingagent.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт после настройки Django
+from bot_admin.metrics import metrics_application  # noqa: E402 pylint: disable=C0413
+from bot_admin.webhook import webhook_application  # noqa: E402 pylint: disable=C0413
+
+application = metrics_application(webhook_application(django_application))
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "bot_admin.routers.ReadYourWritesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -99,13 +100,43 @@ DATABASES = {
         "CONN_HEALTH_CHECKS": env.bool("DATABASE_CONN_HEALTH_CHECKS", default=True),
         "TIME_ZONE": env.str("DATABASE_TIME_ZONE", default="UTC"),
         "CHARSET": env.str("DATABASE_CHARSET", default="UTF8"),
+        "OPTIONS": {},
     },
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # IMMEDIATE берёт блокировку записи в начале транзакции, а не при первой
+            # записи, поэтому конкурентные транзакции ждут busy_timeout вместо ошибки
+            "transaction_mode": env.str("SQLITE_TRANSACTION_MODE", default="IMMEDIATE"),
+            "timeout": env.float("SQLITE_BUSY_TIMEOUT", default=5.0),
+            "init_command": ";".join(
+                [
+                    f"PRAGMA journal_mode={env.str('SQLITE_JOURNAL_MODE', default='WAL')}",
+                    f"PRAGMA synchronous={env.str('SQLITE_SYNCHRONOUS', default='NORMAL')}",
+                    f"PRAGMA busy_timeout={int(env.float('SQLITE_BUSY_TIMEOUT', default=5.0) * 1000)}",
+                    f"PRAGMA mmap_size={env.int('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024)}",
+                ]
+            ),
+        },
     },
 }
 
+# Покрывающие индексы (Index.include) есть только в PostgreSQL; в SQLite
+# неключевые столбцы отбрасываются намеренно
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+# Пул соединений psycopg 3 (pip install "psycopg[binary,pool]"); несовместим с CONN_MAX_AGE
+if env.bool("DATABASE_POOL", default=False):
+    DATABASES["production"]["CONN_MAX_AGE"] = 0
+    DATABASES["production"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=10),
+        "timeout": env.float("DATABASE_POOL_TIMEOUT", default=30.0),
+        "max_idle": env.float("DATABASE_POOL_MAX_IDLE", default=600.0),
+        "max_lifetime": env.float("DATABASE_POOL_MAX_LIFETIME", default=3600.0),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,6 +179,73 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Кэш скомпилированных расписаний (None — без ограничения размера). Сигналы очищают
+# кэши только в своём процессе, поэтому шарды и админка перечитывают расписания
+# через SCHEDULE_CACHE_TTL секунд, а индекс свободных слотов — через SLOT_INDEX_RELOAD
+SCHEDULE_CACHE_MAXSIZE = env.int("SCHEDULE_CACHE_MAXSIZE", default=None)
+SCHEDULE_CACHE_TTL = env.float("SCHEDULE_CACHE_TTL", default=60.0)
+SLOT_INDEX_RELOAD = env.float("SLOT_INDEX_RELOAD", default=60.0)
+
+# Кэш профилей Telegram: время свежести, окно stale-while-revalidate (секунды), размер LRU
+PROFILE_CACHE_TTL = env.int("PROFILE_CACHE_TTL", default=3600)
+PROFILE_CACHE_STALE_TTL = env.int("PROFILE_CACHE_STALE_TTL", default=86400)
+PROFILE_CACHE_MAXSIZE = env.int("PROFILE_CACHE_MAXSIZE", default=1024)
+
+# Кэш отрисованных карточек мест (число карточек в памяти процесса)
+LOCATION_CARD_CACHE_MAXSIZE = env.int("LOCATION_CARD_CACHE_MAXSIZE", default=1024)
+
+# Вебхук Telegram в ASGI-приложении. TELEGRAM_WEBHOOK_HANDLER — путь к async-функции
+# handler(update: dict), например результату bot_admin.updates.aiogram_handler(dp, bot);
+# пустое значение отключает вебхук. TELEGRAM_WEBHOOK_SECRET (secret_token из setWebhook)
+# обязателен при включённом вебхуке; тело больше TELEGRAM_WEBHOOK_MAX_BODY байт получает 413
+TELEGRAM_WEBHOOK_HANDLER = env.str("TELEGRAM_WEBHOOK_HANDLER", default="")
+TELEGRAM_WEBHOOK_PATH = env.str("TELEGRAM_WEBHOOK_PATH", default="/telegram/webhook/")
+TELEGRAM_WEBHOOK_SECRET = env.str("TELEGRAM_WEBHOOK_SECRET", default="")
+TELEGRAM_WEBHOOK_MAX_BODY = env.int("TELEGRAM_WEBHOOK_MAX_BODY", default=1024 * 1024)
+# Очередь обновлений: размер, число воркеров и ожидание места перед ответом 503 (секунды)
+TELEGRAM_UPDATE_QUEUE_SIZE = env.int("TELEGRAM_UPDATE_QUEUE_SIZE", default=10000)
+TELEGRAM_UPDATE_WORKERS = env.int("TELEGRAM_UPDATE_WORKERS", default=32)
+TELEGRAM_UPDATE_PUT_TIMEOUT = env.float("TELEGRAM_UPDATE_PUT_TIMEOUT", default=1.0)
+
+# Шардирование обработки по id чата: число шардов, адрес брокера и ключ доступа к нему.
+# При TELEGRAM_SHARDS > 1 ключ обязателен и должен совпадать у всех процессов и узлов
+TELEGRAM_SHARDS = env.int("TELEGRAM_SHARDS", default=1)
+TELEGRAM_SHARD_BROKER = env.str("TELEGRAM_SHARD_BROKER", default="127.0.0.1:50000")
+TELEGRAM_SHARD_AUTHKEY = env.str("TELEGRAM_SHARD_AUTHKEY", default="")
+
+# Очередь исходящих сообщений (bot_admin.outbound): лимиты Telegram — около 30
+# сообщений в секунду на бота, 1 в секунду на чат и 20 в минуту на группу
+TELEGRAM_SEND_GLOBAL_RATE = env.float("TELEGRAM_SEND_GLOBAL_RATE", default=30.0)
+TELEGRAM_SEND_CHAT_RATE = env.float("TELEGRAM_SEND_CHAT_RATE", default=1.0)
+TELEGRAM_SEND_GROUP_RATE = env.float("TELEGRAM_SEND_GROUP_RATE", default=20 / 60)
+TELEGRAM_SEND_CONCURRENCY = env.int("TELEGRAM_SEND_CONCURRENCY", default=8)
+TELEGRAM_SEND_MAX_ATTEMPTS = env.int("TELEGRAM_SEND_MAX_ATTEMPTS", default=5)
+# Задержка первого повтора в секундах, дальше удваивается
+TELEGRAM_SEND_RETRY_DELAY = env.float("TELEGRAM_SEND_RETRY_DELAY", default=5.0)
+
+# Напоминания о бронированиях (bot_admin.reminders): за сколько минут до начала
+# они отправляются, на сколько секунд вперёд загружаются из базы и как часто
+# загрузка повторяется, чтобы увидеть бронирования из других процессов
+BOOKING_REMINDER_LEADS = env.list("BOOKING_REMINDER_LEADS", cast=int, default=[1440, 60])
+BOOKING_REMINDER_HORIZON = env.float("BOOKING_REMINDER_HORIZON", default=3600.0)
+BOOKING_REMINDER_RELOAD = env.float("BOOKING_REMINDER_RELOAD", default=60.0)
+
+# Метрики (bot_admin.metrics): задержки запросов к базе и обработчиков, размеры
+# очередей и доли попаданий в кэши; эндпоинт METRICS_PATH в ASGI-приложении.
+# Включённым метрикам нужен METRICS_TOKEN: запрос к эндпоинту передаёт
+# заголовок Authorization: Bearer <token>
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=False)
+METRICS_PATH = env.str("METRICS_PATH", default="/metrics")
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+
+# Кэши; FSM_CACHE_URL при нескольких шардах должен указывать на общий кэш
+# (dbcache://, filecache://, rediscache://)
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+    "fsm": env.cache_url("FSM_CACHE_URL", default="locmemcache://fsm"),
+}
+FSM_CACHE_ALIAS = "fsm"
+
 # Выбор активной конфигурации
 if DJANGO_ENV == "development":
     DATABASES["default"] = DATABASES["default"]
@@ -156,6 +254,30 @@ elif DJANGO_ENV == "production":
 else:
     raise ImproperlyConfigured("Invalid DJANGO_ENV value")
 
+# Реплики PostgreSQL для чтения: DATABASE_REPLICA_HOSTS=replica1,replica2.
+# Имя базы берётся у production, порт и учётные данные можно переопределить
+DATABASE_REPLICAS = []
+if DJANGO_ENV == "production":
+    for number, replica_host in enumerate(env.list("DATABASE_REPLICA_HOSTS", default=[]), start=1):
+        DATABASES[f"replica_{number}"] = {
+            **DATABASES["production"],
+            "HOST": replica_host,
+            "PORT": env.int("DATABASE_REPLICA_PORT", default=DATABASES["production"]["PORT"]),
+            "USER": env.str("DATABASE_REPLICA_USER", default=DATABASES["production"]["USER"]),
+            "PASSWORD": env.str("DATABASE_REPLICA_PASSWORD", default=DATABASES["production"]["PASSWORD"]),
+            "OPTIONS": dict(DATABASES["production"]["OPTIONS"]),
+            "TEST": {"MIRROR": "default"},
+        }
+        DATABASE_REPLICAS.append(f"replica_{number}")
+
+# Приложения, чтения моделей которых уходят на реплики (сессии и авторизация админки — на основную базу)
+DATABASE_REPLICA_APPS = ["bot_admin"]
+# Сколько секунд после записи чтения того же пользователя идут на основную базу
+DATABASE_REPLICA_PIN_SECONDS = env.float("DATABASE_REPLICA_PIN_SECONDS", default=5.0)
+# Только при репликах: с любым роутером makemigrations проверяет историю миграций
+# на всех псевдонимах баз, включая ненастроенный production в разработке
+DATABASE_ROUTERS = ["bot_admin.routers.PrimaryReplicaRouter"] if DATABASE_REPLICAS else []
+
 # Проверка обязательных переменных для PostgreSQL
 if DJANGO_ENV == "production":
     required_vars = ["DATABASE_NAME", "DATABASE_USER", "DATABASE_PASSWORD"]